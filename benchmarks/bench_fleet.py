@@ -0,0 +1,47 @@
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+sys.path.append("..")
+
+from boonnano import ExpertClient, ExpertEmulator
+
+#
+# save_nanos and restore_nanos of a fleet of instances on an emulated link, by number
+# of worker threads (one worker is the serial loop over save_nano / restore_nano)
+#
+# usage: python bench_fleet.py [instances] [profile]
+#
+
+
+def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 32
+    profile = sys.argv[2] if len(sys.argv) > 2 else "wan"
+    rng = np.random.default_rng(0)
+
+    print("{} instances on {}".format(count, profile))
+    print("{:<8} {:>14} {:>14}".format("workers", "backup inst/s", "restore inst/s"))
+    with ExpertEmulator(profile, seed=0) as emulator:
+        client = ExpertClient(profile=emulator.license_profile(), pool_size=16)
+        for index in range(count):
+            nano = client.open_nano("fleet-{}".format(index))
+            nano.configure_nano(feature_count=8, numeric_format="float32")
+            nano.load_data(rng.random((500, 8), dtype=np.float32))
+            nano.run_nano()
+
+        for workers in [1, 2, 4, 8, 16]:
+            with tempfile.TemporaryDirectory() as directory:
+                start = time.perf_counter()
+                client.save_nanos(directory, max_workers=workers)
+                backup = count / (time.perf_counter() - start)
+                start = time.perf_counter()
+                client.restore_nanos(directory, max_workers=workers)
+                restore = count / (time.perf_counter() - start)
+            print("{:<8} {:>14.1f} {:>14.1f}".format(workers, backup, restore))
+        client.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,162 @@
+import os
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+sys.path.append("..")
+
+from boonnano import (
+    BoonException,
+    CompressionPolicy,
+    ExpertClient,
+    ExpertEmulator,
+)
+from boonnano.emulator import NETWORK_PROFILES
+
+#
+# latency and throughput of the hot calls against the emulated Expert server on lan,
+# wan and cellular links, with pooled or fresh connections and with or without
+# compression, then the throughput of run_streaming_nano by batch size
+#
+# usage: python bench_network.py [calls] [rows] [profile ...]
+#
+
+SETTINGS = [
+    ("pooled", dict(keep_alive=True), False),
+    ("no keep-alive", dict(keep_alive=False), False),
+    ("gzip uploads", dict(compression=CompressionPolicy(min_size=1000)), False),
+    ("gzip responses", dict(keep_alive=True), True),
+]
+
+
+def sample_data(rows):
+    # patterns around a few centers, which compress and cluster like sensor data
+    rng = np.random.default_rng(0)
+    centers = rng.random((8, 20))
+    noise = rng.normal(0, 0.01, (rows, 20))
+    return (centers[rng.integers(0, 8, rows)] + noise).astype(np.float32)
+
+
+def open_client(emulator, **kwargs):
+    client = ExpertClient(profile=emulator.license_profile(), **kwargs)
+    nano = client.open_nano("bench")
+    nano.configure_nano(feature_count=20, numeric_format="float32")
+    return client, nano
+
+
+def measure(call, calls, nbytes):
+    latencies = []
+    failures = 0
+    for _ in range(calls):
+        start = time.perf_counter()
+        try:
+            call()
+        except BoonException:
+            failures += 1
+            continue
+        latencies.append(time.perf_counter() - start)
+    if not latencies:
+        return None, None, 0.0, failures
+    latencies.sort()
+    return (
+        latencies[len(latencies) // 2] * 1000,
+        latencies[min(len(latencies) - 1, int(len(latencies) * 0.99))] * 1000,
+        nbytes * len(latencies) / sum(latencies) / 1e6,
+        failures,
+    )
+
+
+def hot_calls(nano, data, snapshot):
+    nano.load_data(data)
+    nano.run_nano()
+    nano.save_nano(snapshot)
+    snapshot_size = os.path.getsize(snapshot)
+    results_size = data.shape[0] * 14 * 6
+    return [
+        ("load_data", lambda: nano.load_data(data), data.nbytes),
+        (
+            "run_streaming_nano",
+            lambda: nano.run_streaming_nano(data, results="ID,SI"),
+            data.nbytes,
+        ),
+        (
+            "get_nano_results",
+            lambda: nano.get_nano_results(results="All"),
+            results_size,
+        ),
+        ("save_nano", lambda: nano.save_nano(snapshot), snapshot_size),
+        ("restore_nano", lambda: nano.restore_nano(snapshot), snapshot_size),
+    ]
+
+
+def bench_settings(profile, calls, data, snapshot):
+    print("\n{} {!r}".format(profile, NETWORK_PROFILES[profile]))
+    print(
+        "{:<16} {:<20} {:>9} {:>9} {:>9} {:>6} {:>6}".format(
+            "setting", "call", "p50 ms", "p99 ms", "MB/s", "fails", "conns"
+        )
+    )
+    for name, kwargs, compress in SETTINGS:
+        with ExpertEmulator(profile, compress=compress, seed=0) as emulator:
+            client, nano = open_client(emulator, **kwargs)
+            for call_name, call, nbytes in hot_calls(nano, data, snapshot):
+                before = emulator.stats["connections"]
+                p50, p99, throughput, failures = measure(call, calls, nbytes)
+                print(
+                    "{:<16} {:<20} {:>9} {:>9} {:>9.2f} {:>6} {:>6}".format(
+                        name,
+                        call_name,
+                        "-" if p50 is None else "{:.1f}".format(p50),
+                        "-" if p99 is None else "{:.1f}".format(p99),
+                        throughput,
+                        failures,
+                        emulator.stats["connections"] - before,
+                    )
+                )
+            client.close()
+
+
+def bench_batching(profile, data):
+    print("\n{} run_streaming_nano of {} patterns".format(profile, len(data)))
+    print("{:<12} {:>9} {:>14}".format("batch rows", "requests", "patterns/s"))
+    with ExpertEmulator(profile, seed=0) as emulator:
+        client, nano = open_client(emulator)
+        for batch_rows in [10, 100, 1000]:
+            batch_rows = min(batch_rows, len(data))
+            before = emulator.stats["requests"]
+            start = time.perf_counter()
+            for index in range(0, len(data), batch_rows):
+                try:
+                    nano.run_streaming_nano(data[index : index + batch_rows])
+                except BoonException:
+                    pass
+            seconds = time.perf_counter() - start
+            print(
+                "{:<12} {:>9} {:>14.0f}".format(
+                    batch_rows,
+                    emulator.stats["requests"] - before,
+                    len(data) / seconds,
+                )
+            )
+        client.close()
+
+
+def main():
+    calls = int(sys.argv[1]) if len(sys.argv) > 1 else 10
+    rows = int(sys.argv[2]) if len(sys.argv) > 2 else 2000
+    profiles = sys.argv[3:] or list(NETWORK_PROFILES)
+
+    # answers within the emulated stall instead of after the default five minutes
+    os.environ.setdefault("BOON_TIMEOUT", "10")
+    data = sample_data(rows)
+    with tempfile.TemporaryDirectory() as directory:
+        snapshot = os.path.join(directory, "snapshot.tgz")
+        for profile in profiles:
+            bench_settings(profile, calls, data, snapshot)
+            bench_batching(profile, data)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,87 @@
+import sys
+import time
+import tracemalloc
+
+import numpy as np
+
+sys.path.append("..")
+
+from boonnano.expert_client import ScratchBuffer, normalize_nano_data
+
+#
+# memory allocated by normalize_nano_data per load_data / run_streaming_nano batch,
+# reported as a multiple of the payload size (the number of payload-sized copies)
+#
+# usage: python bench_normalize.py [rows] [features]
+#
+
+
+def legacy_normalize(data, numeric_format):
+    # normalize_nano_data before buffers were passed through without copying
+    data = np.asarray(data)
+    if numeric_format == "int16":
+        data = data.astype(np.int16)
+    elif numeric_format == "float32":
+        data = data.astype(np.float32)
+    elif numeric_format == "uint16":
+        data = data.astype(np.uint16)
+    return data.tobytes()
+
+
+def measure(normalize, data, repeat=5):
+    # warm up once so reusable buffers are already sized
+    result = normalize(data)
+    del result
+
+    tracemalloc.start()
+    start = time.perf_counter()
+    for _ in range(repeat):
+        before = tracemalloc.get_traced_memory()[0]
+        tracemalloc.reset_peak()
+        result = normalize(data)
+        peak = tracemalloc.get_traced_memory()[1] - before
+        del result
+    elapsed = (time.perf_counter() - start) / repeat
+    tracemalloc.stop()
+    return peak, elapsed
+
+
+def main():
+    rows = int(sys.argv[1]) if len(sys.argv) > 1 else 50000
+    features = int(sys.argv[2]) if len(sys.argv) > 2 else 200
+
+    typed = np.random.rand(rows, features).astype(np.float32)
+    untyped = typed.astype(np.float64)
+    payload = typed.nbytes
+    scratch = ScratchBuffer()
+
+    cases = [
+        ("float32 contiguous", typed),
+        ("float64 -> float32", untyped),
+        ("float32 transposed", np.asfortranarray(typed)),
+    ]
+
+    print("{} x {} float32 batch, {:.1f} MB".format(rows, features, payload / 1e6))
+    print(
+        "{:<22} {:>22} {:>22}".format(
+            "input", "before: alloc x / ms", "after: alloc x / ms"
+        )
+    )
+    for name, data in cases:
+        old_peak, old_time = measure(lambda d: legacy_normalize(d, "float32"), data)
+        new_peak, new_time = measure(
+            lambda d: normalize_nano_data(d, "float32", scratch), data
+        )
+        print(
+            "{:<22} {:>12.1f} / {:>7.2f} {:>12.1f} / {:>7.2f}".format(
+                name,
+                old_peak / payload,
+                old_time * 1000,
+                new_peak / payload,
+                new_time * 1000,
+            )
+        )
+
+
+if __name__ == "__main__":
+    main()
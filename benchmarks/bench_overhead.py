@@ -0,0 +1,82 @@
+import sys
+import time
+
+import numpy as np
+
+sys.path.append("..")
+
+from boonnano import ExpertClient, FakeExpert, FakeTransport, LicenseProfile
+
+#
+# client-side cost of the hot calls, measured against the in-process fake Expert
+# server: the time spent in the fake is subtracted, what remains is the client's own
+# encoding, decoding and bookkeeping
+#
+# usage: python bench_overhead.py [calls] [rows]
+#
+
+
+class TimedExpert(FakeExpert):
+    def __init__(self):
+        super().__init__()
+        self.seconds = 0.0
+
+    def handle(self, *args):
+        start = time.perf_counter()
+        try:
+            return super().handle(*args)
+        finally:
+            self.seconds += time.perf_counter() - start
+
+
+def measure(expert, call, calls):
+    call()
+    expert.seconds = 0.0
+    start = time.perf_counter()
+    for _ in range(calls):
+        call()
+    total = time.perf_counter() - start
+    return total / calls * 1e6, (total - expert.seconds) / calls * 1e6
+
+
+def main():
+    calls = int(sys.argv[1]) if len(sys.argv) > 1 else 200
+    rows = int(sys.argv[2]) if len(sys.argv) > 2 else 1000
+
+    expert = TimedExpert()
+    profile = LicenseProfile(server="http://fake", api_key="bench", api_tenant="bench")
+    client = ExpertClient(profile=profile, transport=FakeTransport(expert))
+    nano = client.open_nano("bench")
+    nano.configure_nano(
+        feature_count=20, numeric_format="float32", min_val=0, max_val=1
+    )
+    # patterns around a few centers, so the fake's clustering stays cheap
+    rng = np.random.default_rng(0)
+    centers = rng.random((8, 20))
+    noise = rng.normal(0, 0.01, (rows, 20))
+    data = (centers[rng.integers(0, 8, rows)] + noise).astype(np.float32)
+    nano.load_data(data)
+    nano.run_nano()
+
+    cases = [
+        ("get_version", client.get_version),
+        ("load_data", lambda: nano.load_data(data)),
+        ("run_streaming_nano", lambda: nano.run_streaming_nano(data, results="ID,SI")),
+        ("get_nano_results", lambda: nano.get_nano_results(results="All")),
+        (
+            "get_nano_results numpy",
+            lambda: nano.get_nano_results(
+                results="All", results_format="numpy", incremental=True
+            ),
+        ),
+    ]
+
+    print("{} calls per case, {} patterns of 20 features".format(calls, rows))
+    print("{:<24} {:>12} {:>12}".format("case", "total us", "client us"))
+    for name, call in cases:
+        total, client_side = measure(expert, call, calls)
+        print("{:<24} {:>12.1f} {:>12.1f}".format(name, total, client_side))
+
+
+if __name__ == "__main__":
+    main()
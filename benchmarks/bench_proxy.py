@@ -0,0 +1,162 @@
+import http.client
+import json
+import select
+import socket
+import sys
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlsplit
+
+sys.path.append("..")
+
+from boonnano import ExpertClient, LicenseProfile
+
+#
+# per-call latency of get_version against a local stand-in Expert server, sent
+# directly and through a local stand-in http proxy (absolute-form forwarding and
+# CONNECT tunnels), with and without keep-alive
+#
+# usage: python bench_proxy.py [calls]
+#
+
+
+class ExpertHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    disable_nagle_algorithm = True
+
+    def log_message(self, *args):
+        pass
+
+    def do_GET(self):
+        self.rfile.read(int(self.headers.get("Content-Length", 0)))
+        payload = json.dumps({"version": "stand-in"}).encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+
+
+class ProxyHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    disable_nagle_algorithm = True
+    connections = 0
+
+    def log_message(self, *args):
+        pass
+
+    def setup(self):
+        super().setup()
+        ProxyHandler.connections += 1
+        self.upstream = {}
+
+    def do_GET(self):
+        # forward an absolute-form request, keeping one upstream connection per client connection
+        target = urlsplit(self.path)
+        upstream = self.upstream.get(target.netloc)
+        if upstream is None:
+            upstream = self.upstream[target.netloc] = http.client.HTTPConnection(
+                target.netloc
+            )
+            upstream.connect()
+            upstream.sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        path = target.path + ("?" + target.query if target.query else "")
+        headers = {
+            key: value
+            for key, value in self.headers.items()
+            if key.lower() not in ("proxy-connection", "connection")
+        }
+        body = self.rfile.read(int(self.headers.get("Content-Length", 0)))
+        upstream.request(self.command, path, body=body, headers=headers)
+        response = upstream.getresponse()
+        payload = response.read()
+        self.send_response(response.status)
+        for key, value in response.getheaders():
+            if key.lower() not in ("connection", "transfer-encoding"):
+                self.send_header(key, value)
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def do_CONNECT(self):
+        # tunnel bytes both ways until either side closes
+        host, port = self.path.split(":")
+        upstream = socket.create_connection((host, int(port)))
+        self.send_response(200, "Connection established")
+        self.end_headers()
+        sockets = [self.connection, upstream]
+        while True:
+            readable, _, _ = select.select(sockets, [], [])
+            for sock in readable:
+                data = sock.recv(1 << 16)
+                if not data:
+                    upstream.close()
+                    self.close_connection = True
+                    return
+                (upstream if sock is self.connection else self.connection).sendall(data)
+
+
+def serve(handler):
+    server = ThreadingHTTPServer(("127.0.0.1", 0), handler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, "127.0.0.1:{}".format(server.server_address[1])
+
+
+def measure(client, calls):
+    client.get_version()
+    latencies = []
+    for _ in range(calls):
+        start = time.perf_counter()
+        client.get_version()
+        latencies.append(time.perf_counter() - start)
+    client.close()
+    latencies.sort()
+    return (
+        sum(latencies) / calls * 1000,
+        latencies[calls // 2] * 1000,
+        latencies[int(calls * 0.99)] * 1000,
+    )
+
+
+def main():
+    calls = int(sys.argv[1]) if len(sys.argv) > 1 else 1000
+
+    expert, expert_address = serve(ExpertHandler)
+    proxy, proxy_address = serve(ProxyHandler)
+
+    cases = [
+        ("direct", None, True),
+        ("direct, no keep-alive", None, False),
+        ("proxied", proxy_address, True),
+        ("proxied, no keep-alive", proxy_address, False),
+    ]
+
+    print("{} get_version calls per case".format(calls))
+    print(
+        "{:<24} {:>9} {:>9} {:>9} {:>12}".format(
+            "case", "mean ms", "p50 ms", "p99 ms", "proxy conns"
+        )
+    )
+    for name, proxy_server, keep_alive in cases:
+        profile = LicenseProfile(
+            server="http://" + expert_address,
+            api_key="bench",
+            api_tenant="bench",
+            proxy_server=proxy_server,
+        )
+        before = ProxyHandler.connections
+        client = ExpertClient(profile=profile, keep_alive=keep_alive)
+        mean, p50, p99 = measure(client, calls)
+        print(
+            "{:<24} {:>9.3f} {:>9.3f} {:>9.3f} {:>12}".format(
+                name, mean, p50, p99, ProxyHandler.connections - before
+            )
+        )
+
+    proxy.shutdown()
+    expert.shutdown()
+
+
+if __name__ == "__main__":
+    main()
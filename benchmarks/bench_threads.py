@@ -0,0 +1,69 @@
+import sys
+import threading
+import time
+
+import numpy as np
+
+sys.path.append("..")
+
+from boonnano import ExpertClient, ExpertEmulator
+
+#
+# run_streaming_nano throughput of worker threads sharing one client, against one
+# client per thread, on an emulated link, with the connections each setup opens
+#
+# usage: python bench_threads.py [calls per thread] [profile]
+#
+
+
+def run(clients, threads, calls, data):
+    def worker(index):
+        handle = clients[index % len(clients)]._nano("thread-{}".format(index))
+        for _ in range(calls):
+            handle.run_streaming_nano(data, results="ID")
+
+    workers = [
+        threading.Thread(target=worker, args=(index,)) for index in range(threads)
+    ]
+    start = time.perf_counter()
+    for thread in workers:
+        thread.start()
+    for thread in workers:
+        thread.join()
+    return threads * calls / (time.perf_counter() - start)
+
+
+def main():
+    calls = int(sys.argv[1]) if len(sys.argv) > 1 else 20
+    profile = sys.argv[2] if len(sys.argv) > 2 else "wan"
+    data = np.random.default_rng(0).random((100, 8), dtype=np.float32)
+
+    print("{} calls per thread on {}".format(calls, profile))
+    print("{:<8} {:<18} {:>10} {:>7}".format("threads", "clients", "calls/s", "conns"))
+    for threads in [1, 2, 4, 8, 16]:
+        for shared in [True, False]:
+            with ExpertEmulator(profile) as emulator:
+                count = 1 if shared else threads
+                clients = [
+                    ExpertClient(profile=emulator.license_profile(), pool_size=8)
+                    for _ in range(count)
+                ]
+                for index in range(threads):
+                    handle = clients[index % count].open_nano("thread-{}".format(index))
+                    handle.configure_nano(feature_count=8, numeric_format="float32")
+                before = emulator.stats["connections"]
+                throughput = run(clients, threads, calls, data)
+                print(
+                    "{:<8} {:<18} {:>10.1f} {:>7}".format(
+                        threads,
+                        "shared" if shared else "one per thread",
+                        throughput,
+                        emulator.stats["connections"] - before + count,
+                    )
+                )
+                for client in clients:
+                    client.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -1,8 +1,66 @@
+from importlib import import_module
+
 from .expert_client import ExpertClient, BoonException, LicenseProfile
+from .nano_handle import NanoHandle
+from .compression import CompressionPolicy
+from .retry import RetryPolicy
+from .snapshot import SnapshotRef, SnapshotStore
+from .transport import Transport
+
+# imported on first use: aiohttp, numpy and the http server take longer to import
+# than the rest of the package
+_LAZY = {
+    "AsyncExpertClient": "async_client",
+    "FakeExpert": "fake_server",
+    "FakeTransport": "fake_server",
+    "ExpertEmulator": "emulator",
+    "NetworkProfile": "emulator",
+}
+
+
+def __getattr__(name):
+    if name not in _LAZY:
+        raise AttributeError("module {!r} has no attribute {!r}".format(__name__, name))
+    value = getattr(import_module("." + _LAZY[name], __name__), name)
+    globals()[name] = value
+    return value
+
+
+def __dir__():
+    return sorted(list(globals()) + list(_LAZY))
+
 
 # urllib3.disable_warnings(urllib3.exceptions.InsecureRequestWarning)
 
-__all__ = ["BoonException", "ExpertClient", "LicenseProfile"]
+__all__ = [
+    "AsyncExpertClient",
+    "BoonException",
+    "CompressionPolicy",
+    "ExpertClient",
+    "ExpertEmulator",
+    "FakeExpert",
+    "FakeTransport",
+    "LicenseProfile",
+    "NanoHandle",
+    "NetworkProfile",
+    "RetryPolicy",
+    "SnapshotRef",
+    "SnapshotStore",
+    "Transport",
+]
 
 __pdoc__ = {}
 __pdoc__["expert_client"] = False
+__pdoc__["async_client"] = False
+__pdoc__["nano_handle"] = False
+__pdoc__["multipart"] = False
+__pdoc__["streaming"] = False
+__pdoc__["codec"] = False
+__pdoc__["compression"] = False
+__pdoc__["results"] = False
+__pdoc__["retry"] = False
+__pdoc__["snapshot"] = False
+__pdoc__["fleet"] = False
+__pdoc__["transport"] = False
+__pdoc__["fake_server"] = False
+__pdoc__["emulator"] = False
@@ -0,0 +1,755 @@
+import asyncio
+from collections import deque
+import inspect
+import os
+import ssl
+import time
+
+from .expert_client import (
+    BoonException,
+    LicenseProfile,
+    _BaseClient,
+    _is_configured,
+    check_nano_file,
+    normalize_nano_data,
+    split_rows,
+    transfer_stats,
+)
+from .compression import CompressedBody, compression_stats
+from .multipart import CHUNK_SIZE, MultipartEncoder
+from .results import ResultsParser, decode_results
+from .retry import IDEMPOTENT_METHODS, is_transient
+from .snapshot import SnapshotRef
+
+try:
+    import aiohttp
+except ImportError:  # pragma: no cover - optional dependency
+    aiohttp = None
+
+
+async def _read_body(body):
+    """Stream a MultipartEncoder or CompressedBody, reading its source in the default executor"""
+    loop = asyncio.get_running_loop()
+    while True:
+        chunk = await loop.run_in_executor(None, body.read, CHUNK_SIZE)
+        if not chunk:
+            return
+        yield bytes(chunk)
+
+
+class _ExecutorWriter:
+
+    """save_nano parser writing the snapshot in the default executor, off the event loop"""
+
+    def __init__(self, client, filename):
+        self.client = client
+        self.filename = filename
+        self.writer = None
+        self.loop = asyncio.get_running_loop()
+
+    def _feed(self, chunk):
+        if self.writer is None:
+            self.writer = self.client._snapshot_writer(self.filename)
+        self.writer.feed(chunk)
+        return self.writer
+
+    def feed(self, chunk):
+        return self.loop.run_in_executor(None, self._feed, chunk)
+
+    def close(self):
+        return self.loop.run_in_executor(None, lambda: self._feed(b"").close())
+
+    def discard(self):
+        if self.writer is not None:
+            self.writer.discard()
+
+
+class AsyncExpertClient(_BaseClient):
+
+    """asyncio handle for BoonNano Pod instances
+
+    Offers the same methods as ExpertClient as coroutines.  All requests share one
+    non-blocking connection pool, pool_size bounds the number of requests in flight
+    at once, further requests wait for a free connection.  Requires the aiohttp
+    package (pip install boonnano[async]).
+
+    Environment:
+    BOON_SSL_CERT: specifies location of ssl certification
+    BOON_SSL_VERIFY: verify cert of server (default is true, ignored if http connection)
+    BOON_TIMEOUT: request timeout (default is 300)
+    BOON_POOL_SIZE: maximum number of concurrent connections to the server (default is 10)
+    BOON_JSON_CODEC: json backend for request and response bodies, see ExpertClient
+    BOON_COMPRESSION: request compression, see ExpertClient
+
+    Args:
+        profile (LicenseProfile): server, proxy and credentials to use, see ExpertClient
+        pool_size (int): maximum number of concurrent connections, overrides BOON_POOL_SIZE
+        keep_alive (bool): keep connections open between requests so they can be reused
+        json_codec: json backend name, or an object with dumps and loads methods, overrides BOON_JSON_CODEC
+        compression (CompressionPolicy): request compression, overrides BOON_COMPRESSION
+        retry (RetryPolicy): retries and hedging of idempotent (GET) requests
+
+    The pool is created on the first request and must be released with close()
+    (or by using the client as an async context manager).
+    """
+
+    def __init__(
+        self,
+        profile: LicenseProfile = None,
+        pool_size: int = None,
+        keep_alive: bool = True,
+        json_codec=None,
+        compression=None,
+        retry=None,
+    ):
+        if aiohttp is None:
+            raise BoonException(400, "AsyncExpertClient requires the aiohttp package")
+        super().__init__(
+            profile=profile,
+            pool_size=pool_size,
+            keep_alive=keep_alive,
+            json_codec=json_codec,
+            compression=compression,
+            retry=retry,
+        )
+        self.user_agent = "Boon Logic / expert-python-sdk / aiohttp"
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, exc_type, exc_value, traceback):
+        await self.close()
+
+    async def close(self):
+        """Release the pooled connections held by this client"""
+        self._check_process()
+        if self._session is not None:
+            await self._session.close()
+            self._session = None
+
+    def _get_session(self):
+        """Return the pooled session, creating it on first use (inside the running loop)"""
+        self._check_process()
+        if self._session is None:
+            if not self.ssl_verify:
+                ssl_context = False
+            else:
+                ssl_context = ssl.create_default_context()
+                if self.ssl_cert is not None:
+                    ssl_context.load_cert_chain(self.ssl_cert)
+            connector = aiohttp.TCPConnector(
+                limit=self.pool_size,
+                force_close=not self.keep_alive,
+                ssl=ssl_context,
+            )
+            self._session = aiohttp.ClientSession(
+                connector=connector,
+                timeout=aiohttp.ClientTimeout(total=self.timeout),
+            )
+        return self._session
+
+    async def _api_call(
+        self, method, url, headers, body=None, fields=None, parser=None, hedge=True
+    ):
+        """Make a REST call to the Expert server and return the decoded response
+
+        With parser (such as the ResultsParser class), a successful response is fed to a
+        new parser as it arrives and what its close() returns is returned.  The feed and
+        close of a parser may also return awaitables, which are awaited.  Idempotent
+        requests are retried as ExpertClient does, and hedged as well with hedge.
+        """
+        histogram = self._histogram(method, url)
+        idempotent = method in IDEMPOTENT_METHODS
+        retries = self.retry.retries if idempotent else 0
+        delay = self.retry.hedge_delay(histogram) if idempotent and hedge else None
+
+        def fetch():
+            return self._fetch(method, url, headers, body, fields, parser)
+
+        attempt = 0
+        while True:
+            start = time.perf_counter()
+            try:
+                if delay is None:
+                    result = await fetch()
+                else:
+                    result = await self._hedged(fetch, delay)
+            except BoonException as e:
+                if attempt >= retries or not is_transient(e):
+                    raise
+                await asyncio.sleep(self.retry.delay(attempt))
+                attempt += 1
+                continue
+            histogram.record(time.perf_counter() - start)
+            return result
+
+    async def _hedged(self, fetch, delay):
+        """Await fetch(), starting it a second time if the first has not answered after delay seconds"""
+        first = asyncio.ensure_future(fetch())
+        done, _ = await asyncio.wait({first}, timeout=delay)
+        if done:
+            return first.result()
+
+        pending = {first, asyncio.ensure_future(fetch())}
+        try:
+            while pending:
+                done, pending = await asyncio.wait(
+                    pending, return_when=asyncio.FIRST_COMPLETED
+                )
+                for task in done:
+                    if task.exception() is None:
+                        return task.result()
+            return task.result()
+        finally:
+            # the slower request is cancelled
+            for task in pending:
+                task.cancel()
+
+    async def _fetch(self, method, url, headers, body, fields, parser):
+        """Make one attempt at a REST call, see _api_call"""
+        headers, body = self._encode_body(method, headers, body)
+        if parser is not None:
+            parser = parser()
+
+        if fields is not None:
+            body = aiohttp.FormData()
+            for name, (file_name, content) in fields.items():
+                body.add_field(name, content, filename=file_name)
+        elif isinstance(body, (MultipartEncoder, CompressedBody)):
+            if body.len is not None:
+                headers = dict(headers)
+                headers["Content-Length"] = str(body.len)
+            sent, body = body, _read_body(body)
+        else:
+            sent = body
+
+        start = time.perf_counter()
+        try:
+            async with self._get_session().request(
+                method, url, headers=headers, data=body, proxy=self.proxy_url
+            ) as response:
+                status_code = response.status
+                # compressed bodies are decoded chunk by chunk into one buffer
+                content = bytearray()
+                async for chunk in response.content.iter_chunked(CHUNK_SIZE):
+                    if parser is not None and status_code <= 299:
+                        with self._parse_errors():
+                            fed = parser.feed(chunk)
+                            if inspect.isawaitable(fed):
+                                await fed
+                    else:
+                        content += chunk
+        except asyncio.TimeoutError:
+            # request timed out
+            raise BoonException(500, "request timed out")
+        except (aiohttp.ClientConnectionError, aiohttp.ClientPayloadError):
+            raise BoonException(500, "server does not exist")
+        self._record_transfer(sent, start)
+
+        if status_code > 299:
+            try:
+                msg = self.codec.loads(content)
+                try:
+                    msg = msg.get("message", "no message")
+                except AttributeError:
+                    pass
+            except ValueError:
+                msg = content.decode("utf-8", errors="replace")
+            raise BoonException(status_code, msg)
+
+        if parser is not None:
+            with self._parse_errors():
+                result = parser.close()
+                if inspect.isawaitable(result):
+                    result = await result
+                return result
+
+        try:
+            respbody = self.codec.loads(content)
+        except ValueError:
+            # save nano or load data
+            return bytes(content)
+
+        self._check_response(status_code, respbody)
+
+        return respbody
+
+    async def open_nano(self, instance_id: str):
+        """Coroutine version of ExpertClient.open_nano
+
+        The methods of the returned NanoHandle are coroutines.
+        """
+
+        nano = self._nano(instance_id)
+        url = nano.urls["nanoInstance"]
+        headers = nano.json_headers
+        nano.update(await self._api_call("POST", url, headers))
+
+        return nano
+
+    async def get_nano_instance(self, instance_id: str):
+        """Coroutine version of ExpertClient.get_nano_instance"""
+
+        nano = self._nano(instance_id)
+        url = nano.urls["nanoInstance"]
+        headers = nano.json_headers
+        return await self._api_call("GET", url, headers)
+
+    async def close_nano(self, instance_id: str):
+        """Coroutine version of ExpertClient.close_nano"""
+
+        nano = self._nano(instance_id)
+        url = nano.urls["nanoInstance"]
+        headers = nano.json_headers
+        await self._api_call("DELETE", url, headers)
+
+        self._nanos.pop(instance_id, None)
+
+    async def configure_nano(
+        self,
+        instance_id: str,
+        feature_count: int = 1,
+        numeric_format: str = "float32",
+        cluster_mode: str = "batch",
+        min_val=0,
+        max_val=1,
+        weight=1,
+        label=None,
+        percent_variation: float = 0.05,
+        streaming_window: int = 1,
+        accuracy: float = 0.99,
+        autotune_pv: bool = True,
+        autotune_range: bool = True,
+        autotune_by_feature: bool = True,
+        autotune_max_clusters: int = 1000,
+        exclusions: list = None,
+        streaming_autotune: bool = True,
+        streaming_buffer: int = 10000,
+        anomaly_history_window: int = 10000,
+        learning_numerator: int = 10,
+        learning_denominator: int = 10000,
+        learning_max_clusters: int = 1000,
+        learning_samples: int = 1000000,
+        config: dict = None,
+    ):
+        """Coroutine version of ExpertClient.configure_nano"""
+
+        if config is None:
+            config = self.create_config(
+                feature_count,
+                numeric_format,
+                cluster_mode,
+                min_val,
+                max_val,
+                weight,
+                label,
+                percent_variation,
+                streaming_window,
+                accuracy,
+                autotune_pv,
+                autotune_range,
+                autotune_by_feature,
+                autotune_max_clusters,
+                exclusions,
+                streaming_autotune,
+                streaming_buffer,
+                anomaly_history_window,
+                learning_numerator,
+                learning_denominator,
+                learning_max_clusters,
+                learning_samples,
+            )
+
+        nano = self._nano(instance_id)
+        url = nano.urls["clusterConfig"]
+        headers = nano.json_headers
+        response = await self._api_call("POST", url, headers, config)
+
+        nano._set_config(config)
+
+        return response
+
+    async def nano_list(self):
+        """Coroutine version of ExpertClient.nano_list"""
+
+        url = self.url + "/nanoInstances/" + "?api-tenant=" + self.api_tenant
+        headers = {"Content-Type": "application/json"}
+        return await self._api_call("GET", url, headers)
+
+    @_is_configured
+    async def save_nano(self, instance_id: str, filename):
+        """Coroutine version of ExpertClient.save_nano"""
+
+        nano = self._nano(instance_id)
+        url = nano.urls["snapshot"]
+        headers = nano.json_headers
+        loop = asyncio.get_running_loop()
+        writers = []
+
+        def writer():
+            writers.append(_ExecutorWriter(self, filename))
+            return writers[-1]
+
+        start = time.perf_counter()
+        try:
+            written = await self._api_call(
+                "GET", url, headers, parser=writer, hedge=False
+            )
+            return await loop.run_in_executor(
+                None, self._commit_snapshot, instance_id, written, filename, start
+            )
+        except OSError as e:
+            raise BoonException(message=str(e))
+        finally:
+            # the temporary files of failed attempts
+            for each in writers:
+                await loop.run_in_executor(None, each.discard)
+
+    async def restore_nano(self, instance_id: str, filename, sha256: str = None):
+        """Coroutine version of ExpertClient.restore_nano"""
+
+        if isinstance(filename, SnapshotRef):
+            filename, sha256 = filename.path, sha256 or filename.sha256
+
+        await asyncio.get_running_loop().run_in_executor(
+            None, check_nano_file, filename
+        )
+
+        nano = self._nano(instance_id)
+        with self._snapshot_source(filename, sha256) as source:
+            url, headers, body = self._snapshot_request(nano, filename, source)
+            response = await self._api_call("POST", url, headers, body)
+
+        nano._set_config(response)
+
+        return response
+
+    @_is_configured
+    async def autotune_config(self, instance_id: str):
+        """Coroutine version of ExpertClient.autotune_config"""
+
+        nano = self._nano(instance_id)
+        url = nano.urls["autoTune"]
+        headers = nano.json_headers
+        await self._api_call("POST", url, headers)
+
+    @_is_configured
+    async def get_autotune_array(self, instance_id: str):
+        """Coroutine version of ExpertClient.get_autotune_array"""
+
+        nano = self._nano(instance_id)
+        url = nano.urls["autotuneArray"]
+        headers = nano.json_headers
+        return await self._api_call("GET", url, headers)
+
+    async def get_config(self, instance_id: str):
+        """Coroutine version of ExpertClient.get_config"""
+
+        nano = self._nano(instance_id)
+        url = nano.urls["clusterConfig"]
+        headers = nano.json_headers
+        response = await self._api_call("GET", url, headers)
+        nano._set_config(response)
+        return response
+
+    @_is_configured
+    async def load_file(
+        self,
+        instance_id: str,
+        file: str,
+        file_type: str,
+        gzip: bool = False,
+        append_data: bool = False,
+        progress=None,
+    ):
+        """Coroutine version of ExpertClient.load_file"""
+
+        # open the data file
+        try:
+            fp = open(file, "rb")
+        except FileNotFoundError as e:
+            raise BoonException(message=e.strerror)
+        except Exception as e:
+            raise BoonException(message=str(e))
+
+        with fp:
+            # verify file_type is set correctly
+            if file_type not in ["csv", "csv-c", "raw", "raw-n"]:
+                raise BoonException(
+                    message='file_type must be "csv", "csv-c", "raw" or "raw-n"'
+                )
+
+            file_name = os.path.basename(file)
+
+            body = MultipartEncoder("data", file_name, fp, progress=progress)
+
+            nano = self._nano(instance_id)
+            url = (
+                nano.urls["data"]
+                + "&fileType="
+                + file_type
+                + "&appendData="
+                + str(append_data).lower()
+                + "&gzip="
+                + str(gzip).lower()
+            )
+            headers = dict(nano.upload_headers)
+            headers["Content-Type"] = body.content_type
+            if not gzip:
+                headers, body = self.compression.compress(headers, body, upload=True)
+            start = time.perf_counter()
+            await self._api_call("POST", url, headers, body)
+
+        stats = transfer_stats(body.bytes_read, time.perf_counter() - start)
+        stats.update(compression_stats([body]))
+        return stats
+
+    @_is_configured
+    async def load_data(
+        self,
+        instance_id: str,
+        data: list,
+        append_data: bool = False,
+        chunk_size: int = None,
+        max_in_flight: int = 2,
+    ):
+        """Coroutine version of ExpertClient.load_data
+
+        Chunks are serialized in the default executor ahead of the upload.
+        """
+
+        nano = self._nano(instance_id)
+        start = time.perf_counter()
+
+        if chunk_size is None:
+            data = normalize_nano_data(data, nano.numeric_format)
+            url, headers, body = self._data_request(nano, data, append_data)
+            await self._api_call("POST", url, headers, body)
+            stats = transfer_stats(body.bytes_read, time.perf_counter() - start)
+            stats.update(compression_stats([body]))
+            stats["chunks"] = 1
+            return stats
+
+        if max_in_flight < 1:
+            raise BoonException(400, "max_in_flight must be at least 1")
+
+        loop = asyncio.get_running_loop()
+        chunks = split_rows(data, nano, chunk_size)
+        pending = deque()
+        prepared = 0
+        bodies = []
+        try:
+            for index in range(len(chunks)):
+                while prepared < len(chunks) and len(pending) < max_in_flight:
+                    pending.append(
+                        loop.run_in_executor(
+                            None,
+                            normalize_nano_data,
+                            chunks[prepared],
+                            nano.numeric_format,
+                        )
+                    )
+                    prepared += 1
+                url, headers, body = self._data_request(
+                    nano, await pending.popleft(), append_data or index > 0
+                )
+                await self._api_call("POST", url, headers, body)
+                bodies.append(body)
+        finally:
+            for future in pending:
+                future.cancel()
+
+        sent = sum(body.bytes_read for body in bodies)
+        stats = transfer_stats(sent, time.perf_counter() - start)
+        stats.update(compression_stats(bodies))
+        stats["chunks"] = len(chunks)
+        return stats
+
+    async def set_learning_enabled(self, instance_id: str, status: bool):
+        """Coroutine version of ExpertClient.set_learning_enabled"""
+        if status not in [True, False]:
+            raise BoonException(400, "status must be a boolean")
+
+        nano = self._nano(instance_id)
+        url = nano.urls["learning"] + "&enable=" + str(status).lower()
+        headers = nano.json_headers
+        return await self._api_call("POST", url, headers)
+
+    @_is_configured
+    async def is_learning_enabled(self, instance_id: str):
+        """Coroutine version of ExpertClient.is_learning_enabled"""
+
+        nano = self._nano(instance_id)
+        url = nano.urls["learning"]
+        headers = nano.json_headers
+        return await self._api_call("GET", url, headers)
+
+    async def set_root_cause_enabled(self, instance_id: str, status: bool):
+        """Coroutine version of ExpertClient.set_root_cause_enabled"""
+        if status not in [True, False]:
+            raise BoonException(400, "status must be a boolean")
+
+        nano = self._nano(instance_id)
+        url = nano.urls["rootCause"] + "&enable=" + str(status).lower()
+        headers = nano.json_headers
+        return await self._api_call("POST", url, headers)
+
+    @_is_configured
+    async def is_root_cause_enabled(self, instance_id: str):
+        """Coroutine version of ExpertClient.is_root_cause_enabled"""
+
+        nano = self._nano(instance_id)
+        url = nano.urls["rootCause"]
+        headers = nano.json_headers
+        return await self._api_call("GET", url, headers)
+
+    async def set_clipping_detection_enabled(self, instance_id: str, status: bool):
+        """Coroutine version of ExpertClient.set_clipping_detection_enabled"""
+        if status not in [True, False]:
+            raise BoonException(400, "status must be a boolean")
+
+        nano = self._nano(instance_id)
+        url = nano.urls["clippingDetection"] + "&enable=" + str(status).lower()
+        headers = nano.json_headers
+        return await self._api_call("POST", url, headers)
+
+    @_is_configured
+    async def is_clipping_detection_enabled(self, instance_id: str):
+        """Coroutine version of ExpertClient.is_clipping_detection_enabled"""
+
+        nano = self._nano(instance_id)
+        url = nano.urls["clippingDetection"]
+        headers = nano.json_headers
+        return await self._api_call("GET", url, headers)
+
+    async def run_nano(
+        self, instance_id: str, results: str = None, results_format: str = "dict"
+    ):
+        """Coroutine version of ExpertClient.run_nano"""
+
+        self._check_results_format(results_format)
+        results_str = self._format_results(results)
+
+        nano = self._nano(instance_id)
+        url = nano.urls["nanoRun"]
+        if results is not None:
+            url += "&results=" + results_str
+        headers = nano.json_headers
+        response = await self._api_call("POST", url, headers)
+        return decode_results(response, results_format)
+
+    @_is_configured
+    async def prune_ids(self, instance_id: str, id_list: list = []):
+        """Coroutine version of ExpertClient.prune_ids"""
+
+        nano = self._nano(instance_id)
+        url = nano.urls["pruneCluster"]
+
+        if isinstance(id_list, int):
+            id_list = [id_list]
+
+        if len(id_list) != 0:
+            # IDs
+            id_list = [str(element) for element in id_list]
+            url += "&clusterID=[" + ",".join(id_list) + "]"
+        else:
+            raise BoonException(message="Must specify cluster IDs to analyze")
+
+        headers = nano.json_headers
+        return await self._api_call("POST", url, headers)
+
+    @_is_configured
+    async def run_streaming_nano(
+        self,
+        instance_id: str,
+        data: list,
+        results: str = None,
+        results_format: str = "dict",
+    ):
+        """Coroutine version of ExpertClient.run_streaming_nano"""
+
+        self._check_results_format(results_format)
+        nano = self._nano(instance_id)
+        data = normalize_nano_data(data, nano.numeric_format)
+        url, headers, body = self._streaming_request(nano, data, results)
+        response = await self._api_call("POST", url, headers, body)
+        return decode_results(response, results_format)
+
+    async def get_version(self):
+        """Coroutine version of ExpertClient.get_version"""
+
+        url = self.url[:-3] + "/version" + "?api-tenant=" + self.api_tenant
+        headers = {"Content-Type": "application/json"}
+        return await self._api_call("GET", url, headers)
+
+    @_is_configured
+    async def get_buffer_status(self, instance_id: str):
+        """Coroutine version of ExpertClient.get_buffer_status"""
+
+        nano = self._nano(instance_id)
+        url = nano.urls["bufferStatus"]
+        headers = nano.json_headers
+        return await self._api_call("GET", url, headers)
+
+    @_is_configured
+    async def get_nano_results(
+        self,
+        instance_id: str,
+        results: str = "All",
+        results_format: str = "dict",
+        incremental: bool = False,
+    ):
+        """Coroutine version of ExpertClient.get_nano_results"""
+        self._check_results_format(results_format)
+        self._check_incremental(results_format, incremental)
+        results_str = self._format_results(results)
+
+        nano = self._nano(instance_id)
+        url = nano.urls["nanoResults"] + "&results=" + results_str
+        headers = nano.json_headers
+        parser = ResultsParser if incremental else None
+        response = await self._api_call("GET", url, headers, parser=parser)
+        return decode_results(response, results_format)
+
+    @_is_configured
+    async def get_nano_status(self, instance_id: str, results: str = "All"):
+        """Coroutine version of ExpertClient.get_nano_status"""
+
+        # build results command
+        if str(results) == "All":
+            results_str = (
+                "PCA,clusterGrowth,clusterSizes,anomalyIndexes,frequencyIndexes,"
+                "distanceIndexes,totalInferences,numClusters,clusterDistances,anomalyThreshold"
+            )
+        else:
+            results_str = results if isinstance(results, str) else ",".join(results)
+
+        nano = self._nano(instance_id)
+        url = nano.urls["nanoStatus"] + "&results=" + results_str
+        headers = nano.json_headers
+        return await self._api_call("GET", url, headers)
+
+    async def get_root_cause(
+        self, instance_id: str, id_list: list = [], pattern_list: list = []
+    ):
+        """Coroutine version of ExpertClient.get_root_cause"""
+
+        nano = self._nano(instance_id)
+        url = nano.urls["rootCauseAnalysis"]
+
+        if len(id_list) != 0:
+            # IDs
+            id_list = [str(element) for element in id_list]
+            url += "&clusterID=[" + ",".join(id_list) + "]"
+        elif len(pattern_list) != 0:
+            # patterns
+            import numpy as np
+
+            if len(np.array(pattern_list).shape) == 1:  # only 1 pattern provided
+                pattern_list = [pattern_list]
+            for i, pattern in enumerate(pattern_list):
+                pattern_list[i] = ",".join([str(element) for element in pattern])
+            url += "&pattern=[[" + "],[".join(pattern_list) + "]]"
+
+        headers = nano.json_headers
+        return await self._api_call("GET", url, headers)
@@ -0,0 +1,101 @@
+import json
+import sys
+
+# fastest first, the first installed backend is the default
+CODEC_NAMES = ["orjson", "simdjson", "json"]
+
+
+def _default(obj):
+    """Encode the numpy values the json backends do not handle themselves"""
+    # a numpy value means numpy is already imported
+    np = sys.modules.get("numpy")
+    if np is not None and isinstance(obj, np.ndarray):
+        return obj.tolist()
+    if np is not None and isinstance(obj, np.generic):
+        return obj.item()
+    raise TypeError(
+        "Object of type {} is not JSON serializable".format(type(obj).__name__)
+    )
+
+
+class JsonCodec:
+
+    """Request and response body codec built on the standard library json module
+
+    A codec turns request bodies into bytes with dumps and parses response bodies
+    with loads.  Numpy arrays and scalars are encoded as json lists and numbers.
+    Any object with the same dumps and loads methods can be passed to the clients as
+    json_codec.
+    """
+
+    name = "json"
+
+    def __reduce__(self):
+        # backends hold their module, a copy is built afresh from the class
+        return type(self), ()
+
+    def dumps(self, obj):
+        return json.dumps(obj, default=_default, separators=(",", ":")).encode("utf-8")
+
+    def loads(self, data):
+        return json.loads(data)
+
+
+class OrjsonCodec(JsonCodec):
+
+    """Codec built on orjson, which serializes numpy arrays natively"""
+
+    name = "orjson"
+
+    def __init__(self):
+        import orjson
+
+        self._orjson = orjson
+        self._option = orjson.OPT_SERIALIZE_NUMPY
+
+    def dumps(self, obj):
+        return self._orjson.dumps(obj, default=_default, option=self._option)
+
+    def loads(self, data):
+        return self._orjson.loads(data)
+
+
+class SimdjsonCodec(JsonCodec):
+
+    """Codec parsing with simdjson, bodies are still encoded with the json module"""
+
+    name = "simdjson"
+
+    def __init__(self):
+        import simdjson
+
+        self._simdjson = simdjson
+
+    def loads(self, data):
+        return self._simdjson.loads(data)
+
+
+_CODECS = {
+    "orjson": OrjsonCodec,
+    "simdjson": SimdjsonCodec,
+    "json": JsonCodec,
+}
+
+
+def get_codec(name: str = None):
+    """Return the codec for a backend name, None if that backend is not installed
+
+    Without a name the first installed backend of CODEC_NAMES is returned.
+    """
+    if name is None:
+        for name in CODEC_NAMES:
+            codec = get_codec(name)
+            if codec is not None:
+                return codec
+
+    if name not in _CODECS:
+        return None
+    try:
+        return _CODECS[name]()
+    except ImportError:
+        return None
@@ -0,0 +1,278 @@
+import threading
+import time
+import zlib
+
+from .multipart import CHUNK_SIZE
+
+# Content-Encoding values, br and zstd need the brotli and zstandard packages
+ALGORITHMS = ["gzip", "deflate", "br", "zstd"]
+
+
+class _Brotli:
+
+    """Adapter giving brotli's compressor the zlib compress/flush interface"""
+
+    def __init__(self, level):
+        import brotli
+
+        self._compressor = brotli.Compressor(quality=level)
+
+    def compress(self, data):
+        return self._compressor.process(data)
+
+    def flush(self):
+        return self._compressor.finish()
+
+
+def _compressor(algorithm: str, level: int):
+    if algorithm == "gzip":
+        return zlib.compressobj(level, zlib.DEFLATED, 31)
+    if algorithm == "deflate":
+        return zlib.compressobj(level, zlib.DEFLATED, 15)
+    if algorithm == "br":
+        return _Brotli(level)
+    if algorithm == "zstd":
+        import zstandard
+
+        return zstandard.ZstdCompressor(level=level).compressobj()
+    raise ValueError("unknown compression algorithm " + str(algorithm))
+
+
+def available_algorithms():
+    """Compression algorithms usable in this environment"""
+    available = []
+    for algorithm in ALGORITHMS:
+        try:
+            _compressor(algorithm, 1)
+        except ImportError:
+            continue
+        available.append(algorithm)
+    return available
+
+
+class CompressedBody:
+
+    """Request body compressing another body as it is read
+
+    body may be a file-like object or an iterable of bytes, such as a MultipartEncoder.
+    The compressed size is not known in advance, so the body is sent with chunked
+    transfer encoding.
+
+    Attributes:
+        bytes_read (int): uncompressed body bytes read so far
+        bytes_out (int): compressed bytes produced so far
+        seconds (float): time spent compressing
+        finished (float): time.perf_counter() when the end of the body was read, None before
+    """
+
+    len = None
+
+    def __init__(self, body, compressor, policy=None, chunk_size: int = CHUNK_SIZE):
+        self.chunk_size = chunk_size
+        self.bytes_read = 0
+        self.bytes_out = 0
+        self.seconds = 0.0
+        self.finished = None
+        self._body = body
+        self._chunks = None if hasattr(body, "read") else iter(body)
+        self._compressor = compressor
+        self._policy = policy
+
+    def __iter__(self):
+        while True:
+            chunk = self.read(self.chunk_size)
+            if not chunk:
+                return
+            yield chunk
+
+    def read(self, size: int = -1):
+        """Return the next compressed piece of the body, empty at the end"""
+        if size is None or size < 0:
+            size = self.chunk_size
+
+        while self._compressor is not None:
+            if self._chunks is None:
+                data = self._body.read(size)
+            else:
+                data = next(self._chunks, b"")
+
+            start = time.perf_counter()
+            if data:
+                self.bytes_read += len(data)
+                chunk = self._compressor.compress(data)
+            else:
+                chunk = self._compressor.flush()
+                self._compressor = None
+            self.seconds += time.perf_counter() - start
+
+            if self._compressor is None and self._policy is not None:
+                self._policy.record_compression(
+                    self.bytes_read, self.bytes_out + len(chunk), self.seconds
+                )
+            if chunk:
+                self.bytes_out += len(chunk)
+                return chunk
+
+        if self.finished is None:
+            self.finished = time.perf_counter()
+        return b""
+
+
+class CompressionPolicy:
+
+    """Decides whether and how request bodies are compressed
+
+    Bodies smaller than min_size are sent as they are.  Larger bodies are compressed
+    unless the link is fast enough that compressing costs more time than it saves:
+    the policy keeps running estimates of the upload bandwidth and of the speed and
+    ratio of the compressor, and compresses while
+
+        bandwidth < compression speed * (1 - compressed size / original size)
+
+    Until both are measured every eligible body is compressed.
+
+    The bandwidth is measured on streamed uploads (data and snapshots) of at least
+    min_size bytes, from the start of the request to the moment the last piece of the
+    body is handed to the socket, so the time the server spends on the request does not
+    make the link look slow.  The tail of the body still in the kernel's send buffer at
+    that moment is not waited for, which overestimates the bandwidth of bodies not much
+    larger than that buffer, and so errs towards not compressing.  json bodies, sent in
+    one piece, are not measured.
+
+    Args:
+        algorithm (str): one of ALGORITHMS, None disables compression
+        level (int): compression level, the algorithm's default when None
+        min_size (int): smallest body in bytes that is compressed
+        uploads (bool): also compress data and snapshot uploads, not only json bodies
+        bandwidth (float): fixed link bandwidth in bytes per second instead of the measured one
+        smoothing (float): weight of the newest measurement in the running estimates
+
+    Attributes:
+        stats (dict): totals of the bodies compressed so far and the current estimates
+    """
+
+    def __init__(
+        self,
+        algorithm: str = "gzip",
+        level: int = None,
+        min_size: int = 10000,
+        uploads: bool = True,
+        bandwidth: float = None,
+        smoothing: float = 0.2,
+    ):
+        if algorithm is not None:
+            # fail early when the algorithm is unknown or its package is missing
+            _compressor(algorithm, 1)
+        if level is None:
+            level = {"gzip": 6, "deflate": 6, "br": 4, "zstd": 3}.get(algorithm)
+
+        self.algorithm = algorithm
+        self.level = level
+        self.min_size = min_size
+        self.uploads = uploads
+        self.fixed_bandwidth = bandwidth
+        self.smoothing = smoothing
+        self.bandwidth = bandwidth
+        self.speed = None
+        self.ratio = None
+        self._totals = {"bodies": 0, "bytes": 0, "compressed_bytes": 0, "seconds": 0.0}
+        self._lock = threading.Lock()
+
+    def __getstate__(self):
+        state = dict(self.__dict__)
+        del state["_lock"]
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_string(cls, spec: str):
+        """Policy for a BOON_COMPRESSION value, "none" or "algorithm[:level]" """
+        if spec.lower() == "none":
+            return cls(algorithm=None)
+        algorithm, _, level = spec.partition(":")
+        return cls(algorithm=algorithm, level=int(level) if level else None)
+
+    @property
+    def stats(self):
+        with self._lock:
+            stats = dict(self._totals)
+            stats["ratio"] = (
+                stats["compressed_bytes"] / stats["bytes"] if stats["bytes"] else None
+            )
+            stats["bandwidth"] = self.bandwidth
+            stats["speed"] = self.speed
+            return stats
+
+    def should_compress(self, size: int = None):
+        """Whether a body of size bytes should be compressed, size None when unknown"""
+        if self.algorithm is None or (size is not None and size < self.min_size):
+            return False
+        if self.bandwidth is None or self.speed is None:
+            return True
+        return self.bandwidth < self.speed * (1.0 - self.ratio)
+
+    def compress(self, headers: dict, body, upload: bool = False):
+        """Return the headers and body to send, compressed when the policy says so
+
+        bytes bodies are compressed at once, streaming bodies are wrapped in a
+        CompressedBody.  The given headers are not modified.
+        """
+        if upload and not self.uploads:
+            return headers, body
+        if isinstance(body, str):
+            body = body.encode("utf-8")
+        size = len(body) if isinstance(body, bytes) else getattr(body, "len", None)
+        if not self.should_compress(size):
+            return headers, body
+
+        headers = dict(headers)
+        headers["content-encoding"] = self.algorithm
+        compressor = _compressor(self.algorithm, self.level)
+        if isinstance(body, bytes):
+            start = time.perf_counter()
+            compressed = compressor.compress(body) + compressor.flush()
+            self.record_compression(
+                len(body), len(compressed), time.perf_counter() - start
+            )
+            return headers, compressed
+        return headers, CompressedBody(body, compressor, self)
+
+    def record_compression(self, nbytes: int, compressed: int, seconds: float):
+        """Update the totals and the compressor estimates with one compressed body"""
+        with self._lock:
+            self._totals["bodies"] += 1
+            self._totals["bytes"] += nbytes
+            self._totals["compressed_bytes"] += compressed
+            self._totals["seconds"] += seconds
+            if nbytes >= self.min_size and seconds > 0:
+                self.speed = self._smooth(self.speed, nbytes / seconds)
+                self.ratio = self._smooth(self.ratio, compressed / nbytes)
+
+    def record_transfer(self, nbytes: int, seconds: float):
+        """Update the bandwidth estimate with the bytes of one request body and the seconds spent sending them"""
+        if self.fixed_bandwidth is not None or nbytes < self.min_size or seconds <= 0:
+            return
+        with self._lock:
+            self.bandwidth = self._smooth(self.bandwidth, nbytes / seconds)
+
+    def _smooth(self, estimate, value):
+        if estimate is None:
+            return value
+        return estimate + self.smoothing * (value - estimate)
+
+
+def compression_stats(bodies):
+    """Compression summary of the bodies sent by one upload, empty if none were compressed"""
+    bodies = [body for body in bodies if isinstance(body, CompressedBody)]
+    if not bodies:
+        return {}
+    nbytes = sum(body.bytes_read for body in bodies)
+    compressed = sum(body.bytes_out for body in bodies)
+    return {
+        "compressed_bytes": compressed,
+        "compression_ratio": compressed / nbytes if nbytes else None,
+        "compression_seconds": sum(body.seconds for body in bodies),
+    }
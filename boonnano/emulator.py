@@ -0,0 +1,284 @@
+import random
+import socket
+import struct
+import threading
+import time
+import zlib
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from .expert_client import LicenseProfile
+from .fake_server import FakeExpert
+from .multipart import CHUNK_SIZE
+
+
+class NetworkProfile:
+
+    """Link characteristics and faults emulated by an ExpertEmulator
+
+    Every request waits latency seconds (plus or minus a uniform jitter) before it is
+    answered, and every new connection waits one latency more for its handshake.
+    Request and response bodies move at no more than bandwidth bytes per second in
+    each direction.  Once a request has been read, it fails with probability
+    error_rate (503 answer), timeout_rate (no answer for stall seconds, then the
+    connection is closed) or reset_rate (the connection is reset).
+
+    Args:
+        latency (float): round trip time in seconds
+        jitter (float): largest deviation from latency in seconds
+        bandwidth (float): bytes per second in each direction, None for unlimited
+        error_rate (float): share of requests answered 503
+        timeout_rate (float): share of requests left unanswered
+        reset_rate (float): share of requests whose connection is reset
+        stall (float): seconds an unanswered request holds its connection
+    """
+
+    def __init__(
+        self,
+        latency: float = 0.0,
+        jitter: float = 0.0,
+        bandwidth: float = None,
+        error_rate: float = 0.0,
+        timeout_rate: float = 0.0,
+        reset_rate: float = 0.0,
+        stall: float = 5.0,
+    ):
+        self.latency = latency
+        self.jitter = jitter
+        self.bandwidth = bandwidth
+        self.error_rate = error_rate
+        self.timeout_rate = timeout_rate
+        self.reset_rate = reset_rate
+        self.stall = stall
+
+    def __repr__(self):
+        return "NetworkProfile({})".format(
+            ", ".join("{}={!r}".format(key, value) for key, value in vars(self).items())
+        )
+
+
+# rough figures for a data center network, a long-haul link and a cellular edge device
+NETWORK_PROFILES = {
+    "lan": NetworkProfile(latency=0.0005, jitter=0.0001, bandwidth=125e6),
+    "wan": NetworkProfile(latency=0.04, jitter=0.005, bandwidth=12.5e6),
+    "cellular": NetworkProfile(
+        latency=0.1,
+        jitter=0.04,
+        bandwidth=1.25e6,
+        error_rate=0.01,
+        reset_rate=0.005,
+    ),
+}
+
+
+class ExpertEmulator:
+
+    """Local HTTP stand-in for the Expert REST API on an emulated network
+
+    Requests are answered by a FakeExpert over a real socket, delayed, throttled and
+    failed as the NetworkProfile says, so connection pooling, compression, batching,
+    retries and timeouts can be compared on one machine.
+
+    Args:
+        network (NetworkProfile or str): link to emulate, or a name in NETWORK_PROFILES
+        expert (FakeExpert): the fake server answering the requests, a new one when None
+        compress (bool): gzip responses for clients that accept it
+        min_response_size (int): pad json responses with trailing whitespace to at least this many bytes
+        seed (int): seed for the jitter and fault injection, so runs can be repeated
+
+    Attributes:
+        server (str): url of the emulator, such as http://127.0.0.1:5007
+        stats (dict): counts of connections, requests, injected faults and body bytes moved
+
+    Use start() and stop(), or the emulator as a context manager.
+    """
+
+    def __init__(
+        self,
+        network="lan",
+        expert: FakeExpert = None,
+        compress: bool = False,
+        min_response_size: int = 0,
+        seed: int = None,
+    ):
+        if isinstance(network, str):
+            network = NETWORK_PROFILES[network]
+        self.network = network
+        self.expert = FakeExpert() if expert is None else expert
+        self.compress = compress
+        self.min_response_size = min_response_size
+        self.stats = {
+            "connections": 0,
+            "requests": 0,
+            "errors": 0,
+            "timeouts": 0,
+            "resets": 0,
+            "bytes_in": 0,
+            "bytes_out": 0,
+        }
+        self.server = None
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+        self._httpd = None
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.stop()
+
+    def start(self, host: str = "127.0.0.1", port: int = 0):
+        """Serve on a background thread, on a free port unless one is given"""
+        self._httpd = ThreadingHTTPServer((host, port), _handler(self))
+        self._httpd.daemon_threads = True
+        self.server = "http://{}:{}".format(host, self._httpd.server_address[1])
+        threading.Thread(target=self._httpd.serve_forever, daemon=True).start()
+        return self
+
+    def stop(self):
+        if self._httpd is not None:
+            self._httpd.shutdown()
+            self._httpd.server_close()
+            self._httpd = None
+
+    def license_profile(self, api_key: str = "emulator", api_tenant: str = "emulator"):
+        """LicenseProfile pointing at the emulator"""
+        return LicenseProfile(
+            server=self.server, api_key=api_key, api_tenant=api_tenant
+        )
+
+    def _count(self, key, amount=1):
+        with self._lock:
+            self.stats[key] += amount
+
+    def _delay(self):
+        """One latency with jitter"""
+        with self._lock:
+            jitter = self._random.uniform(-1.0, 1.0) * self.network.jitter
+        return max(0.0, self.network.latency + jitter)
+
+    def _fault(self):
+        """The fault injected into the next request, None for a regular answer"""
+        network = self.network
+        with self._lock:
+            draw = self._random.random()
+        for fault, rate in [
+            ("errors", network.error_rate),
+            ("timeouts", network.timeout_rate),
+            ("resets", network.reset_rate),
+        ]:
+            if draw < rate:
+                return fault
+            draw -= rate
+        return None
+
+
+class _Throttle:
+
+    """Paces the bytes moved in one direction of a request to the emulated bandwidth"""
+
+    def __init__(self, bandwidth):
+        self.bandwidth = bandwidth
+        self.start = time.perf_counter()
+        self.nbytes = 0
+
+    def __call__(self, nbytes):
+        self.nbytes += nbytes
+        if self.bandwidth:
+            remaining = self.start + self.nbytes / self.bandwidth - time.perf_counter()
+            if remaining > 0:
+                time.sleep(remaining)
+
+
+def _handler(emulator):
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+        disable_nagle_algorithm = True
+
+        def log_message(self, *args):
+            pass
+
+        def setup(self):
+            super().setup()
+            emulator._count("connections")
+            # connection handshake
+            time.sleep(emulator._delay())
+
+        def read_body(self):
+            throttle = _Throttle(emulator.network.bandwidth)
+            chunks = []
+            if self.headers.get("Transfer-Encoding") == "chunked":
+                while True:
+                    size = int(self.rfile.readline().split(b";")[0], 16)
+                    chunks.append(self.rfile.read(size))
+                    self.rfile.readline()
+                    throttle(size)
+                    if size == 0:
+                        break
+            else:
+                remaining = int(self.headers.get("Content-Length", 0))
+                while remaining:
+                    chunk = self.rfile.read(min(remaining, CHUNK_SIZE))
+                    if not chunk:
+                        break
+                    chunks.append(chunk)
+                    remaining -= len(chunk)
+                    throttle(len(chunk))
+            body = b"".join(chunks)
+            emulator._count("bytes_in", len(body))
+            return body
+
+        def respond(self):
+            body = self.read_body()
+            emulator._count("requests")
+            fault = emulator._fault()
+
+            if fault == "resets":
+                emulator._count("resets")
+                self.connection.setsockopt(
+                    socket.SOL_SOCKET, socket.SO_LINGER, struct.pack("ii", 1, 0)
+                )
+                self.close_connection = True
+                return
+            if fault == "timeouts":
+                emulator._count("timeouts")
+                time.sleep(emulator.network.stall)
+                self.close_connection = True
+                return
+            if fault == "errors":
+                emulator._count("errors")
+                code, payload, content_type = (
+                    503,
+                    b'{"code": 503, "message": "service unavailable"}',
+                    "application/json",
+                )
+            else:
+                code, payload, content_type = emulator.expert.handle(
+                    self.command, self.path, dict(self.headers.items()), body
+                )
+
+            if content_type == "application/json":
+                payload += b" " * (emulator.min_response_size - len(payload))
+            headers = {"Content-Type": content_type}
+            if emulator.compress and "gzip" in self.headers.get("Accept-Encoding", ""):
+                payload = zlib.compress(payload, wbits=31)
+                headers["Content-Encoding"] = "gzip"
+            headers["Content-Length"] = str(len(payload))
+
+            # one round trip on top of the transfer and processing time
+            time.sleep(emulator._delay())
+
+            self.send_response(code)
+            for key, value in headers.items():
+                self.send_header(key, value)
+            self.end_headers()
+            throttle = _Throttle(emulator.network.bandwidth)
+            view = memoryview(payload)
+            for index in range(0, len(view), CHUNK_SIZE):
+                chunk = view[index : index + CHUNK_SIZE]
+                throttle(len(chunk))
+                self.wfile.write(chunk)
+            emulator._count("bytes_out", len(payload))
+
+        do_GET = do_POST = do_DELETE = respond
+
+    return Handler
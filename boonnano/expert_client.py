@@ -1,11 +1,41 @@
+from collections import deque
+from contextlib import contextmanager
 from functools import wraps
-import json
+import inspect
+import numbers
 import os
-import tarfile
-import gzip
-
-import requests
-import numpy as np
+import sys
+import threading
+import time
+
+# requests, numpy, tarfile, json and concurrent.futures are imported where they are
+# needed, so that importing boonnano stays fast for jobs that make a few calls
+
+from .codec import get_codec
+from .compression import CompressedBody, CompressionPolicy, compression_stats
+from .multipart import CHUNK_SIZE, MultipartEncoder
+from .nano_handle import NanoHandle
+from .results import RESULT_FORMATS, ResultsParser, decode_results
+from .retry import (
+    IDEMPOTENT_METHODS,
+    LatencyHistogram,
+    RetryPolicy,
+    endpoint_name,
+    is_transient,
+)
+from .snapshot import (
+    MAGIC_NUMBER,
+    Manifest,
+    SnapshotReader,
+    SnapshotRef,
+    SnapshotStore,
+    SnapshotWriter,
+    read_magic_number,
+    snapshot_filename,
+    snapshot_instance_ids,
+)
+from .streaming import micro_batches, pipeline
+from .transport import Transport
 
 # urllib3.disable_warnings(urllib3.exceptions.InsecureRequestWarning)
 
@@ -14,6 +44,27 @@ import numpy as np
 ############################
 
 
+def _pool_adapter(pool_size: int):
+    """HTTPAdapter sharing pool_size connections, keeping TCP_NODELAY on connections to the proxy
+
+    urllib3 clears the default socket options of proxy pools, so a request whose
+    headers and body are written separately waits for a delayed ack (~40 ms) on every
+    reused proxy connection.
+    """
+    from requests.adapters import HTTPAdapter
+    from urllib3.connection import HTTPConnection
+
+    class ProxyAdapter(HTTPAdapter):
+        def proxy_manager_for(self, proxy, **proxy_kwargs):
+            proxy_kwargs.setdefault(
+                "socket_options", HTTPConnection.default_socket_options
+            )
+            return super().proxy_manager_for(proxy, **proxy_kwargs)
+
+    # threads share pool_size connections, waiting for one when all are busy
+    return ProxyAdapter(pool_maxsize=pool_size, pool_block=True)
+
+
 class BoonException(Exception):
     def __init__(self, code=None, message=None):
         self.status_code = code
@@ -34,19 +85,58 @@ class LicenseProfile:
         self.proxy_server = proxy_server
 
 
-class ExpertClient:
+# also the names of the numpy dtypes
+NUMERIC_FORMATS = ["int16", "uint16", "float32"]
 
-    """Primary handle for BoonNano Pod instances
 
-    This is the primary handle to manage a nano pod instance
+def _is_array(value):
+    """Whether value is a numpy array, without importing numpy"""
+    numpy = sys.modules.get("numpy")
+    return numpy is not None and isinstance(value, numpy.ndarray)
 
-    Environment:
-    BOON_SSL_CERT: specifies location of ssl certification
-    BOON_SSL_VERIFY: verify cert of server (default is true, ignored if http connection)
-    BOON_TIMEOUT: request timeout (default is 300)
+
+def _check_configured(client, args, kwargs):
+    instance_id = kwargs["instance_id"] if "instance_id" in kwargs else args[0]
+    if client._nano(instance_id).numeric_format not in NUMERIC_FORMATS:
+        raise BoonException(400, "nano instance is not configured")
+
+
+def _is_configured(f):
+    """Reject calls for a nano instance whose numeric format the client does not know
+
+    The format is known once the instance is configured, restored or its config is
+    fetched through the client.
     """
+    if inspect.iscoroutinefunction(f):
+
+        @wraps(f)
+        async def async_inner(self, *args, **kwargs):
+            _check_configured(self, args, kwargs)
+            return await f(self, *args, **kwargs)
+
+        return async_inner
+
+    @wraps(f)
+    def inner(self, *args, **kwargs):
+        _check_configured(self, args, kwargs)
+        return f(self, *args, **kwargs)
 
-    def __init__(self, profile: LicenseProfile = None):
+    return inner
+
+
+class _BaseClient:
+
+    """Profile, settings and request helpers shared by ExpertClient and AsyncExpertClient"""
+
+    def __init__(
+        self,
+        profile: LicenseProfile = None,
+        pool_size: int = None,
+        keep_alive: bool = True,
+        json_codec=None,
+        compression: CompressionPolicy = None,
+        retry: RetryPolicy = None,
+    ):
         self.results = [
             "ID",
             "SI",
@@ -66,9 +156,13 @@ class ExpertClient:
         self.user_agent = "Boon Logic / expert-python-sdk / requests"
         self.server = profile.server
         self.proxy_server = profile.proxy_server
+        self.proxy_url = None
+        if self.proxy_server:
+            self.proxy_url = self.proxy_server
+            if "://" not in self.proxy_url:
+                self.proxy_url = "http://" + self.proxy_url
         self.api_key = profile.api_key
         self.api_tenant = profile.api_tenant
-        self.numeric_format = ""
 
         if self.server is None:
             raise BoonException(400, "server not specified")
@@ -80,15 +174,99 @@ class ExpertClient:
         self.ssl_cert = os.environ.get("BOON_SSL_CERT", None)
         self.ssl_verify = os.environ.get("BOON_SSL_VERIFY", "true").lower() == "true"
         self.timeout = int(os.environ.get("BOON_TIMEOUT", "300"))
+        if pool_size is None:
+            pool_size = int(os.environ.get("BOON_POOL_SIZE", "10"))
+        if pool_size < 1:
+            raise BoonException(400, "pool_size must be at least 1")
+        self.pool_size = pool_size
+        self.keep_alive = keep_alive
+        if json_codec is None:
+            json_codec = os.environ.get("BOON_JSON_CODEC", None)
+        if json_codec is None or isinstance(json_codec, str):
+            codec = get_codec(json_codec)
+            if codec is None:
+                raise BoonException(
+                    400, 'json codec "{}" is not available'.format(json_codec)
+                )
+            json_codec = codec
+        self.codec = json_codec
+        if compression is None:
+            spec = os.environ.get("BOON_COMPRESSION", None)
+            if spec is None:
+                # json bodies only, as the server may not accept compressed uploads
+                compression = CompressionPolicy(uploads=False)
+            else:
+                try:
+                    compression = CompressionPolicy.from_string(spec)
+                except (ImportError, ValueError):
+                    raise BoonException(
+                        400, 'compression "{}" is not available'.format(spec)
+                    )
+        self.compression = compression
+        self.retry = RetryPolicy() if retry is None else retry
+        self._latency = {}
+        self._nanos = {}
+        self._init_process_state()
 
         # set up base url
         self.url = self.server + "/expert/v3"
         if "http" not in self.server:
             self.url = "http://" + self.url
 
+    def _init_process_state(self):
+        """Reset the pool, worker threads and locks, which belong to a single process"""
+        self._pid = os.getpid()
+        self._session = None
+        self._executor = None
+        # guards the lazily created session and executor
+        self._lock = threading.Lock()
+        self._latency_lock = threading.Lock()
+        self._local = threading.local()
+
+    def _check_process(self):
+        """Leave the pool and worker threads inherited through a fork to the parent process
+
+        Sockets shared with the parent would mix up the responses of both processes, so
+        the child drops them without closing them and builds its own pool on demand.
+        """
+        if self._pid != os.getpid():
+            self._init_process_state()
+
+    def __getstate__(self):
+        """Profile, settings, transport and instance handles, without the pool or latency history"""
+        state = dict(self.__dict__)
+        for key in [
+            "_pid",
+            "_session",
+            "_executor",
+            "_lock",
+            "_latency_lock",
+            "_local",
+        ]:
+            del state[key]
+        state["_latency"] = {}
+        state["_nanos"] = {
+            instance_id: (dict(nano), nano.numeric_format, nano.feature_count)
+            for instance_id, nano in self._nanos.items()
+        }
+        return state
+
+    def __setstate__(self, state):
+        nanos = state.pop("_nanos")
+        self.__dict__.update(state)
+        self._nanos = {}
+        for instance_id, (metadata, numeric_format, feature_count) in nanos.items():
+            nano = self._nanos[instance_id] = NanoHandle(self, instance_id, metadata)
+            nano.numeric_format = numeric_format
+            nano.feature_count = feature_count
+        self._init_process_state()
+
     @classmethod
     def from_license_file(
-        cls, license_file: str = "~/.BoonLogic.license", license_id: str = "default"
+        cls,
+        license_file: str = "~/.BoonLogic.license",
+        license_id: str = "default",
+        **kwargs,
     ):
         """Primary handle for BoonNano Pod instances
 
@@ -97,11 +275,14 @@ class ExpertClient:
         Args:
         license_file (str): path to .BoonLogic license file
         license_id (str): license identifier label found within the .BoonLogic.license configuration file
+        **kwargs: connection settings passed through to the ExpertClient constructor (pool_size, keep_alive, json_codec,
+            compression, retry)
 
         Environment:
         BOON_LICENSE_FILE: Specifies location of BOON_LICENSE_FILE.  This will override the license_file parameter
         BOON_LICENSE_ID: Specifies the profile id.  This will override the license_id parameter
         """
+        import json
 
         license_file = os.environ.get("BOON_LICENSE_FILE", license_file)
         license_id = os.environ.get("BOON_LICENSE_ID", license_id)
@@ -142,11 +323,14 @@ class ExpertClient:
                 proxy_server=proxy_server,
                 api_key=api_key,
                 api_tenant=api_tenant,
-            )
+            ),
+            **kwargs,
         )
 
     @classmethod
-    def from_dict(cls, profile_dict: dict = None):
+    def from_dict(cls, profile_dict: dict = None, **kwargs):
+        import json
+
         try:
             server = profile_dict.get("server", None)
             api_key = profile_dict.get("api-key", None)
@@ -160,77 +344,10 @@ class ExpertClient:
                 proxy_server=proxy_server,
                 api_key=api_key,
                 api_tenant=api_tenant,
-            )
+            ),
+            **kwargs,
         )
 
-    def _is_configured(f):
-        @wraps(f)
-        def inner(*args, **kwargs):
-            if args[0].numeric_format not in ["int16", "uint16", "float32"]:
-                raise BoonException(400, "nano instance is not configured")
-            return f(*args, **kwargs)
-
-        return inner
-
-    def _api_call(self, method, url, headers, body=None, fields=None):
-        """Make a REST call to the Expert server and handle the response"""
-        headers["x-token"] = self.api_key
-        headers["User-Agent"] = self.user_agent
-
-        if "Content-Type" in headers and "json" in headers["Content-Type"]:
-            body = json.dumps(body)
-
-        if method == "POST" and body is not None and len(body) > 10000:
-            headers["content-encoding"] = "gzip"
-            body = gzip.compress(body.encode("utf-8"))
-
-        try:
-            response = requests.request(
-                method=method,
-                url=url,
-                headers=headers,
-                data=body,
-                verify=self.ssl_verify,
-                timeout=self.timeout,
-                cert=self.ssl_cert,
-                files=fields,
-            )
-        except requests.exceptions.Timeout:
-            # request timed out
-            raise BoonException(500, "request timed out")
-        except requests.exceptions.ConnectionError:
-            raise BoonException(500, "server does not exist")
-
-        if response.status_code > 299:
-            try:
-                msg = response.json()
-                try:
-                    msg = msg.get("message", "no message")
-                except AttributeError:
-                    pass
-            except json.JSONDecodeError:
-                msg = response.text
-            raise BoonException(response.status_code, msg)
-
-        try:
-            respbody = response.json()
-        except Exception:
-            # save nano or load data
-            return response.content
-
-        # if code is returned in the message, it should agree with the header
-        if (
-            isinstance(respbody, dict)
-            and "code" in respbody
-            and respbody["code"] != response.status_code
-        ):
-            raise BoonException(respbody["code"], respbody.get("message", "no message"))
-
-        if isinstance(respbody, dict) and "errorMessage" in respbody:
-            raise BoonException(500, respbody["errorMessage"])
-
-        return response
-
     def _format_results(self, results):
         results_str = ""
         if str(results) == "All":
@@ -239,57 +356,26 @@ class ExpertClient:
             results_str = results if isinstance(results, str) else ",".join(results)
         return results_str
 
-    def open_nano(self, instance_id: str):
-        """Creates or attaches to a nano pod instance
-
-        Args:
-            instance_id (str): instance identifier to assign to new pod instance
-
-        Returns:
-            response (dict): metadata about the instance
-
-        """
-
-        url = (
-            self.url + "/nanoInstance/" + instance_id + "?api-tenant=" + self.api_tenant
-        )
-        headers = {"Content-Type": "application/json"}
-        response = self._api_call("POST", url, headers)
-
-        return response.json()
-
-    def get_nano_instance(self, instance_id: str):
-        """Get instance info
-
-        Args:
-            instance_id (str): instance identifier to assign to new pod instance
-
-        Returns:
-            response (dict): metadata about the instance
-
-        """
-
-        url = (
-            self.url + "/nanoInstance/" + instance_id + "?api-tenant=" + self.api_tenant
-        )
-        headers = {"Content-Type": "application/json"}
-        response = self._api_call("GET", url, headers)
-
-        return response.json()
-
-    def close_nano(self, instance_id: str):
-        """Closes the pod instance
-
-        Args:
-            instance_id (str): instance identifier to assign to new pod instance
+    def _check_results_format(self, results_format):
+        if results_format not in RESULT_FORMATS:
+            raise BoonException(
+                400, "results_format must be one of " + ", ".join(RESULT_FORMATS)
+            )
 
-        """
+    def _check_incremental(self, results_format, incremental):
+        if incremental and results_format == "dict":
+            raise BoonException(
+                400,
+                'incremental parsing requires results_format "numpy" or "structured"',
+            )
 
-        url = (
-            self.url + "/nanoInstance/" + instance_id + "?api-tenant=" + self.api_tenant
-        )
-        headers = {"Content-Type": "application/json"}
-        self._api_call("DELETE", url, headers)
+    @contextmanager
+    def _parse_errors(self):
+        """Report a results response that the incremental parser rejects"""
+        try:
+            yield
+        except ValueError as e:
+            raise BoonException(500, "malformed results response: {}".format(e))
 
     def create_config(
         self,
@@ -353,21 +439,12 @@ class ExpertClient:
 
         """
 
-        if isinstance(min_val, (int, float, np.floating, np.integer)):
-            if isinstance(min_val, np.integer):
-                min_val = int(min_val)
-            if isinstance(min_val, np.floating):
-                min_val = float(min_val)
+        # numpy values are left as they are, the json codec encodes them
+        if isinstance(min_val, numbers.Real):
             min_val = [min_val] * feature_count
-        if isinstance(max_val, (int, float, np.floating, np.integer)):
-            if isinstance(max_val, np.integer):
-                max_val = int(max_val)
-            if isinstance(max_val, np.floating):
-                max_val = float(max_val)
+        if isinstance(max_val, numbers.Real):
             max_val = [max_val] * feature_count
-        if isinstance(weight, (int, np.integer)):
-            if isinstance(weight, np.integer):
-                weight = int(weight)
+        if isinstance(weight, numbers.Integral):
             weight = [weight] * feature_count
 
         if exclusions is None:
@@ -379,9 +456,9 @@ class ExpertClient:
         config["features"] = []
 
         if (
-            (isinstance(min_val, list) or isinstance(min_val, np.ndarray))
-            and (isinstance(max_val, list) or isinstance(max_val, np.ndarray))
-            and (isinstance(weight, list) or isinstance(weight, np.ndarray))
+            (isinstance(min_val, list) or _is_array(min_val))
+            and (isinstance(max_val, list) or _is_array(max_val))
+            and (isinstance(weight, list) or _is_array(weight))
         ):
             if len(min_val) != len(max_val) or len(min_val) != len(weight):
                 raise BoonException(
@@ -435,6 +512,461 @@ class ExpertClient:
 
         return config
 
+    def _nano(self, instance_id: str):
+        """Return the handle for an instance, creating it on first use"""
+        nano = self._nanos.get(instance_id)
+        if nano is None:
+            nano = self._nanos.setdefault(instance_id, NanoHandle(self, instance_id))
+        return nano
+
+    def _scratch_buffer(self):
+        """Return the data conversion buffer of the calling thread"""
+        scratch = getattr(self._local, "scratch", None)
+        if scratch is None:
+            scratch = self._local.scratch = ScratchBuffer()
+        return scratch
+
+    def _data_request(self, nano, data, append_data):
+        """Build the url, headers and streaming body that upload a raw data buffer"""
+        body = MultipartEncoder("data", "dummy_filename.bin", data)
+        url = nano.urls["data"] + "&fileType=raw&appendData=" + str(append_data).lower()
+        headers = dict(nano.upload_headers)
+        headers["Content-Type"] = body.content_type
+        headers, body = self.compression.compress(headers, body, upload=True)
+        return url, headers, body
+
+    def _streaming_request(self, nano, data, results):
+        """Build the url, headers and streaming body that cluster a raw data buffer"""
+        body = MultipartEncoder("data", "dummy_filename.bin", data)
+        url = nano.urls["nanoRunStreaming"] + "&fileType=raw"
+        if results is not None:
+            url += "&results=" + self._format_results(results)
+        headers = dict(nano.upload_headers)
+        headers["Content-Type"] = body.content_type
+        headers, body = self.compression.compress(headers, body, upload=True)
+        return url, headers, body
+
+    def _snapshot_writer(self, filename):
+        """SnapshotWriter for a save_nano destination, a filename or a SnapshotStore"""
+        if isinstance(filename, SnapshotStore):
+            return filename._writer()
+        return SnapshotWriter(filename)
+
+    def _commit_snapshot(self, instance_id, writer, filename, start):
+        """Move a downloaded snapshot to its save_nano destination and return the save_nano stats"""
+        snapshot = None
+        try:
+            if isinstance(filename, SnapshotStore):
+                snapshot = filename._add(instance_id, writer)
+            else:
+                writer.commit()
+        except OSError as e:
+            raise BoonException(message=str(e))
+        finally:
+            writer.discard()
+
+        stats = transfer_stats(writer.size, time.perf_counter() - start)
+        stats["sha256"] = writer.sha256
+        if snapshot is not None:
+            stats["snapshot"] = snapshot
+        return stats
+
+    @contextmanager
+    def _snapshot_source(self, filename, sha256):
+        """Open a saved pod instance for upload, reporting a digest mismatch as a BoonException"""
+        try:
+            source = SnapshotReader(filename, sha256)
+        except OSError as e:
+            raise BoonException(message=str(e))
+        try:
+            with source:
+                yield source
+        except ValueError as e:
+            raise BoonException(message=str(e))
+        except BoonException:
+            # transports may report a body that failed to read as a lost connection
+            if source.error is None:
+                raise
+            raise BoonException(message=str(source.error))
+
+    def _snapshot_request(self, nano, filename, source):
+        """Build the url, headers and streaming body that upload a saved pod instance"""
+        body = MultipartEncoder("snapshot", filename, source, length=source.length)
+        headers = dict(nano.upload_headers)
+        headers["Content-Type"] = body.content_type
+        headers, body = self.compression.compress(headers, body, upload=True)
+        return nano.urls["snapshot"], headers, body
+
+    def _record_transfer(self, body, start):
+        """Feed the bytes sent with a request body to the compression bandwidth estimate
+
+        Only streamed bodies are measured, from start to the moment the last piece was
+        read for sending, so the time the server takes to answer is left out.  A bytes
+        body is handed over at once, its sending cannot be told from the server's work.
+        """
+        if not isinstance(body, (CompressedBody, MultipartEncoder)):
+            return
+        if body.finished is None:
+            # the server answered before the whole body was sent
+            return
+        nbytes = body.bytes_out if isinstance(body, CompressedBody) else body.bytes_read
+        self.compression.record_transfer(nbytes, body.finished - start)
+
+    def _encode_body(self, method, headers, body):
+        """Add the authentication headers and serialize (and compress) a json request body
+
+        The given headers are not modified, the headers to send are returned with the body.
+        """
+        if "x-token" not in headers:
+            headers = dict(headers)
+            headers["x-token"] = self.api_key
+            headers["User-Agent"] = self.user_agent
+
+        if "Content-Type" in headers and "json" in headers["Content-Type"]:
+            body = self.codec.dumps(body)
+
+            if method == "POST":
+                headers, body = self.compression.compress(headers, body)
+
+        return headers, body
+
+    def _histogram(self, method, url):
+        """Latency histogram of an endpoint, created on first use"""
+        key = method + " " + endpoint_name(url)
+        histogram = self._latency.get(key)
+        if histogram is None:
+            with self._latency_lock:
+                histogram = self._latency.setdefault(key, LatencyHistogram())
+        return histogram
+
+    def latency_stats(self):
+        """Request latencies per endpoint
+
+        Returns:
+            stats (dict): for each "METHOD endpoint", the number of requests and the mean,
+                p50, p95 and p99 latency in seconds
+
+        """
+        return {key: histogram.stats for key, histogram in self._latency.items()}
+
+    def _check_response(self, status_code, respbody):
+        """Raise if a successful response carries an error in its body"""
+        # if code is returned in the message, it should agree with the header
+        if (
+            isinstance(respbody, dict)
+            and "code" in respbody
+            and respbody["code"] != status_code
+        ):
+            raise BoonException(respbody["code"], respbody.get("message", "no message"))
+
+        if isinstance(respbody, dict) and "errorMessage" in respbody:
+            raise BoonException(500, respbody["errorMessage"])
+
+
+class ExpertClient(_BaseClient):
+
+    """Primary handle for BoonNano Pod instances
+
+    This is the primary handle to manage a nano pod instance
+
+    Environment:
+    BOON_SSL_CERT: specifies location of ssl certification
+    BOON_SSL_VERIFY: verify cert of server (default is true, ignored if http connection)
+    BOON_TIMEOUT: request timeout (default is 300)
+    BOON_POOL_SIZE: maximum number of pooled connections kept open to the server (default is 10)
+    BOON_JSON_CODEC: json backend for request and response bodies, one of orjson, simdjson or json
+        (default is the fastest one installed)
+    BOON_COMPRESSION: request compression, "none" or an algorithm with an optional level such as "gzip:6",
+        covering data and snapshot uploads (default compresses large json bodies with gzip)
+
+    Args:
+        profile (LicenseProfile): server, proxy and credentials to use, requests go through
+            proxy_server (an http proxy, https servers are reached through CONNECT tunnels) when it is set
+        pool_size (int): maximum number of pooled connections, overrides BOON_POOL_SIZE
+        keep_alive (bool): keep connections open between requests so they can be reused
+        json_codec: json backend name, or an object with dumps and loads methods, overrides BOON_JSON_CODEC
+        compression (CompressionPolicy): when and how request bodies are compressed, overrides BOON_COMPRESSION
+        retry (RetryPolicy): retries and hedging of idempotent (GET) requests, default retries
+            connection failures twice without hedging
+        transport (Transport): sends the requests instead of the pooled requests session, such as a
+            FakeTransport that answers them in-process without a server
+
+    The client holds a pool of keep-alive connections that is shared by every call.  Use
+    close() (or the client as a context manager) to release the pooled connections.
+    After a fork the child process leaves the inherited pool to the parent and opens its
+    own on its first request.  Pickling a client sends its profile, settings and
+    instance handles only, so clients can be passed to multiprocessing workers.
+
+    One client can be shared by any number of threads.  Requests carry no state from
+    one call to the next besides the numeric format and feature count each instance
+    handle records, threads beyond pool_size wait for a free pooled connection rather
+    than opening more.
+    """
+
+    def __init__(
+        self,
+        profile: LicenseProfile = None,
+        pool_size: int = None,
+        keep_alive: bool = True,
+        json_codec=None,
+        compression: CompressionPolicy = None,
+        retry: RetryPolicy = None,
+        transport: Transport = None,
+    ):
+        super().__init__(
+            profile=profile,
+            pool_size=pool_size,
+            keep_alive=keep_alive,
+            json_codec=json_codec,
+            compression=compression,
+            retry=retry,
+        )
+        self.transport = transport
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def close(self):
+        """Release the pooled connections held by this client
+
+        The client remains usable, a new pool is created on the next request.
+        """
+        self._check_process()
+        with self._lock:
+            session, self._session = self._session, None
+            executor, self._executor = self._executor, None
+        if session is not None:
+            session.close()
+        if executor is not None:
+            executor.shutdown(wait=False)
+        if self.transport is not None:
+            self.transport.close()
+
+    def _get_session(self):
+        """Return the pooled session, creating it on first use"""
+        self._check_process()
+        session = self._session
+        if session is not None:
+            return session
+        with self._lock:
+            if self._session is not None:
+                return self._session
+            import requests
+
+            adapter = _pool_adapter(self.pool_size)
+            session = requests.Session()
+            session.mount("http://", adapter)
+            session.mount("https://", adapter)
+            session.verify = self.ssl_verify
+            session.cert = self.ssl_cert
+            if self.proxy_url:
+                # the adapter pools the proxy connections and CONNECT tunnels like direct ones
+                session.proxies = {"http": self.proxy_url, "https": self.proxy_url}
+            if not self.keep_alive:
+                session.headers["Connection"] = "close"
+            self._session = session
+        return session
+
+    def _api_call(self, method, url, headers, body=None, fields=None):
+        """Make a REST call to the Expert server and return the decoded response"""
+
+        def fetch():
+            response = self._send(method, url, headers, body, fields)
+            return response.status_code, self._read_content(response)
+
+        status_code, content = self._retrying(method, url, fetch)
+
+        try:
+            respbody = self.codec.loads(content)
+        except ValueError:
+            # save nano or load data
+            return bytes(content)
+
+        self._check_response(status_code, respbody)
+
+        return respbody
+
+    def _retrying(self, method, url, fetch, hedge: bool = True):
+        """Run fetch, retrying it when the method is idempotent, and hedging it as well with hedge
+
+        The latency of every successful call is recorded in the endpoint's histogram.
+        """
+        histogram = self._histogram(method, url)
+        idempotent = method in IDEMPOTENT_METHODS
+        retries = self.retry.retries if idempotent else 0
+        delay = self.retry.hedge_delay(histogram) if idempotent and hedge else None
+
+        attempt = 0
+        while True:
+            start = time.perf_counter()
+            try:
+                result = fetch() if delay is None else self._hedged(fetch, delay)
+            except BoonException as e:
+                if attempt >= retries or not is_transient(e):
+                    raise
+                time.sleep(self.retry.delay(attempt))
+                attempt += 1
+                continue
+            histogram.record(time.perf_counter() - start)
+            return result
+
+    def _hedged(self, fetch, delay):
+        """Run fetch, running it a second time if the first has not answered after delay seconds"""
+        from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+        self._check_process()
+        with self._lock:
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(
+                    max_workers=self.pool_size, thread_name_prefix="boonnano-hedge"
+                )
+            executor = self._executor
+        first = executor.submit(fetch)
+        done, _ = wait([first], timeout=delay)
+        if done:
+            return first.result()
+
+        # the slower request is left to finish, its answer is dropped
+        pending = {first, executor.submit(fetch)}
+        while pending:
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                if future.exception() is None:
+                    return future.result()
+        return future.result()
+
+    def _send(self, method, url, headers, body=None, fields=None):
+        """Make a REST call to the Expert server, raise on an error status and return the raw response
+
+        The response body is not read yet, see _read_content.
+        """
+        headers, body = self._encode_body(method, headers, body)
+
+        start = time.perf_counter()
+        if self.transport is not None:
+            response = self.transport.request(
+                method, url, headers, body, fields, self.timeout
+            )
+        else:
+            session = self._get_session()
+            with self._transport_errors():
+                response = session.request(
+                    method=method,
+                    url=url,
+                    headers=headers,
+                    data=body,
+                    timeout=self.timeout,
+                    files=fields,
+                    stream=True,
+                    # passed per request, as requests lets proxy environment variables
+                    # override the session proxies
+                    proxies=session.proxies,
+                )
+        self._record_transfer(body, start)
+
+        if response.status_code > 299:
+            content = self._read_content(response)
+            try:
+                msg = self.codec.loads(content)
+                try:
+                    msg = msg.get("message", "no message")
+                except AttributeError:
+                    pass
+            except ValueError:
+                msg = bytes(content).decode("utf-8", "replace")
+            raise BoonException(response.status_code, msg)
+
+        return response
+
+    def _read_content(self, response):
+        """Read the body of a streamed response
+
+        Compressed bodies are decoded chunk by chunk as they arrive and collected in one
+        buffer, which the json codecs parse in place, so the compressed body and extra
+        copies of the decoded body are never held at once.
+        """
+        content = bytearray()
+        try:
+            with self._transport_errors():
+                for chunk in response.iter_content(CHUNK_SIZE):
+                    content += chunk
+        finally:
+            # hands the connection back to the pool even when reading failed
+            response.close()
+        return content
+
+    @contextmanager
+    def _transport_errors(self):
+        """Turn connection failures while sending or reading into a BoonException"""
+        import requests
+
+        try:
+            yield
+        except requests.exceptions.Timeout:
+            # request timed out
+            raise BoonException(500, "request timed out")
+        except (
+            requests.exceptions.ConnectionError,
+            requests.exceptions.ChunkedEncodingError,
+        ):
+            raise BoonException(500, "server does not exist")
+
+    def open_nano(self, instance_id: str):
+        """Creates or attaches to a nano pod instance
+
+        Args:
+            instance_id (str): instance identifier to assign to new pod instance
+
+        Returns:
+            nano (NanoHandle): handle for the instance, also a dictionary of metadata about the instance
+
+        """
+
+        nano = self._nano(instance_id)
+        url = nano.urls["nanoInstance"]
+        headers = nano.json_headers
+        response = self._api_call("POST", url, headers)
+
+        nano.update(response)
+
+        return nano
+
+    def get_nano_instance(self, instance_id: str):
+        """Get instance info
+
+        Args:
+            instance_id (str): instance identifier to assign to new pod instance
+
+        Returns:
+            response (dict): metadata about the instance
+
+        """
+
+        nano = self._nano(instance_id)
+        url = nano.urls["nanoInstance"]
+        headers = nano.json_headers
+        response = self._api_call("GET", url, headers)
+
+        return response
+
+    def close_nano(self, instance_id: str):
+        """Closes the pod instance
+
+        Args:
+            instance_id (str): instance identifier to assign to new pod instance
+
+        """
+
+        nano = self._nano(instance_id)
+        url = nano.urls["nanoInstance"]
+        headers = nano.json_headers
+        self._api_call("DELETE", url, headers)
+
+        self._nanos.pop(instance_id, None)
+
     def configure_nano(
         self,
         instance_id: str,
@@ -523,19 +1055,14 @@ class ExpertClient:
 
         body = config
 
-        url = (
-            self.url
-            + "/clusterConfig/"
-            + instance_id
-            + "?api-tenant="
-            + self.api_tenant
-        )
-        headers = {"Content-Type": "application/json"}
+        nano = self._nano(instance_id)
+        url = nano.urls["clusterConfig"]
+        headers = nano.json_headers
         response = self._api_call("POST", url, headers, body)
 
-        self.numeric_format = config["numericFormat"]
+        nano._set_config(config)
 
-        return response.json()
+        return response
 
     def nano_list(self):
         """Returns list of nano instances allocated for a pod
@@ -549,75 +1076,355 @@ class ExpertClient:
         headers = {"Content-Type": "application/json"}
         response = self._api_call("GET", url, headers)
 
-        return response.json()
+        return response
 
     @_is_configured
-    def save_nano(self, instance_id: str, filename: str):
+    def save_nano(self, instance_id: str, filename):
         """serialize a nano pod instance and save to a local file
 
+        The snapshot is streamed to a temporary file next to filename while it is hashed,
+        then flushed to disk and renamed to filename, so memory use does not depend on the
+        snapshot size and filename is never left truncated.
+
         Args:
             instance_id (str): instance identifier to assign to new pod instance
-            filename (str): path to local file where saved pod instance should be written
+            filename (str or SnapshotStore): path to local file where saved pod instance should be
+                written, or a SnapshotStore to record the snapshot in
+
+        Returns:
+            stats (dict): bytes written, seconds taken, throughput in bytes_per_sec and the sha256
+                hex digest of the snapshot, with the SnapshotRef of the snapshot as snapshot when
+                it was saved to a SnapshotStore
 
         """
+        return self._save_snapshot(instance_id, filename)
 
-        url = self.url + "/snapshot/" + instance_id + "?api-tenant=" + self.api_tenant
-        headers = {"Content-Type": "application/json"}
-        response = self._api_call("GET", url, headers)
+    def _save_snapshot(self, instance_id, filename):
+        """save_nano, without requiring that the client configured the instance"""
+        nano = self._nano(instance_id)
+        url = nano.urls["snapshot"]
+        headers = nano.json_headers
 
-        # at this point, the call succeeded, saves the result to a local file
-        try:
-            with open(filename, "wb") as fp:
-                fp.write(response)
-        except Exception as e:
-            raise BoonException(message=str(e))
-
-    def restore_nano(self, instance_id: str, filename: str):
+        def fetch():
+            response = self._send("GET", url, headers)
+            try:
+                writer = self._snapshot_writer(filename)
+            except OSError as e:
+                response.close()
+                raise BoonException(message=str(e))
+            try:
+                with self._transport_errors():
+                    for chunk in response.iter_content(CHUNK_SIZE):
+                        writer.feed(chunk)
+                writer.close()
+            except OSError as e:
+                writer.discard()
+                raise BoonException(message=str(e))
+            except BaseException:
+                writer.discard()
+                raise
+            finally:
+                response.close()
+            return writer
+
+        start = time.perf_counter()
+        # a second download racing the first would only double the transfer
+        writer = self._retrying("GET", url, fetch, hedge=False)
+        return self._commit_snapshot(instance_id, writer, filename, start)
+
+    def restore_nano(self, instance_id: str, filename, sha256: str = None):
         """Restore a nano pod instance from local file
 
+        The magic number is checked by decompressing the start of the file only, then the
+        file is streamed to the server and hashed as it is sent, memory use does not
+        depend on the snapshot size.
+
         Args:
             instance_id (str): instance identifier to assign to new pod instance
-            filename (str): path to local file containing saved pod instance
+            filename (str or SnapshotRef): path to local file containing saved pod instance, or
+                a snapshot of a SnapshotStore, which is verified against its sha256
+            sha256 (str): expected hex digest of the file, as returned by save_nano, the upload
+                is abandoned before its end when the file does not match
 
         Returns:
             response (dict): config dictionary of the uploaded nano
 
         """
 
-        # verify that input file is a valid nano file (gzip'd tar with Magic Number)
+        if isinstance(filename, SnapshotRef):
+            filename, sha256 = filename.path, sha256 or filename.sha256
+        check_nano_file(filename)
+
+        nano = self._nano(instance_id)
+        with self._snapshot_source(filename, sha256) as source:
+            url, headers, body = self._snapshot_request(nano, filename, source)
+            response = self._api_call("POST", url, headers, body)
+
+        nano._set_config(response)
+
+        return response
+
+    def migrate_nano(
+        self,
+        instance_id: str,
+        target,
+        target_instance_id: str = None,
+        verify: bool = False,
+    ):
+        """Copy a nano pod instance to another Expert server, streaming the snapshot between them
+
+        The snapshot is uploaded to target as it is downloaded, one piece at a time, so it
+        is neither held in memory nor written to disk.  The instance is opened (created
+        when missing) on target once the snapshot starts to arrive, and left as it was on
+        this server.  An instance created on target by a migration that fails is closed.
+
+        Args:
+            instance_id (str): instance identifier of the pod instance to migrate
+            target (ExpertClient): client of the server to migrate to
+            target_instance_id (str): instance identifier on target, instance_id by default
+            verify (bool): check that the configuration of the migrated instance is the source's
+
+        Returns:
+            stats (dict): bytes moved, seconds taken, throughput in bytes_per_sec, the sha256 hex digest
+                of the snapshot and the config dictionary of the migrated instance
+
+        """
+        import hashlib
+
+        if target_instance_id is None:
+            target_instance_id = instance_id
+        nano = self._nano(instance_id)
+        headers = nano.json_headers
+        if verify:
+            source_config = self._api_call("GET", nano.urls["clusterConfig"], headers)
+
+        url = nano.urls["snapshot"]
+        start = time.perf_counter()
+        # retried until the snapshot starts to arrive, the upload cannot be repeated
+        response = self._retrying(
+            "GET", url, lambda: self._send("GET", url, headers), hedge=False
+        )
+        digest = hashlib.sha256()
+        moved = {"bytes": 0, "error": None}
+
+        def pieces():
+            try:
+                with self._transport_errors():
+                    for chunk in response.iter_content(CHUNK_SIZE):
+                        digest.update(chunk)
+                        moved["bytes"] += len(chunk)
+                        yield chunk
+            except BoonException as e:
+                moved["error"] = e
+                raise
+
+        # the upload keeps the download's length unless the download is being decoded
+        length = None
+        if "Content-Encoding" not in response.headers:
+            length = response.headers.get("Content-Length")
+        created = False
         try:
-            with tarfile.open(filename, "r:gz") as tp:
-                with tp.extractfile("CommonState/MagicNumber") as magic_fp:
-                    magic_num = magic_fp.read()
-                    if magic_num != b"\xda\xba":
-                        raise BoonException(
-                            message="file {} is not a Boon Logic nano-formatted file, bad magic number".format(
-                                filename
-                            )
-                        )
-        except KeyError:
-            raise BoonException(
-                message="file {} is not a Boon Logic nano-formatted file".format(
-                    filename
+            created = target_instance_id not in [
+                item["instanceID"] for item in target.nano_list()
+            ]
+            target_nano = target.open_nano(target_instance_id)
+            body = MultipartEncoder(
+                "snapshot",
+                snapshot_filename(instance_id),
+                pieces(),
+                length=None if length is None else int(length),
+            )
+            upload_headers = dict(target_nano.upload_headers)
+            upload_headers["Content-Type"] = body.content_type
+            upload_headers, body = target.compression.compress(
+                upload_headers, body, upload=True
+            )
+            try:
+                config = target._api_call(
+                    "POST", target_nano.urls["snapshot"], upload_headers, body
                 )
+            except BoonException:
+                # a failed download reaches target as a broken upload
+                if moved["error"] is not None:
+                    raise moved["error"]
+                raise
+        except BaseException:
+            if created:
+                try:
+                    target.close_nano(target_instance_id)
+                except BoonException:
+                    pass
+            raise
+        finally:
+            response.close()
+        target_nano._set_config(config)
+
+        if verify:
+            migrated = target._api_call(
+                "GET", target_nano.urls["clusterConfig"], target_nano.json_headers
             )
-        except Exception as e:
-            raise BoonException(message="corrupt file {}".format(filename))
+            if migrated != source_config:
+                raise BoonException(
+                    message="configuration of migrated instance {} differs from {}".format(
+                        target_instance_id, instance_id
+                    )
+                )
 
-        with open(filename, "rb") as fp:
-            nano = fp.read()
+        stats = transfer_stats(moved["bytes"], time.perf_counter() - start)
+        stats["sha256"] = digest.hexdigest()
+        stats["config"] = config
+        return stats
 
-        fields = {"snapshot": (filename, nano)}
+    def save_nanos(
+        self,
+        destination,
+        instance_ids: list = None,
+        max_workers: int = 4,
+        manifest: str = None,
+        progress=None,
+    ):
+        """Save many nano pod instances at once, such as every instance of the server
 
-        url = self.url + "/snapshot/" + instance_id + "?api-tenant=" + self.api_tenant
-        headers = {}
-        response = self._api_call("POST", url, headers, fields=fields)
+        Snapshots are taken on max_workers threads that share the client's connections.
+        A failed instance does not stop the others, the failures are reported together.
 
-        response = response.json()
+        Args:
+            destination (str or SnapshotStore): directory to write one file per instance to
+                (see snapshot_filename), or a SnapshotStore to record the snapshots in
+            instance_ids (list): instances to save, every instance listed by nano_list by default
+            max_workers (int): number of snapshots taken at once
+            manifest (str): path of a file recording each instance saved, instances it already
+                records are skipped, so running again with the same manifest resumes a partial run
+            progress (callable): called as progress(instance_id, outcome) as each instance finishes,
+                outcome is the save_nano stats or the exception of a failure
 
-        self.numeric_format = response["numericFormat"]
+        Returns:
+            report (dict): save_nano stats of each instance saved as completed, the exception of each
+                instance that failed as failed, instances skipped thanks to the manifest as skipped,
+                and bytes, seconds and bytes_per_sec of the whole run
 
-        return response
+        """
+        if instance_ids is None:
+            instance_ids = [item["instanceID"] for item in self.nano_list()]
+        if not isinstance(destination, SnapshotStore):
+            os.makedirs(destination, exist_ok=True)
+
+        def save(instance_id):
+            if isinstance(destination, SnapshotStore):
+                return self._save_snapshot(instance_id, destination)
+            filename = os.path.join(destination, snapshot_filename(instance_id))
+            return self._save_snapshot(instance_id, filename)
+
+        return self._fleet(save, instance_ids, max_workers, manifest, progress)
+
+    def restore_nanos(
+        self,
+        source,
+        instance_ids: list = None,
+        max_workers: int = 4,
+        manifest: str = None,
+        progress=None,
+        at: float = None,
+    ):
+        """Restore many nano pod instances at once, from a directory or SnapshotStore of save_nanos
+
+        Each instance is opened (created when missing) and restored on one of max_workers
+        threads that share the client's connections.  A failed instance does not stop the
+        others, the failures are reported together.
+
+        Args:
+            source (str or SnapshotStore): directory written by save_nanos, or a SnapshotStore
+            instance_ids (list): instances to restore, every instance of the source by default
+            max_workers (int): number of instances restored at once
+            manifest (str): path of a file recording each instance restored, see save_nanos
+            progress (callable): called as progress(instance_id, outcome) as each instance finishes,
+                outcome is the restore stats or the exception of a failure
+            at (float): restore the latest snapshot taken at or before this time (seconds since
+                the epoch) from a SnapshotStore, the latest one by default
+
+        Returns:
+            report (dict): bytes, seconds and bytes_per_sec of the upload of each instance restored
+                as completed, otherwise as save_nanos
+
+        """
+        store = source if isinstance(source, SnapshotStore) else None
+        if instance_ids is None:
+            if store is not None:
+                instance_ids = store.instance_ids()
+            else:
+                instance_ids = snapshot_instance_ids(source)
+
+        def restore(instance_id):
+            if store is None:
+                snapshot = os.path.join(source, snapshot_filename(instance_id))
+                size = os.path.getsize(snapshot) if os.path.exists(snapshot) else 0
+            else:
+                snapshot = store.find(instance_id, at)
+                if snapshot is None:
+                    raise BoonException(
+                        404, "no snapshot of {} in the store".format(instance_id)
+                    )
+                size = snapshot.size
+            start = time.perf_counter()
+            self.open_nano(instance_id)
+            self.restore_nano(instance_id, snapshot)
+            stats = transfer_stats(size, time.perf_counter() - start)
+            if store is not None:
+                stats["sha256"] = snapshot.sha256
+            return stats
+
+        return self._fleet(restore, instance_ids, max_workers, manifest, progress)
+
+    def _fleet(self, run, instance_ids, max_workers, manifest, progress):
+        """Run run(instance_id) for every instance on a bounded pool, see save_nanos"""
+        from concurrent.futures import ThreadPoolExecutor, as_completed
+
+        if max_workers < 1:
+            raise BoonException(400, "max_workers must be at least 1")
+        if manifest is not None:
+            manifest = Manifest(manifest)
+
+        report = {"completed": {}, "failed": {}, "skipped": []}
+        pending = []
+        for instance_id in instance_ids:
+            if manifest is not None and instance_id in manifest.completed:
+                report["skipped"].append(instance_id)
+            else:
+                pending.append(instance_id)
+
+        start = time.perf_counter()
+        with ThreadPoolExecutor(
+            max_workers=max_workers, thread_name_prefix="boonnano-fleet"
+        ) as executor:
+            futures = {
+                executor.submit(run, instance_id): instance_id
+                for instance_id in pending
+            }
+            # outcomes are recorded on this thread as they come
+            for future in as_completed(futures):
+                instance_id = futures[future]
+                try:
+                    outcome = future.result()
+                # whatever went wrong, one instance does not stop the others
+                except Exception as e:
+                    outcome = report["failed"][instance_id] = e
+                else:
+                    report["completed"][instance_id] = outcome
+                    if manifest is not None:
+                        manifest.record(
+                            instance_id,
+                            {
+                                key: value
+                                for key, value in outcome.items()
+                                if key in ["bytes", "sha256"]
+                            },
+                        )
+                if progress is not None:
+                    progress(instance_id, outcome)
+
+        nbytes = sum(stats["bytes"] for stats in report["completed"].values())
+        report.update(transfer_stats(nbytes, time.perf_counter() - start))
+        return report
 
     @_is_configured
     def autotune_config(self, instance_id: str):
@@ -628,8 +1435,9 @@ class ExpertClient:
 
         """
 
-        url = self.url + "/autoTune/" + instance_id + "?api-tenant=" + self.api_tenant
-        headers = {"Content-Type": "application/json"}
+        nano = self._nano(instance_id)
+        url = nano.urls["autoTune"]
+        headers = nano.json_headers
         self._api_call("POST", url, headers)
 
     @_is_configured
@@ -644,22 +1452,19 @@ class ExpertClient:
 
         """
 
-        url = (
-            self.url
-            + "/autotuneArray/"
-            + instance_id
-            + "?api-tenant="
-            + self.api_tenant
-        )
-        headers = {"Content-Type": "application/json"}
+        nano = self._nano(instance_id)
+        url = nano.urls["autotuneArray"]
+        headers = nano.json_headers
         response = self._api_call("GET", url, headers)
 
-        return response.json()
+        return response
 
-    @_is_configured
     def get_config(self, instance_id: str):
         """Gets the configuration for this nano pod instance
 
+        The numeric format of the configuration is recorded on the instance handle, which is
+        how a client adopts an instance configured by another client.
+
         Args:
             instance_id (str): instance identifier to assign to new pod instance
 
@@ -668,17 +1473,13 @@ class ExpertClient:
 
         """
 
-        url = (
-            self.url
-            + "/clusterConfig/"
-            + instance_id
-            + "?api-tenant="
-            + self.api_tenant
-        )
-        headers = {"Content-Type": "application/json"}
+        nano = self._nano(instance_id)
+        url = nano.urls["clusterConfig"]
+        headers = nano.json_headers
         response = self._api_call("GET", url, headers)
+        nano._set_config(response)
 
-        return response.json()
+        return response
 
     @_is_configured
     def load_file(
@@ -688,9 +1489,12 @@ class ExpertClient:
         file_type: str,
         gzip: bool = False,
         append_data: bool = False,
+        progress=None,
     ):
         """Load nano data from a file
 
+        The file is streamed from disk, memory use does not depend on the file size.
+
         Args:
             instance_id (str): instance identifier to assign to new pod instance
             file (str): local path to data file
@@ -698,75 +1502,131 @@ class ExpertClient:
             gzip (boolean): true if file is gzip'd, false if not gzip'd
             append_data (boolean): true if data should be appended to previous data, false if existing
                 data should be truncated
+            progress (callable): called as progress(bytes_sent, total_bytes) during the upload
+
+        Returns:
+            stats (dict): bytes sent, seconds taken and throughput in bytes_per_sec, with the
+                compressed_bytes, compression_ratio and compression_seconds when the upload is compressed
 
         """
 
-        # load the data file
+        # open the data file
         try:
-            with open(file, "rb") as fp:
-                file_data = fp.read()
+            fp = open(file, "rb")
         except FileNotFoundError as e:
             raise BoonException(message=e.strerror)
         except Exception as e:
             raise BoonException(message=str(e))
 
-        # verify file_type is set correctly
-        if file_type not in ["csv", "csv-c", "raw", "raw-n"]:
-            raise BoonException(
-                message='file_type must be "csv", "csv-c", "raw" or "raw-n"'
+        with fp:
+            # verify file_type is set correctly
+            if file_type not in ["csv", "csv-c", "raw", "raw-n"]:
+                raise BoonException(
+                    message='file_type must be "csv", "csv-c", "raw" or "raw-n"'
+                )
+
+            file_name = os.path.basename(file)
+
+            body = MultipartEncoder("data", file_name, fp, progress=progress)
+
+            nano = self._nano(instance_id)
+            url = (
+                nano.urls["data"]
+                + "&fileType="
+                + file_type
+                + "&appendData="
+                + str(append_data).lower()
+                + "&gzip="
+                + str(gzip).lower()
             )
+            headers = dict(nano.upload_headers)
+            headers["Content-Type"] = body.content_type
+            if not gzip:
+                headers, body = self.compression.compress(headers, body, upload=True)
+            start = time.perf_counter()
+            self._api_call("POST", url, headers, body)
 
-        file_name = os.path.basename(file)
-
-        fields = {"data": (file_name, file_data)}
-
-        url = (
-            self.url
-            + "/data/"
-            + instance_id
-            + "?api-tenant="
-            + self.api_tenant
-            + "&fileType="
-            + file_type
-            + "&appendData="
-            + str(append_data).lower()
-            + "&gzip="
-            + str(gzip).lower()
-        )
-        headers = {}
-        self._api_call("POST", url, headers, fields=fields)
+        stats = transfer_stats(body.bytes_read, time.perf_counter() - start)
+        stats.update(compression_stats([body]))
+        return stats
 
     @_is_configured
-    def load_data(self, instance_id: str, data: list, append_data: bool = False):
+    def load_data(
+        self,
+        instance_id: str,
+        data: list,
+        append_data: bool = False,
+        chunk_size: int = None,
+        max_in_flight: int = 2,
+    ):
         """Load nano data from an existing numpy array or simple python list
 
+        With chunk_size the data is split on pattern boundaries into uploads of at most
+        chunk_size bytes (at least one pattern each).  The first upload honors append_data,
+        the following ones append.  Chunks are serialized on a worker thread ahead of the
+        upload, so preparing the next chunk overlaps with sending the current one.  The
+        uploads themselves are sent one at a time because the server appends data in the
+        order it arrives.
+
         Args:
             instance_id (str): instance identifier to assign to new pod instance
             data (np.ndarray or list): numpy array or list of data values
             append_data (boolean): true if data should be appended to previous data, false if existing
                 data should be truncated
+            chunk_size (int): maximum upload size in bytes, None sends the data in one request
+            max_in_flight (int): number of chunks being serialized or uploaded at once
+
+        Returns:
+            stats (dict): bytes sent, number of chunks, seconds taken and throughput in bytes_per_sec, with
+                the compressed_bytes, compression_ratio and compression_seconds when the upload is compressed
 
         """
 
-        data = normalize_nano_data(data, self.numeric_format)
-        file_name = "dummy_filename.bin"
-        file_type = "raw"
-
-        fields = {"data": (file_name, data)}
-
-        url = (
-            self.url
-            + "/data/"
-            + instance_id
-            + "?api-tenant="
-            + self.api_tenant
-            + "&fileType="
-            + file_type
-            + "&appendData="
-            + str(append_data).lower()
-        )
-        headers = {}
-        self._api_call("POST", url, headers, fields=fields)
+        nano = self._nano(instance_id)
+        start = time.perf_counter()
+
+        if chunk_size is None:
+            data = normalize_nano_data(
+                data, nano.numeric_format, self._scratch_buffer()
+            )
+            url, headers, body = self._data_request(nano, data, append_data)
+            self._api_call("POST", url, headers, body)
+            stats = transfer_stats(body.bytes_read, time.perf_counter() - start)
+            stats.update(compression_stats([body]))
+            stats["chunks"] = 1
+            return stats
+
+        if max_in_flight < 1:
+            raise BoonException(400, "max_in_flight must be at least 1")
+
+        from concurrent.futures import ThreadPoolExecutor
+
+        chunks = split_rows(data, nano, chunk_size)
+        bodies = []
+
+        def upload(future):
+            nonlocal append_data
+            url, headers, body = self._data_request(nano, future.result(), append_data)
+            self._api_call("POST", url, headers, body)
+            append_data = True
+            bodies.append(body)
+
+        with ThreadPoolExecutor(max_workers=1) as executor:
+            pending = deque()
+            for chunk in chunks:
+                pending.append(
+                    executor.submit(normalize_nano_data, chunk, nano.numeric_format)
+                )
+                if len(pending) >= max_in_flight:
+                    upload(pending.popleft())
+            while pending:
+                upload(pending.popleft())
+
+        sent = sum(body.bytes_read for body in bodies)
+        stats = transfer_stats(sent, time.perf_counter() - start)
+        stats.update(compression_stats(bodies))
+        stats["chunks"] = len(chunks)
+        return stats
 
     def set_learning_enabled(self, instance_id: str, status: bool):
         """returns list of nano instances allocated for a pod
@@ -782,19 +1642,12 @@ class ExpertClient:
         if status not in [True, False]:
             raise BoonException(400, "status must be a boolean")
 
-        url = (
-            self.url
-            + "/learning/"
-            + instance_id
-            + "?api-tenant="
-            + self.api_tenant
-            + "&enable="
-            + str(status).lower()
-        )
-        headers = {"Content-Type": "application/json"}
+        nano = self._nano(instance_id)
+        url = nano.urls["learning"] + "&enable=" + str(status).lower()
+        headers = nano.json_headers
         response = self._api_call("POST", url, headers)
 
-        return response.json()
+        return response
 
     @_is_configured
     def is_learning_enabled(self, instance_id: str):
@@ -808,11 +1661,12 @@ class ExpertClient:
 
         """
 
-        url = self.url + "/learning/" + instance_id + "?api-tenant=" + self.api_tenant
-        headers = {"Content-Type": "application/json"}
+        nano = self._nano(instance_id)
+        url = nano.urls["learning"]
+        headers = nano.json_headers
         response = self._api_call("GET", url, headers)
 
-        return response.json()
+        return response
 
     def set_root_cause_enabled(self, instance_id: str, status: bool):
         """configures whether or not to save new clusters coming in for root cause analysis
@@ -828,19 +1682,12 @@ class ExpertClient:
         if status not in [True, False]:
             raise BoonException(400, "status must be a boolean")
 
-        url = (
-            self.url
-            + "/rootCause/"
-            + instance_id
-            + "?api-tenant="
-            + self.api_tenant
-            + "&enable="
-            + str(status).lower()
-        )
-        headers = {"Content-Type": "application/json"}
+        nano = self._nano(instance_id)
+        url = nano.urls["rootCause"] + "&enable=" + str(status).lower()
+        headers = nano.json_headers
         response = self._api_call("POST", url, headers)
 
-        return response.json()
+        return response
 
     @_is_configured
     def is_root_cause_enabled(self, instance_id: str):
@@ -854,11 +1701,12 @@ class ExpertClient:
 
         """
 
-        url = self.url + "/rootCause/" + instance_id + "?api-tenant=" + self.api_tenant
-        headers = {"Content-Type": "application/json"}
+        nano = self._nano(instance_id)
+        url = nano.urls["rootCause"]
+        headers = nano.json_headers
         response = self._api_call("GET", url, headers)
 
-        return response.json()
+        return response
 
     def set_clipping_detection_enabled(self, instance_id: str, status: bool):
         """configures whether or not to save new clusters coming in for root cause analysis
@@ -874,19 +1722,12 @@ class ExpertClient:
         if status not in [True, False]:
             raise BoonException(400, "status must be a boolean")
 
-        url = (
-            self.url
-            + "/clippingDetection/"
-            + instance_id
-            + "?api-tenant="
-            + self.api_tenant
-            + "&enable="
-            + str(status).lower()
-        )
-        headers = {"Content-Type": "application/json"}
+        nano = self._nano(instance_id)
+        url = nano.urls["clippingDetection"] + "&enable=" + str(status).lower()
+        headers = nano.json_headers
         response = self._api_call("POST", url, headers)
 
-        return response.json()
+        return response
 
     @_is_configured
     def is_clipping_detection_enabled(self, instance_id: str):
@@ -900,19 +1741,16 @@ class ExpertClient:
 
         """
 
-        url = (
-            self.url
-            + "/clippingDetection/"
-            + instance_id
-            + "?api-tenant="
-            + self.api_tenant
-        )
-        headers = {"Content-Type": "application/json"}
+        nano = self._nano(instance_id)
+        url = nano.urls["clippingDetection"]
+        headers = nano.json_headers
         response = self._api_call("GET", url, headers)
 
-        return response.json()
+        return response
 
-    def run_nano(self, instance_id: str, results: str = None):
+    def run_nano(
+        self, instance_id: str, results: str = None, results_format: str = "dict"
+    ):
         f"""Clusters the data in the nano pod buffer and returns the specified results
 
         Args:
@@ -949,20 +1787,25 @@ class ExpertClient:
 
                 All = {",".join(self.results)}
 
+            results_format (str): "dict" for lists of values, "numpy" for a typed array per
+                result or "structured" for a single structured array
+
         Returns:
-            response (dict): dictionary of results
+            response (dict or np.ndarray): dictionary of results, structured array for "structured"
 
         """
 
+        self._check_results_format(results_format)
         results_str = self._format_results(results)
 
-        url = self.url + "/nanoRun/" + instance_id + "?api-tenant=" + self.api_tenant
+        nano = self._nano(instance_id)
+        url = nano.urls["nanoRun"]
         if results is not None:
             url += "&results=" + results_str
-        headers = {"Content-Type": "application/json"}
+        headers = nano.json_headers
         response = self._api_call("POST", url, headers)
 
-        return response.json()
+        return decode_results(response, results_format)
 
     @_is_configured
     def prune_ids(self, instance_id: str, id_list: list = []):
@@ -977,9 +1820,8 @@ class ExpertClient:
 
         """
 
-        url = (
-            self.url + "/pruneCluster/" + instance_id + "?api-tenant=" + self.api_tenant
-        )
+        nano = self._nano(instance_id)
+        url = nano.urls["pruneCluster"]
 
         if isinstance(id_list, int):
             id_list = [id_list]
@@ -991,13 +1833,19 @@ class ExpertClient:
         else:
             raise BoonException(message="Must specify cluster IDs to analyze")
 
-        headers = {"Content-Type": "application/json"}
+        headers = nano.json_headers
         response = self._api_call("POST", url, headers)
 
-        return response.json()
+        return response
 
     @_is_configured
-    def run_streaming_nano(self, instance_id: str, data: list, results: str = None):
+    def run_streaming_nano(
+        self,
+        instance_id: str,
+        data: list,
+        results: str = None,
+        results_format: str = "dict",
+    ):
         f"""Load streaming data into self-autotuning nano pod instance, run the nano and return results
 
         Args:
@@ -1035,34 +1883,113 @@ class ExpertClient:
 
                 All = {",".join(self.results)}
 
+            results_format (str): "dict" for lists of values, "numpy" for a typed array per
+                result or "structured" for a single structured array
+
         Returns:
-            response (dict): dictionary of results
+            response (dict or np.ndarray): dictionary of results, structured array for "structured"
 
         """
 
-        data = normalize_nano_data(data, self.numeric_format)
-        file_name = "dummy_filename.bin"
-        file_type = "raw"
+        self._check_results_format(results_format)
+        nano = self._nano(instance_id)
+        data = normalize_nano_data(data, nano.numeric_format, self._scratch_buffer())
+        url, headers, body = self._streaming_request(nano, data, results)
+        response = self._api_call("POST", url, headers, body)
+
+        return decode_results(response, results_format)
 
-        fields = {"data": (file_name, data)}
+    @_is_configured
+    def stream(
+        self,
+        instance_id: str,
+        rows,
+        results: str = None,
+        max_batch_rows: int = 1000,
+        max_delay_ms: float = 100,
+    ):
+        """Cluster an iterable of patterns through run_streaming_nano in micro-batches
 
-        results_str = self._format_results(results)
+        Patterns are grouped into a batch until it holds max_batch_rows patterns or
+        max_delay_ms has passed since the first pattern of the batch arrived, then the
+        batch is sent with one run_streaming_nano call.  Larger batches give more
+        throughput, a shorter delay bounds the latency added for slow sources.
+
+        Args:
+            instance_id (str): instance identifier to assign to new pod instance
+            rows (iterable): patterns to cluster, each a sequence of feature values
+            results (str): comma separated list of result specifiers, see run_streaming_nano
+            max_batch_rows (int): maximum number of patterns per request
+            max_delay_ms (float): maximum time in milliseconds a pattern waits for its batch to fill
+
+        Returns:
+            results (generator): dictionary of result values for each pattern, in input order
 
-        url = (
-            self.url
-            + "/nanoRunStreaming/"
-            + instance_id
-            + "?api-tenant="
-            + self.api_tenant
-            + "&fileType="
-            + file_type
+        """
+        if max_batch_rows < 1:
+            raise BoonException(400, "max_batch_rows must be at least 1")
+
+        return self._stream(
+            instance_id, rows, results, max_batch_rows, max_delay_ms / 1000.0
         )
-        if results is not None:
-            url += "&results=" + results_str
-        headers = {}
-        response = self._api_call("POST", url, headers, fields=fields)
 
-        return response.json()
+    def _stream(self, instance_id, rows, results, max_batch_rows, max_delay):
+        for batch in micro_batches(rows, max_batch_rows, max_delay):
+            response = self.run_streaming_nano(instance_id, batch, results)
+            for index in range(len(batch)):
+                yield {key: values[index] for key, values in response.items()}
+
+    @_is_configured
+    def run_pipeline(
+        self,
+        instance_id: str,
+        batches,
+        results: str = None,
+        depth: int = 2,
+        results_format: str = "dict",
+    ):
+        """Cluster an iterable of data batches with overlapping preparation, transfer and decoding
+
+        Equivalent to calling run_streaming_nano for each batch, but the work is split
+        into three stages running on their own threads: converting batch N+1 to the
+        numeric format, sending batch N and waiting for the server, and decoding the
+        results of batch N-1.  The stages are connected by queues holding at most depth
+        batches.  Requests are sent one at a time so the instance sees the batches in
+        order, and results are yielded in input order.
+
+        Args:
+            instance_id (str): instance identifier to assign to new pod instance
+            batches (iterable): numpy arrays or lists of data values, one per request
+            results (str): comma separated list of result specifiers, see run_streaming_nano
+            depth (int): number of batches buffered between consecutive stages
+            results_format (str): "dict", "numpy" or "structured", see run_streaming_nano
+
+        Returns:
+            results (generator): results for each batch, in input order
+
+        """
+        if depth < 1:
+            raise BoonException(400, "depth must be at least 1")
+        self._check_results_format(results_format)
+
+        nano = self._nano(instance_id)
+
+        def prepare(data):
+            # batches in flight cannot share the thread's scratch buffer
+            data = normalize_nano_data(data, nano.numeric_format)
+            return self._streaming_request(nano, data, results)
+
+        def send(request):
+            response = self._send("POST", *request)
+            return response.status_code, self._read_content(response)
+
+        def decode(response):
+            status_code, content = response
+            respbody = self.codec.loads(content)
+            self._check_response(status_code, respbody)
+            return decode_results(respbody, results_format)
+
+        return pipeline(batches, [prepare, send, decode], depth)
 
     def get_version(self):
         """Version information for this nano pod
@@ -1076,7 +2003,7 @@ class ExpertClient:
         headers = {"Content-Type": "application/json"}
         response = self._api_call("GET", url, headers)
 
-        return response.json()
+        return response
 
     @_is_configured
     def get_buffer_status(self, instance_id: str):
@@ -1090,16 +2017,21 @@ class ExpertClient:
 
         """
 
-        url = (
-            self.url + "/bufferStatus/" + instance_id + "?api-tenant=" + self.api_tenant
-        )
-        headers = {"Content-Type": "application/json"}
+        nano = self._nano(instance_id)
+        url = nano.urls["bufferStatus"]
+        headers = nano.json_headers
         response = self._api_call("GET", url, headers)
 
-        return response.json()
+        return response
 
     @_is_configured
-    def get_nano_results(self, instance_id: str, results: str = "All"):
+    def get_nano_results(
+        self,
+        instance_id: str,
+        results: str = "All",
+        results_format: str = "dict",
+        incremental: bool = False,
+    ):
         f"""Results per pattern
 
         Args:
@@ -1136,25 +2068,40 @@ class ExpertClient:
 
                 All = {",".join(self.results)}
 
+            results_format (str): "dict" for lists of values, "numpy" for a typed array per
+                result or "structured" for a single structured array
+            incremental (bool): parse the response into arrays as it arrives, so memory is bounded by
+                the arrays instead of the whole response, requires results_format "numpy" or "structured"
+
         Returns:
-            response (dict): dictionary of results
+            response (dict or np.ndarray): dictionary of results, structured array for "structured"
 
         """
+        self._check_results_format(results_format)
+        self._check_incremental(results_format, incremental)
         results_str = self._format_results(results)
 
-        url = (
-            self.url
-            + "/nanoResults/"
-            + instance_id
-            + "?api-tenant="
-            + self.api_tenant
-            + "&results="
-            + results_str
-        )
-        headers = {"Content-Type": "application/json"}
-        response = self._api_call("GET", url, headers)
+        nano = self._nano(instance_id)
+        url = nano.urls["nanoResults"] + "&results=" + results_str
+        headers = nano.json_headers
+        if incremental:
 
-        return response.json()
+            def fetch():
+                response = self._send("GET", url, headers)
+                parser = ResultsParser()
+                try:
+                    with self._parse_errors(), self._transport_errors():
+                        for chunk in response.iter_content(CHUNK_SIZE):
+                            parser.feed(chunk)
+                        return parser.close()
+                finally:
+                    response.close()
+
+            response = self._retrying("GET", url, fetch)
+        else:
+            response = self._api_call("GET", url, headers)
+
+        return decode_results(response, results_format)
 
     @_is_configured
     def get_nano_status(self, instance_id: str, results: str = "All"):
@@ -1201,19 +2148,12 @@ class ExpertClient:
         else:
             results_str = results if isinstance(results, str) else ",".join(results)
 
-        url = (
-            self.url
-            + "/nanoStatus/"
-            + instance_id
-            + "?api-tenant="
-            + self.api_tenant
-            + "&results="
-            + results_str
-        )
-        headers = {"Content-Type": "application/json"}
+        nano = self._nano(instance_id)
+        url = nano.urls["nanoStatus"] + "&results=" + results_str
+        headers = nano.json_headers
         response = self._api_call("GET", url, headers)
 
-        return response.json()
+        return response
 
     def get_root_cause(
         self, instance_id: str, id_list: list = [], pattern_list: list = []
@@ -1229,13 +2169,8 @@ class ExpertClient:
             response (list): list containing the root cause for each pattern/id provided for a sensor
         """
 
-        url = (
-            self.url
-            + "/rootCauseAnalysis/"
-            + instance_id
-            + "?api-tenant="
-            + self.api_tenant
-        )
+        nano = self._nano(instance_id)
+        url = nano.urls["rootCauseAnalysis"]
 
         if len(id_list) != 0:
             # IDs
@@ -1243,31 +2178,126 @@ class ExpertClient:
             url += "&clusterID=[" + ",".join(id_list) + "]"
         elif len(pattern_list) != 0:
             # patterns
+            import numpy as np
+
             if len(np.array(pattern_list).shape) == 1:  # only 1 pattern provided
                 pattern_list = [pattern_list]
             for i, pattern in enumerate(pattern_list):
                 pattern_list[i] = ",".join([str(element) for element in pattern])
             url += "&pattern=[[" + "],[".join(pattern_list) + "]]"
 
-        headers = {"Content-Type": "application/json"}
+        headers = nano.json_headers
         response = self._api_call("GET", url, headers)
 
-        return response.json()
+        return response
+
+
+def check_nano_file(filename):
+    """Verify that a file is a saved nano (gzip'd tar with Magic Number)
+
+    Only the start of the archive, up to the magic number, is decompressed.
+    """
+    try:
+        with open(filename, "rb") as fp:
+            magic_num = read_magic_number(fp)
+    except (OSError, ValueError):
+        raise BoonException(message="corrupt file {}".format(filename))
+    if magic_num is None:
+        raise BoonException(
+            message="file {} is not a Boon Logic nano-formatted file".format(filename)
+        )
+    if magic_num != MAGIC_NUMBER:
+        raise BoonException(
+            message="file {} is not a Boon Logic nano-formatted file, bad magic number".format(
+                filename
+            )
+        )
+
 
+def split_rows(data, nano, chunk_size: int):
+    """Split data into chunks of whole patterns of at most chunk_size bytes
+
+    The chunks are views of the data whenever the data is a contiguous numpy array.
+    """
+    import numpy as np
 
-def normalize_nano_data(data, numeric_format):
-    # Whatever type data comes in as, cast it to numpy array
     data = np.asarray(data)
+    feature_count = nano.feature_count
+    if feature_count is None:
+        if data.ndim < 2:
+            raise BoonException(
+                400, "feature count is unknown, configure the nano or pass 2D data"
+            )
+        feature_count = data.shape[-1]
+    if data.size % feature_count != 0:
+        raise BoonException(400, "data length must be a multiple of the feature count")
+
+    rows = data.reshape(-1, feature_count)
+    row_size = feature_count * np.dtype(nano.numeric_format).itemsize
+    rows_per_chunk = max(1, chunk_size // row_size)
+    return [
+        rows[index : index + rows_per_chunk]
+        for index in range(0, len(rows), rows_per_chunk)
+    ]
+
+
+def transfer_stats(nbytes: int, seconds: float):
+    """Summary of a transfer, as returned by the upload and download methods"""
+    return {
+        "bytes": nbytes,
+        "seconds": seconds,
+        "bytes_per_sec": nbytes / seconds if seconds > 0 else 0.0,
+    }
+
+
+class ScratchBuffer:
+    """Reusable conversion buffer for normalize_nano_data
+
+    The buffer grows to the largest batch converted and is then reused, so repeated
+    conversions of similar batches do not allocate.  The data returned from a
+    conversion is only valid until the next conversion into the same buffer.
+    """
+
+    def __init__(self):
+        self._buffer = bytearray()
+
+    def array(self, shape, dtype):
+        """Return an uninitialized array of the given shape and dtype backed by the buffer"""
+        import numpy as np
 
-    # Cast numpy array to correct numeric type for serialization
-    if numeric_format == "int16":
-        data = data.astype(np.int16)
-    elif numeric_format == "float32":
-        data = data.astype(np.float32)
-    elif numeric_format == "uint16":
-        data = data.astype(np.uint16)
+        count = int(np.prod(shape))
+        nbytes = count * dtype.itemsize
+        if len(self._buffer) < nbytes:
+            self._buffer = bytearray(nbytes)
+        return np.frombuffer(self._buffer, dtype=dtype, count=count).reshape(shape)
 
-    # Serialize to binary blob
-    data = data.tobytes()
 
-    return data
+def normalize_nano_data(data, numeric_format, scratch: ScratchBuffer = None):
+    """Serialize data to the binary layout of numeric_format
+
+    C-contiguous numpy arrays that already have the right dtype are passed through as
+    a memoryview of the array, without copying.  Other input is converted with a single
+    copy, into scratch when given.
+
+    Returns:
+        data (memoryview): bytes of the data in numeric_format
+    """
+    import numpy as np
+
+    # Whatever type data comes in as, cast it to numpy array (no copy for numpy arrays)
+    data = np.asarray(data)
+
+    dtype = np.dtype(numeric_format) if numeric_format in NUMERIC_FORMATS else None
+    if dtype is not None and (data.dtype != dtype or not data.flags.c_contiguous):
+        # Cast numpy array to correct numeric type for serialization
+        if scratch is None:
+            converted = np.empty(data.shape, dtype=dtype)
+        else:
+            converted = scratch.array(data.shape, dtype)
+        np.copyto(converted, data, casting="unsafe")
+        data = converted
+    elif not data.flags.c_contiguous:
+        data = np.ascontiguousarray(data)
+
+    # Expose the binary blob without copying it
+    return memoryview(data.reshape(-1)).cast("B")
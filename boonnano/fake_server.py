@@ -0,0 +1,604 @@
+import gzip
+import io
+import json
+import tarfile
+import threading
+import zlib
+from collections import deque
+from urllib.parse import parse_qs, urlsplit
+
+import numpy as np
+
+from .expert_client import NUMERIC_FORMATS, BoonException
+from .multipart import MultipartEncoder
+from .transport import Response, Transport, read_body
+
+MAGIC_NUMBER = b"\xda\xba"
+ANOMALY_THRESHOLD = 800
+RESULT_NAMES = [
+    "ID",
+    "SI",
+    "RI",
+    "FI",
+    "DI",
+    "AD",
+    "AH",
+    "AM",
+    "AW",
+    "NI",
+    "NS",
+    "NW",
+    "OM",
+    "PI",
+]
+
+
+class _Instance:
+
+    """State of one fake nano pod instance"""
+
+    def __init__(self, instance_id):
+        self.instance_id = instance_id
+        self.config = None
+        self.learning = True
+        self.root_cause = False
+        self.clipping = True
+        self.reset()
+
+    def reset(self):
+        self.buffer = []
+        self.buffered_bytes = 0
+        self.bytes_processed = 0
+        self.bytes_written = 0
+        self.centers = np.zeros((0, 0))
+        self.sizes = []
+        self.growth = [0]
+        self.inferences = 0
+        self.results = None
+        self.autotune_array = None
+        self.anomalies = deque()
+        self.history = 0
+        self.smoothed = 0
+        self.novelty = 0
+
+    @property
+    def metadata(self):
+        return {"instanceID": self.instance_id}
+
+    @property
+    def pattern_length(self):
+        return len(self.config["features"]) * self.config["streamingWindowSize"]
+
+    def state(self):
+        """Everything a snapshot restores, as json values"""
+        return {
+            "config": self.config,
+            "learning": self.learning,
+            "rootCause": self.root_cause,
+            "clipping": self.clipping,
+            "centers": self.centers.tolist(),
+            "sizes": self.sizes,
+            "growth": self.growth,
+            "inferences": self.inferences,
+        }
+
+    def restore(self, state):
+        config = state["config"]
+        # the shape is explicit, a configured instance may not have any clusters yet
+        width = 0
+        if config is not None:
+            width = len(config["features"]) * config["streamingWindowSize"]
+        centers = np.array(state["centers"], dtype=np.float64).reshape(
+            len(state["sizes"]), width
+        )
+
+        self.reset()
+        self.config = config
+        self.learning = state["learning"]
+        self.root_cause = state["rootCause"]
+        self.clipping = state["clipping"]
+        self.centers = centers
+        self.sizes = state["sizes"]
+        self.growth = state["growth"]
+        self.inferences = state["inferences"]
+
+    def normalize(self, patterns):
+        """Scale patterns to 0..1 with the configured feature ranges"""
+        features = self.config["features"]
+        window = self.config["streamingWindowSize"]
+        low = np.tile([feature["minVal"] for feature in features], window)
+        high = np.tile([feature["maxVal"] for feature in features], window)
+        span = np.where(high > low, high - low, 1.0)
+        return np.clip((patterns - low) / span, 0.0, 1.0)
+
+    def cluster(self, patterns):
+        """Assign each pattern to the nearest cluster within percentVariation, or a new one
+
+        Returns the per-pattern results, see ExpertClient.run_nano.
+        """
+        config = self.config
+        variation = config["percentVariation"]
+        max_clusters = config.get("streaming", {}).get(
+            "learningMaxClusters", config["autoTuning"]["maxClusters"]
+        )
+        window = config.get("streaming", {}).get("anomalyHistoryWindow", 10000)
+        if self.centers.shape[1] != self.pattern_length:
+            self.centers = np.zeros((0, self.pattern_length))
+        # room for new clusters, grown by doubling
+        centers = np.empty((max(16, 2 * len(self.sizes)), self.pattern_length))
+        centers[: len(self.sizes)] = self.centers
+
+        results = {key: [] for key in RESULT_NAMES}
+        for pattern in self.normalize(patterns):
+            count = len(self.sizes)
+            cluster_id, distance, novel = 0, 1.0, False
+            if count:
+                distances = np.abs(centers[:count] - pattern).mean(axis=1)
+                nearest = int(distances.argmin())
+                distance = float(distances[nearest])
+                if distance <= variation:
+                    cluster_id = nearest + 1
+            if cluster_id == 0 and self.learning and count < max_clusters:
+                if count == len(centers):
+                    centers = np.concatenate([centers, np.empty_like(centers)])
+                centers[count] = pattern
+                self.sizes.append(0)
+                self.growth.append(self.inferences)
+                cluster_id, distance, novel = len(self.sizes), 0.0, True
+            if cluster_id:
+                self.sizes[cluster_id - 1] += 1
+            self.inferences += 1
+
+            size = self.sizes[cluster_id - 1] if cluster_id else 1
+            raw = 1000 // size
+            self.smoothed = (3 * self.smoothed + raw) // 4
+            detected = int(self.smoothed >= ANOMALY_THRESHOLD)
+            self.anomalies.append(detected)
+            self.history += detected
+            if len(self.anomalies) > window:
+                self.history -= self.anomalies.popleft()
+            history = self.history
+            metric = history / window
+            novelty = 1000 if novel else min(1000, int(1000 * distance))
+            self.novelty = (3 * self.novelty + novelty) // 4
+            mean_size = self.inferences / max(1, len(self.sizes))
+
+            results["ID"].append(cluster_id)
+            results["SI"].append(self.smoothed)
+            results["RI"].append(raw)
+            results["FI"].append(int(1000 * size / mean_size))
+            results["DI"].append(min(1000, int(1000 * distance)))
+            results["AD"].append(detected)
+            results["AH"].append(history)
+            results["AM"].append(metric)
+            results["AW"].append(0 if metric < 0.01 else 1 if metric < 0.1 else 2)
+            results["NI"].append(novelty)
+            results["NS"].append(self.novelty)
+            results["NW"].append(
+                0 if self.novelty < 500 else 1 if self.novelty < 800 else 2
+            )
+            results["OM"].append(0)
+            results["PI"].append(1000 - raw)
+        self.centers = centers[: len(self.sizes)]
+        return results
+
+    def status(self):
+        """Per-cluster and overall status values, see ExpertClient.get_nano_status"""
+        mean_size = self.inferences / max(1, len(self.sizes))
+        if len(self.sizes):
+            middle = self.centers.mean(axis=0)
+            distances = np.abs(self.centers - middle).mean(axis=1).tolist()
+        else:
+            distances = []
+        return {
+            "PCA": [[0.0, 0.0, 0.0]]
+            + [
+                [
+                    float(center[axis::3].mean()) if axis < len(center) else 0.0
+                    for axis in range(3)
+                ]
+                for center in self.centers
+            ],
+            "clusterGrowth": self.growth,
+            "clusterSizes": [0] + self.sizes,
+            "anomalyIndexes": [0] + [1000 // size for size in self.sizes],
+            "frequencyIndexes": [0]
+            + [int(1000 * size / mean_size) for size in self.sizes],
+            "distanceIndexes": [0] + [int(1000 * distance) for distance in distances],
+            "clusterDistances": [0.0] + distances,
+            "anomalyThreshold": ANOMALY_THRESHOLD,
+            "totalInferences": self.inferences,
+            "numClusters": len(self.sizes) + 1,
+            "averageInferenceTime": 0.0,
+        }
+
+
+class FakeExpert:
+
+    """In-process stand-in for the Expert REST API (/expert/v3)
+
+    Instances, configurations, data buffers, clustering, results, status, root cause,
+    autotuning and snapshots behave like the server's, with simple deterministic
+    clustering: a pattern joins the nearest cluster whose center is within
+    percentVariation (mean absolute difference of the normalized features) or starts a
+    new one.  The same requests always produce the same responses, and snapshots of the
+    same state are byte-identical.
+
+    Requests are answered by handle, FakeTransport sends an ExpertClient's requests
+    straight to it.  A pickled copy, such as the one a client sent to another process
+    talks to, starts with the same instances and is independent from then on, as a
+    forked copy is.
+
+    Args:
+        api_key (str): x-token the requests must carry, any token is accepted when None
+    """
+
+    def __init__(self, api_key: str = None):
+        self.api_key = api_key
+        self.instances = {}
+        self._lock = threading.RLock()
+
+    def __getstate__(self):
+        state = dict(self.__dict__)
+        del state["_lock"]
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._lock = threading.RLock()
+
+    def handle(self, method: str, url: str, headers: dict, body: bytes = b""):
+        """Answer one request
+
+        Returns:
+            response (tuple): status code, body bytes and content type
+        """
+        try:
+            with self._lock:
+                result = self._dispatch(method, url, headers, body)
+        except BoonException as e:
+            result = {"code": e.status_code, "message": e.message}
+            return e.status_code, json.dumps(result).encode(), "application/json"
+        if isinstance(result, bytes):
+            return 200, result, "application/octet-stream"
+        return 200, json.dumps(result).encode(), "application/json"
+
+    def _dispatch(self, method, url, headers, body):
+        parts = urlsplit(url)
+        query = {key: values[-1] for key, values in parse_qs(parts.query).items()}
+        headers = {key.lower(): value for key, value in headers.items()}
+        path = parts.path.rstrip("/").split("/")
+
+        if "x-token" not in headers:
+            raise BoonException(401, "x-token is missing")
+        if self.api_key is not None and headers["x-token"] != self.api_key:
+            raise BoonException(401, "x-token is not valid")
+        if "api-tenant" not in query:
+            raise BoonException(400, "api-tenant is missing")
+        body = _decode_body(headers, body)
+
+        if path[-2:] == ["expert", "version"] and method == "GET":
+            return {"release": "fake", "api-version": "3"}
+        if path[-1] == "nanoInstances" and method == "GET":
+            return [nano.metadata for nano in self.instances.values()]
+        if len(path) < 2 or path[-3:-2] != ["v3"]:
+            raise BoonException(404, "not found")
+
+        endpoint, instance_id = path[-2], path[-1]
+        if endpoint == "nanoInstance" and method == "POST":
+            nano = self.instances.setdefault(instance_id, _Instance(instance_id))
+            return nano.metadata
+
+        nano = self.instances.get(instance_id)
+        if nano is None:
+            raise BoonException(
+                400,
+                "Nano instance identifier {} is not an allocated instance.".format(
+                    instance_id
+                ),
+            )
+        handler = getattr(self, "_{}_{}".format(method.lower(), endpoint), None)
+        if handler is None:
+            raise BoonException(404, "not found")
+        if nano.config is None and endpoint not in _UNCONFIGURED:
+            raise BoonException(400, "nano instance is not configured")
+        return handler(nano, query, headers, body)
+
+    def _get_nanoInstance(self, nano, query, headers, body):
+        return nano.metadata
+
+    def _delete_nanoInstance(self, nano, query, headers, body):
+        del self.instances[nano.instance_id]
+        return {"code": 200, "message": "closed"}
+
+    def _post_clusterConfig(self, nano, query, headers, body):
+        config = json.loads(body)
+        if config.get("numericFormat") not in NUMERIC_FORMATS:
+            raise BoonException(
+                400, "numericFormat must be one of " + ", ".join(NUMERIC_FORMATS)
+            )
+        if not config.get("features"):
+            raise BoonException(400, "features must not be empty")
+        nano.config = config
+        nano.reset()
+        return config
+
+    def _get_clusterConfig(self, nano, query, headers, body):
+        return nano.config
+
+    def _post_data(self, nano, query, headers, body):
+        patterns = self._patterns(nano, query, headers, body)
+        if query.get("appendData", "false") != "true":
+            nano.buffer = []
+            nano.buffered_bytes = 0
+        nano.buffer.append(patterns)
+        nano.buffered_bytes += patterns.size * _dtype(nano).itemsize
+        nano.bytes_written += patterns.size * _dtype(nano).itemsize
+        return {"code": 200, "message": "data loaded"}
+
+    def _post_nanoRun(self, nano, query, headers, body):
+        if not nano.buffer:
+            raise BoonException(400, "There is no data to cluster")
+        patterns = np.concatenate(nano.buffer)
+        nano.bytes_processed += nano.buffered_bytes
+        nano.buffer = []
+        nano.buffered_bytes = 0
+        nano.results = nano.cluster(patterns)
+        return _select(nano.results, query.get("results"))
+
+    def _post_nanoRunStreaming(self, nano, query, headers, body):
+        patterns = self._patterns(nano, query, headers, body)
+        nano.bytes_written += patterns.size * _dtype(nano).itemsize
+        nano.bytes_processed += patterns.size * _dtype(nano).itemsize
+        nano.results = nano.cluster(patterns)
+        return _select(nano.results, query.get("results"))
+
+    def _get_nanoResults(self, nano, query, headers, body):
+        if nano.results is None:
+            raise BoonException(400, "There are no results, run the nano first")
+        return _select(nano.results, query.get("results", "All"))
+
+    def _get_nanoStatus(self, nano, query, headers, body):
+        status = nano.status()
+        names = query.get("results", "All")
+        if names == "All":
+            return status
+        return {name: status[name] for name in names.split(",") if name in status}
+
+    def _get_bufferStatus(self, nano, query, headers, body):
+        return {
+            "totalBytesInBuffer": nano.buffered_bytes,
+            "totalBytesProcessed": nano.bytes_processed,
+            "totalBytesWritten": nano.bytes_written,
+        }
+
+    def _post_learning(self, nano, query, headers, body):
+        nano.learning = query.get("enable") == "true"
+        return nano.learning
+
+    def _get_learning(self, nano, query, headers, body):
+        return nano.learning
+
+    def _post_rootCause(self, nano, query, headers, body):
+        nano.root_cause = query.get("enable") == "true"
+        return nano.root_cause
+
+    def _get_rootCause(self, nano, query, headers, body):
+        return nano.root_cause
+
+    def _post_clippingDetection(self, nano, query, headers, body):
+        nano.clipping = query.get("enable") == "true"
+        return nano.clipping
+
+    def _get_clippingDetection(self, nano, query, headers, body):
+        return nano.clipping
+
+    def _post_pruneCluster(self, nano, query, headers, body):
+        ids = sorted(set(json.loads(query.get("clusterID", "[]"))), reverse=True)
+        for cluster_id in ids:
+            if 1 <= cluster_id <= len(nano.sizes):
+                nano.centers = np.delete(nano.centers, cluster_id - 1, axis=0)
+                del nano.sizes[cluster_id - 1]
+        return {"numClustersRemaining": len(nano.sizes) + 1}
+
+    def _get_rootCauseAnalysis(self, nano, query, headers, body):
+        if "clusterID" in query:
+            centers = []
+            for cluster_id in json.loads(query["clusterID"]):
+                if not 1 <= cluster_id <= len(nano.sizes):
+                    raise BoonException(
+                        400, "cluster {} does not exist".format(cluster_id)
+                    )
+                centers.append(nano.centers[cluster_id - 1])
+            return [_root_cause(nano, center) for center in centers]
+        patterns = np.array(json.loads(query.get("pattern", "[]")), dtype=np.float64)
+        patterns = patterns.reshape(-1, nano.pattern_length)
+        return [_root_cause(nano, pattern) for pattern in nano.normalize(patterns)]
+
+    def _post_autoTune(self, nano, query, headers, body):
+        if not nano.buffer:
+            raise BoonException(400, "There is no data to autotune")
+        patterns = np.concatenate(nano.buffer)[:1000]
+        tuning = nano.config["autoTuning"]
+        features = nano.config["features"]
+        if tuning["autoTuneRange"]:
+            excluded = set(tuning.get("exclusions", []))
+            columns = patterns.reshape(-1, len(features))
+            low, high = columns.min(axis=0), columns.max(axis=0)
+            if not tuning["autoTuneByFeature"]:
+                low[:], high[:] = low.min(), high.max()
+            for index, feature in enumerate(features):
+                if index + 1 not in excluded:
+                    feature["minVal"] = float(low[index])
+                    feature["maxVal"] = float(high[index])
+        variations = [0.01 * step for step in range(1, 16)]
+        counts = []
+        for variation in variations:
+            trial = _Instance(nano.instance_id)
+            trial.config = dict(nano.config, percentVariation=variation)
+            trial.cluster(patterns)
+            counts.append(len(trial.sizes))
+        if tuning["autoTunePV"]:
+            fitting = [
+                variation
+                for variation, count in zip(variations, counts)
+                if count <= tuning["maxClusters"]
+            ]
+            nano.config["percentVariation"] = fitting[0] if fitting else variations[-1]
+        nano.autotune_array = [variations, counts]
+        return nano.config
+
+    def _get_autotuneArray(self, nano, query, headers, body):
+        if nano.autotune_array is None:
+            raise BoonException(400, "the nano has not been autotuned")
+        return nano.autotune_array
+
+    def _get_snapshot(self, nano, query, headers, body):
+        state = json.dumps(nano.state(), sort_keys=True).encode()
+        archive = io.BytesIO()
+        # fixed timestamps, so the same state always gives the same snapshot bytes
+        with gzip.GzipFile(fileobj=archive, mode="wb", mtime=0) as zipped:
+            with tarfile.open(fileobj=zipped, mode="w") as tar:
+                for name, content in [
+                    ("CommonState/MagicNumber", MAGIC_NUMBER),
+                    ("CommonState/State.json", state),
+                ]:
+                    info = tarfile.TarInfo(name)
+                    info.size = len(content)
+                    tar.addfile(info, io.BytesIO(content))
+        return archive.getvalue()
+
+    def _post_snapshot(self, nano, query, headers, body):
+        snapshot = _multipart_payload(headers, body)
+        try:
+            with tarfile.open(fileobj=io.BytesIO(snapshot), mode="r:gz") as tar:
+                if tar.extractfile("CommonState/MagicNumber").read() != MAGIC_NUMBER:
+                    raise ValueError("bad magic number")
+                state = json.load(tar.extractfile("CommonState/State.json"))
+            nano.restore(state)
+        except (KeyError, TypeError, ValueError, OSError, tarfile.TarError):
+            raise BoonException(400, "snapshot is not a Boon Logic nano-formatted file")
+        return nano.config
+
+    def _patterns(self, nano, query, headers, body):
+        """Decode the uploaded data of a data or nanoRunStreaming request into patterns"""
+        data = _multipart_payload(headers, body)
+        if query.get("gzip") == "true":
+            data = gzip.decompress(data)
+        if query.get("fileType", "raw").startswith("raw"):
+            values = np.frombuffer(data, dtype=_dtype(nano))
+        else:
+            text = data.decode("utf-8").replace("\n", ",").replace("\r", "")
+            values = np.array(
+                [value for value in text.split(",") if value], dtype=np.float64
+            )
+        if values.size % nano.pattern_length:
+            raise BoonException(
+                400, "data length is not a multiple of the pattern length"
+            )
+        return values.reshape(-1, nano.pattern_length).astype(np.float64)
+
+
+# endpoints usable before the instance is configured
+_UNCONFIGURED = [
+    "nanoInstance",
+    "clusterConfig",
+    "snapshot",
+    "learning",
+    "rootCause",
+    "clippingDetection",
+]
+
+
+def _dtype(nano):
+    return np.dtype(nano.config["numericFormat"])
+
+
+def _select(results, names):
+    """The requested results, names is a comma separated list or "All" """
+    if not names:
+        return {}
+    if names == "All":
+        return dict(results)
+    return {name: results[name] for name in names.split(",") if name in results}
+
+
+def _root_cause(nano, pattern):
+    """Share of each feature in the distance of a normalized pattern from the mean cluster"""
+    middle = nano.centers.mean(axis=0) if len(nano.sizes) else np.zeros_like(pattern)
+    deviation = np.abs(pattern - middle)
+    total = deviation.sum()
+    return (deviation / total if total else deviation).tolist()
+
+
+def _decode_body(headers, body):
+    encoding = headers.get("content-encoding")
+    if encoding == "gzip":
+        return zlib.decompress(body, 31)
+    if encoding == "deflate":
+        return zlib.decompress(body, 15)
+    if encoding == "br":
+        import brotli
+
+        return brotli.decompress(body)
+    if encoding == "zstd":
+        import zstandard
+
+        return zstandard.ZstdDecompressor().decompressobj().decompress(body)
+    return body
+
+
+def _multipart_payload(headers, body):
+    """Content of the single file part of a multipart/form-data body"""
+    content_type = headers.get("content-type", "")
+    if "boundary=" not in content_type:
+        raise BoonException(400, "expected a multipart/form-data upload")
+    boundary = content_type.split("boundary=")[1].encode()
+    start = body.find(b"\r\n\r\n")
+    end = body.rfind(b"\r\n--" + boundary)
+    if start < 0 or end < start:
+        raise BoonException(400, "malformed multipart/form-data upload")
+    return body[start + 4 : end]
+
+
+class FakeTransport(Transport):
+
+    """Transport answering an ExpertClient's requests in-process with a FakeExpert
+
+    Bodies are read and encoded exactly as for the network, so the client does all of
+    its usual work while no sockets are involved.  This measures the client's own
+    overhead and runs test suites without an Expert server.
+
+    Args:
+        expert (FakeExpert): the fake server, a new one when None
+
+    Attributes:
+        expert (FakeExpert): the fake server answering the requests
+        requests (int): number of requests sent
+    """
+
+    def __init__(self, expert: FakeExpert = None):
+        self.expert = FakeExpert() if expert is None else expert
+        self.requests = 0
+        self._lock = threading.Lock()
+
+    def __getstate__(self):
+        state = dict(self.__dict__)
+        del state["_lock"]
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._lock = threading.Lock()
+
+    def request(self, method, url, headers, body=None, fields=None, timeout=None):
+        if fields:
+            name, (filename, content) = next(iter(fields.items()))
+            body = MultipartEncoder(name, filename, content)
+            headers = dict(headers, **{"Content-Type": body.content_type})
+        with self._lock:
+            self.requests += 1
+        status_code, content, content_type = self.expert.handle(
+            method, url, headers, read_body(body)
+        )
+        return Response(status_code, content, {"Content-Type": content_type})
@@ -0,0 +1,159 @@
+"""Back up or restore every nano instance of an Expert server
+
+usage: boonnano-fleet backup DIRECTORY [options]
+       boonnano-fleet restore DIRECTORY [options]
+
+The server and credentials come from the license file, as for
+ExpertClient.from_license_file (BOON_LICENSE_FILE and BOON_LICENSE_ID apply).
+DIRECTORY holds one file per instance, or a SnapshotStore with --store.  A
+manifest in DIRECTORY records each instance done, so running the same command
+again after a partial failure resumes where it stopped.  The manifest is removed
+once a run finishes with no failures, so the next run, a scheduled backup for
+instance, starts over.  restore refuses a DIRECTORY that does not exist, or that
+is not a SnapshotStore with --store.  The exit status is 1 when any instance
+failed, and 2 for a command line that cannot run.
+"""
+
+import argparse
+import os
+import sys
+
+from .expert_client import BoonException, ExpertClient
+from .snapshot import SnapshotStore
+
+
+def _parser():
+    parser = argparse.ArgumentParser(
+        prog="boonnano-fleet",
+        description="Back up or restore nano instances of an Expert server",
+    )
+    parser.add_argument("operation", choices=["backup", "restore"])
+    parser.add_argument("directory", help="backup directory, or SnapshotStore path")
+    parser.add_argument(
+        "--store",
+        action="store_true",
+        help="keep the snapshots in a content-addressed SnapshotStore",
+    )
+    parser.add_argument(
+        "--instances", help="comma separated instance ids (default every instance)"
+    )
+    parser.add_argument(
+        "--workers", type=int, default=4, help="instances handled at once"
+    )
+    parser.add_argument(
+        "--manifest",
+        help="resume record (default backup-manifest.jsonl or restore-manifest.jsonl in the directory)",
+    )
+    parser.add_argument(
+        "--fresh", action="store_true", help="start over instead of resuming"
+    )
+    parser.add_argument(
+        "--at",
+        type=float,
+        help="restore from the store as of this time, seconds since the epoch",
+    )
+    parser.add_argument("--keep-last", type=int, help="prune the store after backup")
+    parser.add_argument("--keep-hourly", type=int, help="prune the store after backup")
+    parser.add_argument("--keep-daily", type=int, help="prune the store after backup")
+    parser.add_argument("--license-id", default="default")
+    parser.add_argument("--license-file", default="~/.BoonLogic.license")
+    return parser
+
+
+def _parse(argv=None):
+    """Parse and check the command line, exiting with a usage error when it cannot run"""
+    parser = _parser()
+    args = parser.parse_args(argv)
+    if not args.store and (args.keep_last or args.keep_hourly or args.keep_daily):
+        parser.error("--keep-last, --keep-hourly and --keep-daily need --store")
+    if args.operation == "restore":
+        # a mistyped path must not look like an empty backup
+        if not os.path.isdir(args.directory):
+            parser.error("backup directory {} does not exist".format(args.directory))
+        index = os.path.join(args.directory, "index.sqlite3")
+        if args.store and not os.path.exists(index):
+            parser.error("{} is not a SnapshotStore".format(args.directory))
+    return args
+
+
+def _megabytes(nbytes):
+    return "{:.1f} MB".format(nbytes / 1e6)
+
+
+def _reason(error):
+    if isinstance(error, BoonException):
+        return error.message
+    return "{}: {}".format(type(error).__name__, error)
+
+
+def run(args, client, out=sys.stdout):
+    """Run the parsed command line with client, return the report"""
+    if args.operation == "backup":
+        os.makedirs(args.directory, exist_ok=True)
+    destination = SnapshotStore(args.directory) if args.store else args.directory
+    manifest = args.manifest or os.path.join(
+        args.directory, "{}-manifest.jsonl".format(args.operation)
+    )
+    if args.fresh and os.path.exists(manifest):
+        os.remove(manifest)
+    instance_ids = args.instances.split(",") if args.instances else None
+    done = [0]
+
+    def progress(instance_id, outcome):
+        done[0] += 1
+        if isinstance(outcome, Exception):
+            status = "failed: {}".format(_reason(outcome))
+        else:
+            status = "{} in {:.2f} s".format(
+                _megabytes(outcome["bytes"]), outcome["seconds"]
+            )
+        out.write("[{}] {} {}\n".format(done[0], instance_id, status))
+        out.flush()
+
+    if args.operation == "backup":
+        report = client.save_nanos(
+            destination, instance_ids, args.workers, manifest, progress
+        )
+        if args.store and (args.keep_last or args.keep_hourly or args.keep_daily):
+            removed = destination.prune(
+                keep_last=args.keep_last,
+                keep_hourly=args.keep_hourly,
+                keep_daily=args.keep_daily,
+            )
+            out.write("pruned {} snapshots\n".format(len(removed)))
+    else:
+        report = client.restore_nanos(
+            destination, instance_ids, args.workers, manifest, progress, at=args.at
+        )
+
+    out.write(
+        "{}: {} done, {} failed, {} skipped, {} at {}/s in {:.1f} s\n".format(
+            args.operation,
+            len(report["completed"]),
+            len(report["failed"]),
+            len(report["skipped"]),
+            _megabytes(report["bytes"]),
+            _megabytes(report["bytes_per_sec"]),
+            report["seconds"],
+        )
+    )
+    if args.store:
+        destination.close()
+    # nothing left to resume
+    if not report["failed"] and os.path.exists(manifest):
+        os.remove(manifest)
+    return report
+
+
+def main(argv=None):
+    args = _parse(argv)
+    client = ExpertClient.from_license_file(
+        license_id=args.license_id, license_file=args.license_file
+    )
+    with client:
+        report = run(args, client)
+    return 1 if report["failed"] else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
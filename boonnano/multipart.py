@@ -0,0 +1,125 @@
+import os
+import time
+
+CHUNK_SIZE = 1 << 16
+
+# as urllib3.fields.format_multipart_header_param, the HTML5 form encoding
+_HEADER_PARAM_ESCAPES = {ord('"'): "%22", ord("\r"): "%0D", ord("\n"): "%0A"}
+
+
+def _header_param(name, value):
+    """name="value" for a part header, value utf-8 with quotes and line breaks escaped"""
+    return '{}="{}"'.format(name, value.translate(_HEADER_PARAM_ESCAPES))
+
+
+class MultipartEncoder:
+
+    """Streaming multipart/form-data body holding a single file part
+
+    The part content is read from source on demand, so the body is never held in
+    memory as a whole.  source may be a bytes-like object (sent as memoryview slices,
+    without copying), a binary file object (read in chunk_size pieces) or an iterable
+    of bytes chunks.  The encoder is itself a file-like object and an iterable of
+    chunks, so it can be passed as the request body.
+
+    Args:
+        name (str): form field name
+        filename (str): file name reported for the part
+        source: bytes-like object, binary file object or iterable of bytes
+        length (int): number of bytes in source, determined automatically for bytes-like
+            objects and regular files, required for a Content-Length with iterables
+        chunk_size (int): read size used when iterating over the body
+        progress (callable): called as progress(bytes_sent, total_bytes) after each
+            chunk, total_bytes is None when the length is not known
+
+    Attributes:
+        content_type (str): Content-Type header value for the body
+        len (int): total body size in bytes, None if the source length is unknown
+        bytes_read (int): number of body bytes produced so far
+        finished (float): time.perf_counter() when the end of the body was read, None before
+    """
+
+    def __init__(
+        self,
+        name: str,
+        filename: str,
+        source,
+        length: int = None,
+        chunk_size: int = CHUNK_SIZE,
+        progress=None,
+    ):
+        boundary = os.urandom(16).hex()
+        self.content_type = "multipart/form-data; boundary=" + boundary
+        self.chunk_size = chunk_size
+        self.progress = progress
+        self.bytes_read = 0
+        self.finished = None
+
+        # encoded once, the lengths are counted in bytes
+        disposition = "form-data; {}; {}".format(
+            _header_param("name", name), _header_param("filename", filename)
+        )
+        head = (
+            "--{}\r\n"
+            "Content-Disposition: {}\r\n"
+            "Content-Type: application/octet-stream\r\n\r\n"
+        ).format(boundary, disposition)
+        head = head.encode("utf-8")
+        tail = "\r\n--{}--\r\n".format(boundary).encode("utf-8")
+
+        if isinstance(source, (bytes, bytearray, memoryview)):
+            source = memoryview(source).cast("B")
+            length = source.nbytes
+        elif length is None and hasattr(source, "fileno"):
+            try:
+                length = os.fstat(source.fileno()).st_size - source.tell()
+            except (OSError, ValueError):
+                length = None
+
+        self._segments = [memoryview(head), source, memoryview(tail)]
+        self._offset = 0
+        self._iterator = None
+        self.len = None if length is None else len(head) + length + len(tail)
+
+    def __iter__(self):
+        while True:
+            chunk = self.read(self.chunk_size)
+            if not chunk:
+                return
+            yield chunk
+
+    def read(self, size: int = -1):
+        """Return the next piece of the body, empty at the end
+
+        Pieces are at most size bytes, except for chunks of an iterable source which are
+        returned as they come.
+        """
+        if size is None or size < 0:
+            size = self.chunk_size
+
+        while self._segments:
+            chunk = self._read_segment(self._segments[0], size)
+            if chunk:
+                self.bytes_read += len(chunk)
+                if self.progress is not None:
+                    self.progress(self.bytes_read, self.len)
+                return chunk
+            # current segment is exhausted, move on to the next
+            self._segments.pop(0)
+            self._offset = 0
+            self._iterator = None
+
+        if self.finished is None:
+            self.finished = time.perf_counter()
+        return b""
+
+    def _read_segment(self, segment, size):
+        if isinstance(segment, memoryview):
+            chunk = segment[self._offset : self._offset + size]
+            self._offset += len(chunk)
+            return chunk
+        if hasattr(segment, "read"):
+            return segment.read(size)
+        if self._iterator is None:
+            self._iterator = iter(segment)
+        return next(self._iterator, b"")
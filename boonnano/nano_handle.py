@@ -0,0 +1,191 @@
+NANO_ENDPOINTS = [
+    "nanoInstance",
+    "clusterConfig",
+    "snapshot",
+    "autoTune",
+    "autotuneArray",
+    "data",
+    "learning",
+    "rootCause",
+    "clippingDetection",
+    "nanoRun",
+    "pruneCluster",
+    "nanoRunStreaming",
+    "bufferStatus",
+    "nanoResults",
+    "nanoStatus",
+    "rootCauseAnalysis",
+]
+
+
+class NanoHandle(dict):
+
+    """Handle for a single nano pod instance
+
+    Returned by open_nano.  The handle holds the instance_id, the numeric format and
+    feature count of the instance, and its endpoint urls and request headers, so a
+    single client can drive many instances that use different numeric formats.
+    The per-instance client methods are available on the handle without the
+    instance_id argument.  When the handle belongs to an AsyncExpertClient they are
+    coroutines, and stream, run_pipeline and migrate_nano, which only ExpertClient
+    has, raise BoonException.
+
+    The handle is also a dictionary holding the instance metadata returned by the server.
+
+    Attributes:
+        client: ExpertClient or AsyncExpertClient that owns the handle
+        instance_id (str): instance identifier
+        numeric_format (str): numeric type of the instance data, None until the instance is
+            configured, restored or its config is fetched (get_config) through this client
+        feature_count (int): number of features per vector, None until configured
+        urls (dict): endpoint name to url for this instance
+        json_headers (dict): headers for requests with a json body
+        upload_headers (dict): headers for multipart uploads
+    """
+
+    def __init__(self, client, instance_id: str, metadata: dict = None):
+        super().__init__(metadata or {})
+        self.client = client
+        self.instance_id = instance_id
+        self.numeric_format = None
+        self.feature_count = None
+
+        query = "?api-tenant=" + client.api_tenant
+        self.urls = {
+            endpoint: client.url + "/" + endpoint + "/" + instance_id + query
+            for endpoint in NANO_ENDPOINTS
+        }
+        self.upload_headers = {
+            "x-token": client.api_key,
+            "User-Agent": client.user_agent,
+        }
+        self.json_headers = dict(self.upload_headers)
+        self.json_headers["Content-Type"] = "application/json"
+
+    def __repr__(self):
+        return "NanoHandle({!r}, {})".format(self.instance_id, dict.__repr__(self))
+
+    def _set_config(self, config: dict):
+        """Record the numeric format and feature count of an applied configuration"""
+        if not config or "numericFormat" not in config:
+            return
+        self.numeric_format = config["numericFormat"]
+        if "features" in config:
+            self.feature_count = len(config["features"])
+
+    def _sync_only(self, name):
+        """The client method name, which AsyncExpertClient does not have"""
+        from .expert_client import BoonException
+
+        method = getattr(self.client, name, None)
+        if method is None:
+            raise BoonException(
+                message="{} is not available on {} handles".format(
+                    name, type(self.client).__name__
+                )
+            )
+        return method
+
+    def get_nano_instance(self):
+        """Get instance info, see ExpertClient.get_nano_instance"""
+        return self.client.get_nano_instance(self.instance_id)
+
+    def close(self):
+        """Closes the pod instance, see ExpertClient.close_nano"""
+        return self.client.close_nano(self.instance_id)
+
+    def configure_nano(self, *args, **kwargs):
+        """Posts a clustering configuration, see ExpertClient.configure_nano"""
+        return self.client.configure_nano(self.instance_id, *args, **kwargs)
+
+    def save_nano(self, *args, **kwargs):
+        """Saves the pod instance to a local file, see ExpertClient.save_nano"""
+        return self.client.save_nano(self.instance_id, *args, **kwargs)
+
+    def restore_nano(self, *args, **kwargs):
+        """Restores the pod instance from a local file, see ExpertClient.restore_nano"""
+        return self.client.restore_nano(self.instance_id, *args, **kwargs)
+
+    def migrate_nano(self, *args, **kwargs):
+        """Copies the pod instance to another server, see ExpertClient.migrate_nano"""
+        return self._sync_only("migrate_nano")(self.instance_id, *args, **kwargs)
+
+    def autotune_config(self):
+        """Autotunes the configuration, see ExpertClient.autotune_config"""
+        return self.client.autotune_config(self.instance_id)
+
+    def get_autotune_array(self):
+        """Gets the autotune elbow, see ExpertClient.get_autotune_array"""
+        return self.client.get_autotune_array(self.instance_id)
+
+    def get_config(self):
+        """Gets the configuration, see ExpertClient.get_config"""
+        return self.client.get_config(self.instance_id)
+
+    def load_file(self, *args, **kwargs):
+        """Loads data from a file, see ExpertClient.load_file"""
+        return self.client.load_file(self.instance_id, *args, **kwargs)
+
+    def load_data(self, *args, **kwargs):
+        """Loads data from an array or list, see ExpertClient.load_data"""
+        return self.client.load_data(self.instance_id, *args, **kwargs)
+
+    def set_learning_enabled(self, status: bool):
+        """Turns learning on or off, see ExpertClient.set_learning_enabled"""
+        return self.client.set_learning_enabled(self.instance_id, status)
+
+    def is_learning_enabled(self):
+        """Learning on/off status, see ExpertClient.is_learning_enabled"""
+        return self.client.is_learning_enabled(self.instance_id)
+
+    def set_root_cause_enabled(self, status: bool):
+        """Turns root cause on or off, see ExpertClient.set_root_cause_enabled"""
+        return self.client.set_root_cause_enabled(self.instance_id, status)
+
+    def is_root_cause_enabled(self):
+        """Root cause on/off status, see ExpertClient.is_root_cause_enabled"""
+        return self.client.is_root_cause_enabled(self.instance_id)
+
+    def set_clipping_detection_enabled(self, status: bool):
+        """Turns clipping detection on or off, see ExpertClient.set_clipping_detection_enabled"""
+        return self.client.set_clipping_detection_enabled(self.instance_id, status)
+
+    def is_clipping_detection_enabled(self):
+        """Clipping detection on/off status, see ExpertClient.is_clipping_detection_enabled"""
+        return self.client.is_clipping_detection_enabled(self.instance_id)
+
+    def run_nano(self, *args, **kwargs):
+        """Clusters the buffered data, see ExpertClient.run_nano"""
+        return self.client.run_nano(self.instance_id, *args, **kwargs)
+
+    def prune_ids(self, *args, **kwargs):
+        """Removes clusters from the model, see ExpertClient.prune_ids"""
+        return self.client.prune_ids(self.instance_id, *args, **kwargs)
+
+    def run_streaming_nano(self, *args, **kwargs):
+        """Loads and clusters streaming data, see ExpertClient.run_streaming_nano"""
+        return self.client.run_streaming_nano(self.instance_id, *args, **kwargs)
+
+    def stream(self, *args, **kwargs):
+        """Clusters an iterable of patterns in micro-batches, see ExpertClient.stream"""
+        return self._sync_only("stream")(self.instance_id, *args, **kwargs)
+
+    def run_pipeline(self, *args, **kwargs):
+        """Clusters batches with overlapping stages, see ExpertClient.run_pipeline"""
+        return self._sync_only("run_pipeline")(self.instance_id, *args, **kwargs)
+
+    def get_buffer_status(self):
+        """Buffer statistics, see ExpertClient.get_buffer_status"""
+        return self.client.get_buffer_status(self.instance_id)
+
+    def get_nano_results(self, *args, **kwargs):
+        """Results per pattern, see ExpertClient.get_nano_results"""
+        return self.client.get_nano_results(self.instance_id, *args, **kwargs)
+
+    def get_nano_status(self, *args, **kwargs):
+        """Results per cluster and overall, see ExpertClient.get_nano_status"""
+        return self.client.get_nano_status(self.instance_id, *args, **kwargs)
+
+    def get_root_cause(self, *args, **kwargs):
+        """Root cause analysis, see ExpertClient.get_root_cause"""
+        return self.client.get_root_cause(self.instance_id, *args, **kwargs)
@@ -0,0 +1,154 @@
+RESULT_FORMATS = ["dict", "numpy", "structured"]
+# numpy dtype names, numpy itself is only imported once results are converted
+RESULT_DTYPES = {
+    "ID": "int32",
+    "AD": "uint8",
+    "AH": "int32",
+    "AW": "uint8",
+    "NW": "uint8",
+    "OM": "uint8",
+}
+
+
+def decode_results(response: dict, results_format: str = "dict"):
+    """Convert a dictionary of per-pattern result lists to the requested results_format
+
+    "dict" returns the response unchanged, "numpy" returns a dictionary of arrays and
+    "structured" a single structured array with one field per result.  IDs and anomaly
+    history are int32, detections, warning levels and operational modes uint8 and the
+    indexes float32.
+    """
+    if results_format == "dict":
+        return response
+
+    import numpy as np
+
+    arrays = {
+        key: np.asarray(values, dtype=RESULT_DTYPES.get(key, "float32"))
+        for key, values in response.items()
+    }
+    if results_format == "numpy":
+        return arrays
+
+    length = len(next(iter(arrays.values()))) if arrays else 0
+    structured = np.empty(
+        length, dtype=[(key, array.dtype) for key, array in arrays.items()]
+    )
+    for key, array in arrays.items():
+        structured[key] = array
+    return structured
+
+
+_WHITESPACE = b" \t\r\n"
+
+
+class ResultsParser:
+
+    """Incremental parser for result responses shaped {"ID": [...], "SI": [...], ...}
+
+    Bytes are fed as they arrive from the network.  The numbers of each result are
+    converted in bulk into arrays of the result's type (see decode_results) as soon as
+    a piece of the list is complete, so memory holds the compact arrays and one piece
+    of text rather than the whole response and millions of Python numbers.
+
+    Raises ValueError when the response does not have the expected shape.
+    """
+
+    def __init__(self):
+        self._pending = b""
+        self._state = "start"
+        self._key = None
+        self._pieces = None
+        self.arrays = {}
+
+    def feed(self, data):
+        """Parse the next piece of the response"""
+        data = self._pending + bytes(data)
+        self._pending = b""
+        position = 0
+        end = len(data)
+
+        while position < end:
+            if self._state == "values":
+                close = data.find(b"]", position)
+                if close < 0:
+                    # keep the number that may be cut at the end of the piece
+                    comma = data.rfind(b",", position)
+                    if comma < 0:
+                        self._pending = data[position:]
+                    else:
+                        self._convert(data[position:comma])
+                        self._pending = data[comma + 1 :]
+                    return
+                self._convert(data[position:close])
+                import numpy as np
+
+                self.arrays[self._key] = (
+                    np.concatenate(self._pieces)
+                    if self._pieces
+                    else np.empty(0, dtype=self._dtype())
+                )
+                self._state = "next"
+                position = close + 1
+                continue
+
+            if data[position] in _WHITESPACE:
+                position += 1
+                continue
+
+            if self._state == "name":
+                quote = data.find(b'"', position)
+                if quote < 0:
+                    self._pending = data[position:]
+                    return
+                self._key = data[position:quote].decode("utf-8")
+                self._state = "colon"
+                position = quote + 1
+                continue
+
+            token = data[position : position + 1]
+            expected = {
+                "start": b"{",
+                "key": b'"}',
+                "colon": b":",
+                "open": b"[",
+                "next": b",}",
+            }.get(self._state, b"")
+            if token not in expected or not token:
+                raise ValueError(
+                    "unexpected {!r} in results at state {}".format(token, self._state)
+                )
+            position += 1
+
+            if self._state == "start":
+                self._state = "key"
+            elif self._state == "key":
+                self._state = "name" if token == b'"' else "done"
+            elif self._state == "colon":
+                self._state = "open"
+            elif self._state == "open":
+                self._pieces = []
+                self._state = "values"
+            elif token == b",":
+                self._state = "key"
+            else:
+                self._state = "done"
+
+    def close(self):
+        """Return the dictionary of result arrays once the whole response has been fed"""
+        if self._state != "done" or self._pending.strip(_WHITESPACE):
+            raise ValueError("incomplete results")
+        return self.arrays
+
+    def _dtype(self):
+        return RESULT_DTYPES.get(self._key, "float32")
+
+    def _convert(self, text):
+        if not text.strip(_WHITESPACE):
+            return
+        import numpy as np
+
+        values = np.fromstring(text, dtype=np.float64, sep=",")
+        if len(values) != text.count(b",") + 1:
+            raise ValueError("malformed numbers in results for " + self._key)
+        self._pieces.append(values.astype(self._dtype()))
@@ -0,0 +1,124 @@
+import bisect
+import random
+import threading
+
+# methods whose requests can be repeated without changing the state of an instance
+IDEMPOTENT_METHODS = ["GET"]
+
+# BoonException messages and status codes of failures worth another attempt
+TRANSIENT_MESSAGES = ["request timed out", "server does not exist"]
+TRANSIENT_STATUS_CODES = [502, 503, 504]
+
+
+def is_transient(exception):
+    """Whether a BoonException reports a dropped, refused or overloaded connection"""
+    return (
+        exception.status_code in TRANSIENT_STATUS_CODES
+        or exception.message in TRANSIENT_MESSAGES
+    )
+
+
+def endpoint_name(url: str):
+    """Endpoint of an Expert url, "nanoResults" for .../expert/v3/nanoResults/my-id?..."""
+    path = url.split("?")[0]
+    if "/expert/v3/" in path:
+        return path.split("/expert/v3/")[1].split("/")[0]
+    return path.rstrip("/").split("/")[-1]
+
+
+class LatencyHistogram:
+
+    """Thread-safe histogram of request latencies with logarithmic buckets
+
+    Buckets grow by 25% from 1 ms, so quantiles are accurate to within a quarter of
+    their value.
+    """
+
+    BOUNDS = [0.001 * 1.25**index for index in range(60)]
+
+    def __init__(self):
+        self.counts = [0] * (len(self.BOUNDS) + 1)
+        self.count = 0
+        self.total = 0.0
+        self._lock = threading.Lock()
+
+    def record(self, seconds: float):
+        index = bisect.bisect_left(self.BOUNDS, seconds)
+        with self._lock:
+            self.counts[index] += 1
+            self.count += 1
+            self.total += seconds
+
+    def quantile(self, q: float):
+        """Upper bound of the bucket holding the q quantile, None without samples"""
+        with self._lock:
+            if self.count == 0:
+                return None
+            rank = q * self.count
+            seen = 0
+            for index, count in enumerate(self.counts):
+                seen += count
+                if seen >= rank and count:
+                    break
+        if index < len(self.BOUNDS):
+            return self.BOUNDS[index]
+        return self.BOUNDS[-1]
+
+    @property
+    def stats(self):
+        return {
+            "count": self.count,
+            "mean": self.total / self.count if self.count else None,
+            "p50": self.quantile(0.5),
+            "p95": self.quantile(0.95),
+            "p99": self.quantile(0.99),
+        }
+
+
+class RetryPolicy:
+
+    """Retries and hedging for idempotent requests
+
+    Requests whose method is in IDEMPOTENT_METHODS are repeated when the connection
+    fails, times out or the server answers 502, 503 or 504.  Before attempt n+1 the
+    client sleeps a random time between 0 and min(max_backoff, backoff * 2**n) ("full
+    jitter"), so clients that failed together do not retry together.
+
+    With hedge, a duplicate request is sent when the first one has not answered within
+    the hedge_quantile latency of its endpoint, and the first answer is used.  Hedging
+    starts once the endpoint has min_samples latencies recorded.
+
+    Args:
+        retries (int): number of additional attempts after the first one
+        backoff (float): base delay in seconds
+        max_backoff (float): longest delay in seconds
+        hedge (bool): send duplicate requests for slow idempotent requests
+        hedge_quantile (float): latency quantile after which the duplicate is sent
+        min_samples (int): latencies recorded for an endpoint before hedging it
+    """
+
+    def __init__(
+        self,
+        retries: int = 2,
+        backoff: float = 0.1,
+        max_backoff: float = 5.0,
+        hedge: bool = False,
+        hedge_quantile: float = 0.95,
+        min_samples: int = 20,
+    ):
+        self.retries = retries
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        self.hedge = hedge
+        self.hedge_quantile = hedge_quantile
+        self.min_samples = min_samples
+
+    def delay(self, attempt: int):
+        """Sleep time in seconds before retrying after the given failed attempt (0 based)"""
+        return random.uniform(0, min(self.max_backoff, self.backoff * 2**attempt))
+
+    def hedge_delay(self, histogram: LatencyHistogram):
+        """Time to wait before hedging a request, None when it should not be hedged"""
+        if not self.hedge or histogram.count < self.min_samples:
+            return None
+        return histogram.quantile(self.hedge_quantile)
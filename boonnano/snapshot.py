@@ -0,0 +1,566 @@
+from contextlib import contextmanager
+import os
+import time
+import zlib
+
+from .multipart import CHUNK_SIZE
+
+# the member of a saved nano holding MAGIC_NUMBER
+MAGIC_MEMBER = "CommonState/MagicNumber"
+MAGIC_NUMBER = b"\xda\xba"
+_BLOCK = 512
+
+
+class SnapshotWriter:
+
+    """Writes a downloaded snapshot to filename atomically, hashing it on the way
+
+    The snapshot is fed in pieces as it arrives and written to a temporary file next
+    to filename, so memory holds one piece at a time.  commit() makes the file durable
+    and renames it over filename, a failed or abandoned download is removed with
+    discard() and never leaves a truncated file behind.
+
+    Attributes:
+        size (int): bytes written so far
+        sha256 (str): hex digest of the bytes written so far
+    """
+
+    def __init__(self, filename: str):
+        import hashlib
+        import tempfile
+
+        self.filename = filename
+        directory, name = os.path.split(os.path.abspath(filename))
+        fd, self._temp_name = tempfile.mkstemp(
+            prefix="." + name + ".", suffix=".part", dir=directory
+        )
+        self._fp = os.fdopen(fd, "wb")
+        self._hash = hashlib.sha256()
+        self.size = 0
+
+    @property
+    def sha256(self):
+        return self._hash.hexdigest()
+
+    def feed(self, data):
+        """Write the next piece of the snapshot"""
+        self._fp.write(data)
+        self._hash.update(data)
+        self.size += len(data)
+
+    def close(self):
+        """Hand the written bytes to the operating system once the whole snapshot has been fed"""
+        self._fp.flush()
+        return self
+
+    def commit(self, filename: str = None):
+        """Flush the snapshot to disk and move it to filename, by default the one it was created for
+
+        Another filename must be on the same file system.
+        """
+        if filename is not None:
+            self.filename = filename
+        self._fp.flush()
+        os.fsync(self._fp.fileno())
+        self._fp.close()
+        os.replace(self._temp_name, self.filename)
+        self._temp_name = None
+        _sync_directory(os.path.dirname(os.path.abspath(self.filename)))
+
+    def discard(self):
+        """Remove the temporary file, nothing is done after commit()"""
+        if self._temp_name is None:
+            return
+        self._fp.close()
+        try:
+            os.remove(self._temp_name)
+        except FileNotFoundError:
+            pass
+        self._temp_name = None
+
+
+def _sync_directory(directory):
+    """Make a rename in directory durable, where the platform allows it"""
+    if os.name != "posix":
+        return
+    fd = os.open(directory, os.O_RDONLY)
+    try:
+        os.fsync(fd)
+    finally:
+        os.close(fd)
+
+
+class SnapshotReader:
+
+    """Binary file source for uploading a saved nano, hashed as it is read
+
+    The upload reads the file once, in pieces, and hashes it on the way.  With sha256,
+    the piece that completes the file raises ValueError instead of being returned when
+    the digest differs, so a damaged snapshot is never uploaded whole.
+
+    Args:
+        filename (str): path to the saved nano
+        sha256 (str): expected hex digest of the file, None to skip the comparison
+
+    Attributes:
+        length (int): size of the file in bytes
+        size (int): bytes read so far
+        sha256 (str): hex digest of the bytes read so far
+
+    """
+
+    def __init__(self, filename: str, sha256: str = None):
+        import hashlib
+
+        self.filename = filename
+        self.expected = sha256
+        self._fp = open(filename, "rb")
+        self.length = os.fstat(self._fp.fileno()).st_size
+        self._hash = hashlib.sha256()
+        self.size = 0
+        self.error = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    @property
+    def sha256(self):
+        return self._hash.hexdigest()
+
+    def read(self, size: int = -1):
+        """Return the next piece of the file, empty at the end"""
+        chunk = self._fp.read(size)
+        self._hash.update(chunk)
+        self.size += len(chunk)
+        if (
+            self.expected is not None
+            and chunk
+            and self.size >= self.length
+            and self.sha256 != self.expected
+        ):
+            self.error = ValueError(
+                "file {} does not match sha256 {}".format(self.filename, self.expected)
+            )
+            raise self.error
+        return chunk
+
+    def close(self):
+        self._fp.close()
+
+
+def read_magic_number(fp):
+    """Return the content of the magic number member of the gzip'd tar read from fp
+
+    The gzip stream is decompressed only up to the member and the tar headers are
+    walked without extracting anything, so the cost does not depend on the size of
+    the rest of the archive.  Returns None when the archive has no such member.
+
+    Raises ValueError when fp does not hold a gzip'd tar.
+    """
+    decompressor = zlib.decompressobj(16 + zlib.MAX_WBITS)
+    walker = _TarWalker(MAGIC_MEMBER)
+    try:
+        while walker.content is None and not walker.ended:
+            compressed = fp.read(CHUNK_SIZE)
+            if not compressed:
+                break
+            # bounded pieces, so a highly compressed member is never inflated at once
+            while compressed and walker.content is None and not walker.ended:
+                walker.feed(decompressor.decompress(compressed, CHUNK_SIZE))
+                compressed = decompressor.unconsumed_tail
+    except zlib.error as e:
+        raise ValueError("not a gzip file: {}".format(e))
+    return walker.content
+
+
+class _TarWalker:
+
+    """Finds one member in a tar stream fed in pieces, skipping over the other members"""
+
+    def __init__(self, name):
+        self.name = name
+        self.content = None
+        self.ended = False
+        self._pending = b""
+        self._skip = 0
+        self._size = None
+
+    def feed(self, data):
+        data = self._pending + data
+        position = 0
+        while not self.ended and self.content is None:
+            if self._skip:
+                step = min(self._skip, len(data) - position)
+                position += step
+                self._skip -= step
+                if self._skip:
+                    break
+            if len(data) - position < (_BLOCK if self._size is None else self._size):
+                break
+            if self._size is not None:
+                # the member sought, followed by its padding
+                self.content = data[position : position + self._size]
+                break
+            header = data[position : position + _BLOCK]
+            position += _BLOCK
+            if not header.strip(b"\0"):
+                self.ended = True
+                break
+            size = _header_size(header)
+            if _header_name(header) == self.name and header[156:157] in b"0\0":
+                self._size = size
+            else:
+                self._skip = -(-size // _BLOCK) * _BLOCK
+        self._pending = data[position:]
+
+
+def _header_name(header):
+    name = header[:100].split(b"\0", 1)[0]
+    # posix ustar, gnu tar keeps times where the prefix would be
+    if header[257:263] == b"ustar\0":
+        prefix = header[345:500].split(b"\0", 1)[0]
+        if prefix:
+            name = prefix + b"/" + name
+    return name.decode("utf-8", "replace")
+
+
+def _header_size(header):
+    field = header[124:136]
+    if field[0] & 0x80:
+        # base-256 encoding of large sizes
+        return int.from_bytes(field[1:], "big")
+    try:
+        return int(field.split(b"\0", 1)[0].strip() or b"0", 8)
+    except ValueError:
+        raise ValueError("invalid tar header")
+
+
+class SnapshotRef:
+
+    """A snapshot held by a SnapshotStore, accepted by restore_nano in place of a filename
+
+    Attributes:
+        instance_id (str): instance the snapshot was taken of
+        created (float): time the snapshot was taken, seconds since the epoch
+        sha256 (str): hex digest of the snapshot, which restore_nano verifies
+        size (int): size of the snapshot in bytes
+        path (str): file holding the snapshot, shared by every identical snapshot
+    """
+
+    def __init__(
+        self, instance_id: str, created: float, sha256: str, size: int, path: str
+    ):
+        self.instance_id = instance_id
+        self.created = created
+        self.sha256 = sha256
+        self.size = size
+        self.path = path
+
+    def __repr__(self):
+        return "SnapshotRef({})".format(
+            ", ".join("{}={!r}".format(key, value) for key, value in vars(self).items())
+        )
+
+    def __eq__(self, other):
+        return isinstance(other, SnapshotRef) and vars(self) == vars(other)
+
+
+class SnapshotStore:
+
+    """Content-addressed directory of saved nanos with an index by instance and time
+
+    Snapshots are named by their sha256, so identical snapshots (an instance that did
+    not learn between two checkpoints, or two instances in the same state) are written
+    to disk once.  Every snapshot taken is recorded in an sqlite index with its
+    instance and time, which find() and snapshots() query, and prune() applies
+    retention policies to.  A file is removed once no recorded snapshot refers to it.
+
+    Pass the store to save_nano instead of a filename to take a snapshot into it, and a
+    SnapshotRef to restore_nano instead of a filename to restore one.  Several threads
+    and processes can use the same store, saving and pruning take turns on the index.
+
+    Args:
+        path (str): directory of the store, created when missing
+
+    Layout:
+        objects/ab/abcdef...: the snapshots, named by sha256
+        index.sqlite3: the index
+    """
+
+    def __init__(self, path: str):
+        import sqlite3
+        import threading
+
+        self.path = os.path.abspath(path)
+        self._objects = os.path.join(self.path, "objects")
+        os.makedirs(self._objects, exist_ok=True)
+        # transactions are managed explicitly, see _transaction
+        self._db = sqlite3.connect(
+            os.path.join(self.path, "index.sqlite3"),
+            isolation_level=None,
+            check_same_thread=False,
+            timeout=60.0,
+        )
+        self._lock = threading.Lock()
+        with self._transaction():
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS snapshots ("
+                "id INTEGER PRIMARY KEY, instance_id TEXT NOT NULL, "
+                "created REAL NOT NULL, sha256 TEXT NOT NULL, size INTEGER NOT NULL)"
+            )
+            self._db.execute(
+                "CREATE INDEX IF NOT EXISTS snapshots_by_instance "
+                "ON snapshots (instance_id, created)"
+            )
+            self._db.execute(
+                "CREATE INDEX IF NOT EXISTS snapshots_by_sha256 ON snapshots (sha256)"
+            )
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def close(self):
+        """Close the index"""
+        with self._lock:
+            self._db.close()
+
+    def find(self, instance_id: str, at: float = None):
+        """The latest snapshot of instance_id taken at or before at (default now), None if there is none"""
+        query = "SELECT * FROM snapshots WHERE instance_id = ?"
+        parameters = [instance_id]
+        if at is not None:
+            query += " AND created <= ?"
+            parameters.append(at)
+        rows = self._query(
+            query + " ORDER BY created DESC, id DESC LIMIT 1", parameters
+        )
+        return rows[0] if rows else None
+
+    def snapshots(
+        self, instance_id: str = None, since: float = None, until: float = None
+    ):
+        """Recorded snapshots, oldest first, of instance_id (default all) taken between since and until"""
+        conditions = []
+        parameters = []
+        for condition, value in [
+            ("instance_id = ?", instance_id),
+            ("created >= ?", since),
+            ("created <= ?", until),
+        ]:
+            if value is not None:
+                conditions.append(condition)
+                parameters.append(value)
+        query = "SELECT * FROM snapshots"
+        if conditions:
+            query += " WHERE " + " AND ".join(conditions)
+        return self._query(query + " ORDER BY created, id", parameters)
+
+    def instance_ids(self):
+        """Instances with recorded snapshots"""
+        with self._lock:
+            rows = self._db.execute(
+                "SELECT DISTINCT instance_id FROM snapshots ORDER BY instance_id"
+            ).fetchall()
+        return [row[0] for row in rows]
+
+    def put(self, instance_id: str, filename: str, created: float = None):
+        """Record an existing snapshot file, copying it into the store unless it holds it already"""
+        writer = self._writer()
+        try:
+            with open(filename, "rb") as fp:
+                while True:
+                    chunk = fp.read(CHUNK_SIZE)
+                    if not chunk:
+                        break
+                    writer.feed(chunk)
+            return self._add(instance_id, writer.close(), created)
+        finally:
+            writer.discard()
+
+    def prune(
+        self,
+        instance_id: str = None,
+        keep_last: int = None,
+        keep_hourly: int = None,
+        keep_daily: int = None,
+    ):
+        """Forget the snapshots no retention rule keeps, and remove the files left unused
+
+        The rules apply to each instance separately (or to instance_id only), and a
+        snapshot is kept when any of them keeps it.  Hours and days are UTC.
+
+        Args:
+            instance_id (str): instance to prune, None for every instance
+            keep_last (int): keep the latest keep_last snapshots
+            keep_hourly (int): keep the latest snapshot of each of the latest keep_hourly hours with snapshots
+            keep_daily (int): keep the latest snapshot of each of the latest keep_daily days with snapshots
+
+        Returns:
+            removed (list): SnapshotRef of each snapshot forgotten
+        """
+        if keep_last is None and keep_hourly is None and keep_daily is None:
+            raise ValueError("at least one of keep_last, keep_hourly or keep_daily")
+
+        with self._transaction():
+            query = "SELECT * FROM snapshots"
+            parameters = []
+            if instance_id is not None:
+                query += " WHERE instance_id = ?"
+                parameters.append(instance_id)
+            rows = self._db.execute(
+                query + " ORDER BY instance_id, created DESC, id DESC", parameters
+            ).fetchall()
+
+            removed = []
+            start = 0
+            while start < len(rows):
+                end = start
+                while end < len(rows) and rows[end][1] == rows[start][1]:
+                    end += 1
+                kept = _retained(rows[start:end], keep_last, keep_hourly, keep_daily)
+                removed += [row for row in rows[start:end] if row[0] not in kept]
+                start = end
+
+            self._db.executemany(
+                "DELETE FROM snapshots WHERE id = ?", [(row[0],) for row in removed]
+            )
+            for sha256 in sorted(set(row[3] for row in removed)):
+                if not self._db.execute(
+                    "SELECT 1 FROM snapshots WHERE sha256 = ? LIMIT 1", (sha256,)
+                ).fetchone():
+                    try:
+                        os.remove(self._object_path(sha256))
+                    except FileNotFoundError:
+                        pass
+
+        return [self._ref(row) for row in reversed(removed)]
+
+    def _writer(self):
+        """SnapshotWriter with its temporary file in the store, see _add"""
+        return SnapshotWriter(os.path.join(self._objects, "snapshot"))
+
+    def _add(self, instance_id, writer, created=None):
+        """Record the snapshot fed to writer, committing it unless the store holds it already"""
+        if created is None:
+            created = time.time()
+        path = self._object_path(writer.sha256)
+        with self._transaction():
+            if os.path.exists(path):
+                writer.discard()
+            else:
+                os.makedirs(os.path.dirname(path), exist_ok=True)
+                writer.commit(path)
+            cursor = self._db.execute(
+                "INSERT INTO snapshots (instance_id, created, sha256, size) "
+                "VALUES (?, ?, ?, ?)",
+                (instance_id, created, writer.sha256, writer.size),
+            )
+            row = (cursor.lastrowid, instance_id, created, writer.sha256, writer.size)
+        return self._ref(row)
+
+    def _object_path(self, sha256):
+        return os.path.join(self._objects, sha256[:2], sha256)
+
+    def _ref(self, row):
+        _, instance_id, created, sha256, size = row
+        return SnapshotRef(
+            instance_id, created, sha256, size, self._object_path(sha256)
+        )
+
+    def _query(self, query, parameters):
+        with self._lock:
+            rows = self._db.execute(query, parameters).fetchall()
+        return [self._ref(row) for row in rows]
+
+    @contextmanager
+    def _transaction(self):
+        """Hold the index for writing, shutting out other threads and processes"""
+        with self._lock:
+            self._db.execute("BEGIN IMMEDIATE")
+            try:
+                yield
+            except BaseException:
+                self._db.execute("ROLLBACK")
+                raise
+            self._db.execute("COMMIT")
+
+
+def _retained(rows, keep_last, keep_hourly, keep_daily):
+    """Ids of the rows of one instance, latest first, that the retention rules keep"""
+    kept = set(row[0] for row in rows[: keep_last or 0])
+    for count, seconds in [(keep_hourly, 3600), (keep_daily, 86400)]:
+        periods = set()
+        for row in rows:
+            if not count:
+                break
+            period = int(row[2] // seconds)
+            if period in periods:
+                continue
+            if len(periods) == count:
+                break
+            periods.add(period)
+            kept.add(row[0])
+    return kept
+
+
+def snapshot_filename(instance_id: str):
+    """Name of the file holding the snapshot of instance_id in a backup directory"""
+    from urllib.parse import quote
+
+    return quote(instance_id, safe="") + ".tgz"
+
+
+def snapshot_instance_ids(directory: str):
+    """Instances with a snapshot in a backup directory, see snapshot_filename"""
+    from urllib.parse import unquote
+
+    return sorted(
+        unquote(name[: -len(".tgz")])
+        for name in os.listdir(directory)
+        if name.endswith(".tgz") and not name.startswith(".")
+    )
+
+
+class Manifest:
+
+    """Append-only record of the instances a fleet backup or restore has completed
+
+    Each completed instance is a line of json, flushed to disk as soon as it is
+    recorded, so a run that stopped part way can be resumed from what was done.  A
+    line cut short by a crash is ignored.
+
+    Attributes:
+        completed (dict): instance_id to the record of every completed instance
+    """
+
+    def __init__(self, path: str):
+        import json
+
+        self.path = path
+        self.completed = {}
+        try:
+            with open(path, "rb") as fp:
+                for line in fp:
+                    try:
+                        record = json.loads(line)
+                    except ValueError:
+                        continue
+                    self.completed[record["instance_id"]] = record
+        except FileNotFoundError:
+            pass
+
+    def record(self, instance_id: str, record: dict):
+        import json
+
+        record = dict(record, instance_id=instance_id)
+        with open(self.path, "ab") as fp:
+            fp.write(json.dumps(record, sort_keys=True).encode("utf-8") + b"\n")
+            fp.flush()
+            os.fsync(fp.fileno())
+        self.completed[instance_id] = record
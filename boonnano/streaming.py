@@ -0,0 +1,147 @@
+import queue
+import threading
+import time
+
+_END = object()
+
+
+class _RowReader(threading.Thread):
+
+    """Background thread that pulls rows from an iterable into a bounded queue"""
+
+    def __init__(self, rows, maxsize: int):
+        super().__init__(daemon=True)
+        self.rows = rows
+        self.queue = queue.Queue(maxsize=maxsize)
+        self.stopped = threading.Event()
+
+    def run(self):
+        try:
+            for row in self.rows:
+                if not self._put(row):
+                    return
+            self._put(_END)
+        except BaseException as e:
+            self._put(e)
+
+    def _put(self, item):
+        while not self.stopped.is_set():
+            try:
+                self.queue.put(item, timeout=0.1)
+                return True
+            except queue.Full:
+                pass
+        return False
+
+
+def micro_batches(rows, max_batch_rows: int, max_delay: float):
+    """Group rows from an iterable into lists of rows
+
+    A batch is emitted when it holds max_batch_rows rows or when max_delay seconds
+    have passed since its first row arrived, whichever comes first.  Rows are read on
+    a background thread so a slow source cannot hold back a batch past its deadline.
+    """
+    reader = _RowReader(rows, maxsize=2 * max_batch_rows)
+    reader.start()
+    try:
+        finished = False
+        while not finished:
+            item = reader.queue.get()
+            if item is _END:
+                return
+            if isinstance(item, BaseException):
+                raise item
+
+            batch = [item]
+            deadline = time.monotonic() + max_delay
+            while len(batch) < max_batch_rows:
+                timeout = deadline - time.monotonic()
+                if timeout <= 0:
+                    break
+                try:
+                    item = reader.queue.get(timeout=timeout)
+                except queue.Empty:
+                    break
+                if item is _END:
+                    finished = True
+                    break
+                if isinstance(item, BaseException):
+                    yield batch
+                    raise item
+                batch.append(item)
+            yield batch
+    finally:
+        reader.stopped.set()
+
+
+class _Stage(threading.Thread):
+
+    """Pipeline stage thread applying a function to each item between two bounded queues"""
+
+    def __init__(self, function, inbox, outbox, stopped):
+        super().__init__(daemon=True)
+        self.function = function
+        self.inbox = inbox
+        self.outbox = outbox
+        self.stopped = stopped
+
+    def run(self):
+        while True:
+            item = self._get()
+            if item is None:
+                return
+            if item is not _END and not isinstance(item, BaseException):
+                try:
+                    item = self.function(item)
+                except BaseException as e:
+                    item = e
+            if not self._put(item) or item is _END or isinstance(item, BaseException):
+                return
+
+    def _get(self):
+        while not self.stopped.is_set():
+            try:
+                return self.inbox.get(timeout=0.1)
+            except queue.Empty:
+                pass
+        return None
+
+    def _put(self, item):
+        while not self.stopped.is_set():
+            try:
+                self.outbox.put(item, timeout=0.1)
+                return True
+            except queue.Full:
+                pass
+        return False
+
+
+def pipeline(items, stages, depth: int = 1):
+    """Run items through a chain of functions, each stage on its own thread
+
+    Stages are connected by queues holding at most depth items, so while the consumer
+    handles the result of item N, the last stage can work on item N+1, the stage before
+    it on item N+2 and so on, with memory bounded by the queue sizes.  Every stage handles
+    one item at a time, so results are yielded in input order.  The first exception
+    raised by the source or a stage is re-raised to the consumer.
+    """
+    reader = _RowReader(items, maxsize=depth)
+    threads = [reader]
+    inbox = reader.queue
+    for function in stages:
+        outbox = queue.Queue(maxsize=depth)
+        threads.append(_Stage(function, inbox, outbox, reader.stopped))
+        inbox = outbox
+
+    for thread in threads:
+        thread.start()
+    try:
+        while True:
+            item = inbox.get()
+            if item is _END:
+                return
+            if isinstance(item, BaseException):
+                raise item
+            yield item
+    finally:
+        reader.stopped.set()
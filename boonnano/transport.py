@@ -0,0 +1,88 @@
+from .multipart import CHUNK_SIZE
+
+
+class Response:
+
+    """Response returned by a Transport
+
+    Attributes:
+        status_code (int): http status code
+        headers (dict): response headers
+        content (bytes): response body
+        text (str): response body decoded as utf-8
+    """
+
+    def __init__(self, status_code: int, content: bytes, headers: dict = None):
+        self.status_code = status_code
+        self.content = content
+        self.headers = headers or {}
+
+    @property
+    def text(self):
+        return self.content.decode("utf-8", "replace")
+
+    def iter_content(self, chunk_size: int = CHUNK_SIZE):
+        """Return the body in pieces of at most chunk_size bytes"""
+        view = memoryview(self.content)
+        for index in range(0, len(view), chunk_size):
+            yield view[index : index + chunk_size]
+
+    def close(self):
+        pass
+
+
+class Transport:
+
+    """Sends the requests of an ExpertClient
+
+    ExpertClient sends its requests through the pooled requests session unless it is
+    given a transport.  A transport implements request, which sends one request and
+    returns an object with the status_code, content and text of the response and an
+    iter_content(chunk_size) method, like requests.Response and Response.  Failures to
+    reach the server are reported by raising BoonException(500, "server does not
+    exist") or BoonException(500, "request timed out"), which the client retries for
+    idempotent requests.  A client is pickled with its transport, so a client whose
+    transport cannot be pickled cannot be sent to another process.
+    """
+
+    def request(
+        self,
+        method: str,
+        url: str,
+        headers: dict,
+        body=None,
+        fields: dict = None,
+        timeout: float = None,
+    ):
+        """Send a request and return its response
+
+        Args:
+            method (str): http method
+            url (str): request url including the query
+            headers (dict): request headers
+            body: None, bytes, or a file-like or iterable streaming body such as a MultipartEncoder
+            fields (dict): form field name to (file name, content) for multipart uploads
+            timeout (float): seconds to wait for the server
+        """
+        raise NotImplementedError
+
+    def close(self):
+        """Release the resources held by the transport"""
+
+
+def read_body(body):
+    """Return a request body as bytes, reading streaming bodies to the end"""
+    if body is None:
+        return b""
+    if isinstance(body, (bytes, bytearray, memoryview)):
+        return bytes(body)
+    if isinstance(body, str):
+        return body.encode("utf-8")
+    if hasattr(body, "read"):
+        chunks = []
+        while True:
+            chunk = body.read(CHUNK_SIZE)
+            if not chunk:
+                return b"".join(chunks)
+            chunks.append(chunk)
+    return b"".join(bytes(chunk) for chunk in body)
@@ -10,6 +10,8 @@ setup(
     author_email="elise@boonlogic.com",
     packages=['boonnano'],
     install_requires=['urllib3','numpy'],
+    extras_require={'async': ['aiohttp'], 'fast': ['orjson']},
+    entry_points={'console_scripts': ['boonnano-fleet=boonnano.fleet:main']},
     description="A SDK package for utilizing the BoonLogic nano API",
     long_description=long_description,
     license='MIT',
@@ -3,11 +3,19 @@ import sys
 sys.path.append('..')
 
 import boonnano as bn
+import asyncio
 import csv
+import json
 import os
+import threading
+import time
+import zlib
+from urllib.parse import urlsplit
 import numpy as np
 import pytest
 from boonnano import BoonException, LicenseProfile
+from boonnano.expert_client import ScratchBuffer, normalize_nano_data
+from boonnano.multipart import MultipartEncoder
 from expert_secrets import get_secrets
 
 
@@ -33,6 +41,94 @@ def create_nano_client():
     return nano_client
 
 
+class LocalServer:
+    """Minimal local HTTP server answering with canned JSON, for tests that run without an Expert server
+
+    routes maps (method, path) to (status code, body), body or the pair may be a function of the request path
+    and body.
+    Request bodies are recorded after undoing chunked transfer and gzip or deflate content encodings,
+    the request headers are recorded in the same order in headers and the accepted connections in connections.  With compress, responses are gzipped
+    for clients that accept it.
+    """
+
+    def __init__(self, routes, compress=False):
+        from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+        requests = self.requests = []
+        request_headers = self.headers = []
+        connections = self.connections = []
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = 'HTTP/1.1'
+            disable_nagle_algorithm = True
+
+            def log_message(self, *args):
+                pass
+
+            def read_body(self):
+                if self.headers.get('Transfer-Encoding') == 'chunked':
+                    chunks = []
+                    while True:
+                        size = int(self.rfile.readline().split(b';')[0], 16)
+                        chunks.append(self.rfile.read(size))
+                        self.rfile.readline()
+                        if size == 0:
+                            break
+                    body = b''.join(chunks)
+                else:
+                    body = self.rfile.read(int(self.headers.get('Content-Length', 0)))
+                encoding = self.headers.get('Content-Encoding')
+                if encoding in ('gzip', 'deflate'):
+                    body = zlib.decompress(body, 31 if encoding == 'gzip' else 15)
+                return body
+
+            def setup(self):
+                super().setup()
+                connections.append(self.client_address)
+
+            def respond(self):
+                # requests sent to a proxy carry the absolute url
+                path = urlsplit(self.path).path
+                request_headers.append(self.headers)
+                requests.append((self.command, self.path, self.read_body()))
+                route = routes.get((self.command, path), (404, {'code': 404, 'message': 'not found'}))
+                if callable(route):
+                    route = route(self.path, requests[-1][2])
+                code, body = route
+                if callable(body):
+                    body = body(self.path, requests[-1][2])
+                payload = json.dumps(body).encode()
+                self.send_response(code)
+                if compress and 'gzip' in self.headers.get('Accept-Encoding', ''):
+                    payload = zlib.compress(payload, wbits=31)
+                    self.send_header('Content-Encoding', 'gzip')
+                self.send_header('Content-Type', 'application/json')
+                self.send_header('Content-Length', str(len(payload)))
+                self.end_headers()
+                self.wfile.write(payload)
+
+            do_GET = do_POST = do_DELETE = respond
+
+        self.httpd = ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+        self.httpd.daemon_threads = True
+        self.server = 'http://127.0.0.1:{}'.format(self.httpd.server_address[1])
+        threading.Thread(target=self.httpd.serve_forever, daemon=True).start()
+
+    def profile(self):
+        return LicenseProfile(server=self.server, api_key='my-key', api_tenant='my-tenant')
+
+    def stop(self):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+
+def multipart_payload(body):
+    """Return the content of the single file part of a multipart/form-data body"""
+    start = body.index(b'\r\n\r\n') + 4
+    end = body.rindex(b'\r\n--', 0, len(body) - 2)
+    return body[start:end]
+
+
 def clean_nano_instances(nano=None):
     # clean out nano instances
     if nano is None:
@@ -50,7 +146,10 @@ class Test1ProfileManagement:
         'BOON_LICENSE_ID': None,
         'BOON_SSL_CERT': None,
         'BOON_SSL_VERIFY': None,
-        'BOON_TIMEOUT': None
+        'BOON_TIMEOUT': None,
+        'BOON_POOL_SIZE': None,
+        'BOON_JSON_CODEC': None,
+        'BOON_COMPRESSION': None
     }
 
     @staticmethod
@@ -835,3 +934,2210 @@ class Test6Rest:
         with pytest.raises(BoonException) as e:
             nano.get_version()
         assert e.value.message == 'server does not exist'
+
+
+class Test7ConnectionPool:
+
+    @staticmethod
+    def setup_method(self):
+        Test1ProfileManagement.clear_environment()
+
+    @staticmethod
+    def teardown_method(self):
+        Test1ProfileManagement.restore_environment()
+
+    def test_01_pool_settings(self):
+        profile = LicenseProfile(server='http://imtheexpertconsole.boonlogic.com', api_key="my-key",
+                                 api_tenant="my-tenant")
+
+        # defaults
+        nano = bn.ExpertClient(profile=profile)
+        assert nano.pool_size == 10
+        assert nano.keep_alive is True
+
+        # set through environment
+        os.environ['BOON_POOL_SIZE'] = "25"
+        nano = bn.ExpertClient(profile=profile)
+        assert nano.pool_size == 25
+
+        # explicit argument overrides the environment
+        nano = bn.ExpertClient(profile=profile, pool_size=4, keep_alive=False)
+        assert nano.pool_size == 4
+        assert nano.keep_alive is False
+
+        # passed through the alternate constructors
+        nano = bn.ExpertClient.from_license_file(license_file="./.BoonLogic.license", pool_size=3)
+        assert nano.pool_size == 3
+        nano = bn.ExpertClient.from_dict(profile_dict={"server": "http://localhost:5007", "api-key": "my-key",
+                                                       "api-tenant": "my-tenant"}, pool_size=5)
+        assert nano.pool_size == 5
+
+        with pytest.raises(BoonException) as e:
+            bn.ExpertClient(profile=profile, pool_size=0)
+        assert e.value.message == 'pool_size must be at least 1'
+
+    def test_02_session_lifecycle(self):
+        profile = LicenseProfile(server='http://imtheexpertconsole.boonlogic.com', api_key="my-key",
+                                 api_tenant="my-tenant")
+        os.environ['BOON_SSL_VERIFY'] = "false"
+        nano = bn.ExpertClient(profile=profile, pool_size=4, keep_alive=False)
+
+        # the session is created on first use and reused afterwards
+        session = nano._get_session()
+        assert session is nano._get_session()
+        assert session.verify is False
+        assert session.headers['Connection'] == 'close'
+        assert session.get_adapter(nano.url)._pool_maxsize == 4
+
+        # close releases the pool, a new one is created on demand
+        nano.close()
+        assert nano._session is None
+        nano.close()
+        assert nano._get_session() is not session
+
+        # context manager closes the pool on exit
+        with bn.ExpertClient(profile=profile) as nano:
+            nano._get_session()
+        assert nano._session is None
+
+
+class Test8AsyncClient:
+
+    @staticmethod
+    def setup_method(self):
+        Test1ProfileManagement.clear_environment()
+
+    @staticmethod
+    def teardown_method(self):
+        Test1ProfileManagement.restore_environment()
+
+    def test_01_async_calls(self):
+        routes = {
+            ('GET', '/expert/version'): (200, {'expert-api': 'abc', 'release': 'dev'}),
+            ('POST', '/expert/v3/nanoInstance/async-1'): (200, {'instanceID': 'async-1'}),
+            ('GET', '/expert/v3/nanoInstance/missing'): (
+                400, {'code': 400, 'message': 'Nano instance identifier missing is not an allocated instance.'}),
+        }
+        server = LocalServer(routes)
+
+        async def run():
+            async with bn.AsyncExpertClient(profile=server.profile(), pool_size=4) as nano:
+                response = await nano.get_version()
+                assert response['expert-api'] == 'abc'
+
+                response = await nano.open_nano('async-1')
+                assert response['instanceID'] == 'async-1'
+
+                # many concurrent requests share the bounded pool
+                responses = await asyncio.gather(*[nano.get_version() for _ in range(50)])
+                assert all(r['release'] == 'dev' for r in responses)
+                assert nano._session.connector.limit == 4
+
+                with pytest.raises(BoonException) as e:
+                    await nano.get_nano_instance('missing')
+                assert e.value.status_code == 400
+                assert e.value.message == 'Nano instance identifier missing is not an allocated instance.'
+
+                # instance has not been configured by this client
+                with pytest.raises(BoonException) as e:
+                    await nano.get_buffer_status('async-1')
+                assert e.value.message == 'nano instance is not configured'
+
+            assert nano._session is None
+
+        try:
+            asyncio.run(run())
+        finally:
+            server.stop()
+
+    def test_02_async_negative(self):
+        async def run():
+            nano = bn.AsyncExpertClient(
+                profile=LicenseProfile(server='http://localhost-bad:5007', api_key='my-key', api_tenant='my-tenant'))
+            try:
+                with pytest.raises(BoonException) as e:
+                    await nano.get_version()
+                assert e.value.message == 'server does not exist'
+            finally:
+                await nano.close()
+
+        asyncio.run(run())
+
+        # shares create_config with ExpertClient
+        nano = bn.AsyncExpertClient(
+            profile=LicenseProfile(server='http://localhost:5007', api_key='my-key', api_tenant='my-tenant'))
+        config = nano.create_config(feature_count=4, numeric_format='int16', min_val=-1, max_val=1)
+        assert config['numericFormat'] == 'int16'
+        assert len(config['features']) == 4
+
+        # methods only ExpertClient has are refused by async handles
+        handle = nano._nano('async-1')
+        for method in [handle.stream, handle.run_pipeline, handle.migrate_nano]:
+            with pytest.raises(BoonException) as e:
+                method([])
+            assert e.value.message == '{} is not available on AsyncExpertClient handles'.format(method.__name__)
+
+
+class Test9NanoHandle:
+
+    @staticmethod
+    def setup_method(self):
+        Test1ProfileManagement.clear_environment()
+
+    @staticmethod
+    def teardown_method(self):
+        Test1ProfileManagement.restore_environment()
+
+    def test_01_handles(self):
+        float_config = {'numericFormat': 'float32', 'features': [{'minVal': 0, 'maxVal': 1, 'weight': 1}] * 4}
+        int_config = {'numericFormat': 'int16', 'features': [{'minVal': 0, 'maxVal': 1, 'weight': 1}] * 2}
+        routes = {
+            ('POST', '/expert/v3/nanoInstance/nano-a'): (200, {'instanceID': 'nano-a'}),
+            ('POST', '/expert/v3/nanoInstance/nano-b'): (200, {'instanceID': 'nano-b'}),
+            ('GET', '/expert/v3/nanoInstance/nano-a'): (200, {'instanceID': 'nano-a'}),
+            ('POST', '/expert/v3/clusterConfig/nano-a'): (200, float_config),
+            ('POST', '/expert/v3/clusterConfig/nano-b'): (200, int_config),
+            ('POST', '/expert/v3/data/nano-a'): (200, {}),
+            ('POST', '/expert/v3/data/nano-b'): (200, {}),
+            ('DELETE', '/expert/v3/nanoInstance/nano-b'): (200, {}),
+        }
+        server = LocalServer(routes)
+        try:
+            nano = bn.ExpertClient(profile=server.profile())
+
+            # open_nano returns a handle that is also the instance metadata
+            nano_a = nano.open_nano('nano-a')
+            nano_b = nano.open_nano('nano-b')
+            assert isinstance(nano_a, bn.NanoHandle)
+            assert nano_a['instanceID'] == 'nano-a'
+            assert nano_a == nano.get_nano_instance('nano-a')
+            assert nano.open_nano('nano-a') is nano_a
+            assert nano_a.urls['data'] == server.server + '/expert/v3/data/nano-a?api-tenant=my-tenant'
+
+            # each instance keeps its own numeric format and feature count
+            nano_a.configure_nano(config=float_config)
+            nano.configure_nano('nano-b', config=int_config)
+            assert (nano_a.numeric_format, nano_a.feature_count) == ('float32', 4)
+            assert (nano_b.numeric_format, nano_b.feature_count) == ('int16', 2)
+
+            nano_a.load_data([1, 2, 3, 4])
+            nano.load_data('nano-b', [1, 2])
+            assert np.array([1, 2, 3, 4], dtype=np.float32).tobytes() in server.requests[-2][2]
+            assert np.array([1, 2], dtype=np.int16).tobytes() in server.requests[-1][2]
+
+            # closing forgets the handle
+            nano_b.close()
+            assert 'nano-b' not in nano._nanos
+        finally:
+            server.stop()
+
+    def test_02_handles_negative(self):
+        nano = bn.ExpertClient(
+            profile=LicenseProfile(server='http://localhost:5007', api_key='my-key', api_tenant='my-tenant'))
+        nano_a = nano._nano('nano-a')
+        with pytest.raises(BoonException) as e:
+            nano_a.load_data([1, 2, 3])
+        assert e.value.message == 'nano instance is not configured'
+        with pytest.raises(BoonException) as e:
+            nano.load_data(instance_id='nano-a', data=[1, 2, 3])
+        assert e.value.message == 'nano instance is not configured'
+
+    def test_03_formats_per_instance(self):
+        expert = bn.FakeExpert()
+        profile = LicenseProfile(server='http://localhost:5007', api_key='my-key', api_tenant='my-tenant')
+        nano = bn.ExpertClient(profile=profile, transport=bn.FakeTransport(expert))
+        other = bn.ExpertClient(profile=profile, transport=bn.FakeTransport(expert))
+        int_config = {'numericFormat': 'int16', 'streamingWindowSize': 1,
+                      'features': [{'minVal': 0, 'maxVal': 10, 'weight': 1}] * 2}
+        float_config = dict(int_config, numericFormat='float32')
+        nano.open_nano('a').configure_nano(config=int_config)
+        other.open_nano('b').configure_nano(config=float_config)
+
+        # an instance configured elsewhere does not take the format of another instance
+        handle_b = nano.open_nano('b')
+        assert handle_b.numeric_format is None
+        with pytest.raises(BoonException) as e:
+            handle_b.load_data([[1.5, 2.5], [3.5, 4.5]])
+        assert e.value.message == 'nano instance is not configured'
+
+        # fetching the config records its format on the handle
+        handle_b.get_config()
+        assert (handle_b.numeric_format, handle_b.feature_count) == ('float32', 2)
+        handle_b.load_data([[1.5, 2.5], [3.5, 4.5]])
+        nano.load_data('a', [[1, 2], [3, 4]])
+        assert expert.instances['b'].buffer[0].tolist() == [[1.5, 2.5], [3.5, 4.5]]
+        assert expert.instances['a'].buffer[0].tolist() == [[1, 2], [3, 4]]
+        assert nano._nano('a').numeric_format == 'int16'
+
+    def test_04_async_adopt(self):
+        with bn.ExpertEmulator() as emulator:
+            profile = emulator.license_profile()
+            other = bn.ExpertClient(profile=profile, transport=bn.FakeTransport(emulator.expert))
+            other.open_nano('b').configure_nano(feature_count=2, numeric_format='float32')
+
+            async def run():
+                async with bn.AsyncExpertClient(profile=profile) as nano:
+                    handle = await nano.open_nano('b')
+                    assert handle.numeric_format is None
+                    with pytest.raises(BoonException) as e:
+                        await handle.load_data([[0.25, 0.5], [0.75, 1.0]])
+                    assert e.value.message == 'nano instance is not configured'
+
+                    # fetching the config adopts the instance
+                    await handle.get_config()
+                    assert (handle.numeric_format, handle.feature_count) == ('float32', 2)
+                    await handle.load_data([[0.25, 0.5], [0.75, 1.0]])
+                    await handle.run_nano()
+                    return await handle.get_nano_status(results='totalInferences')
+
+            status = asyncio.run(run())
+        assert status['totalInferences'] == 2
+
+
+class Test10NormalizeData:
+
+    def test_01_zero_copy(self):
+        # arrays of the right type are passed through without copying
+        data = np.arange(60, dtype=np.float32).reshape(3, 20)
+        blob = normalize_nano_data(data, 'float32')
+        assert isinstance(blob, memoryview)
+        assert np.shares_memory(np.frombuffer(blob, dtype=np.float32), data)
+        assert bytes(blob) == data.tobytes()
+
+        # anything else is converted with a single copy
+        for values, numeric_format, dtype in [
+                (data.astype(np.float64), 'float32', np.float32),
+                (data.T, 'float32', np.float32),
+                ([str(v) for v in range(20)], 'float32', np.float32),
+                (list(range(-10, 10)), 'int16', np.int16),
+                (np.arange(20, dtype=np.int64), 'uint16', np.uint16)]:
+            blob = normalize_nano_data(values, numeric_format)
+            assert bytes(blob) == np.asarray(values).astype(dtype).tobytes()
+
+    def test_02_scratch_buffer(self):
+        scratch = ScratchBuffer()
+        data = np.arange(200, dtype=np.float64)
+        blob = normalize_nano_data(data, 'float32', scratch)
+        assert bytes(blob) == data.astype(np.float32).tobytes()
+        buffer = scratch._buffer
+        del blob
+
+        # smaller conversions reuse the buffer, larger ones grow it
+        blob = normalize_nano_data(data[:100], 'float32', scratch)
+        assert scratch._buffer is buffer
+        assert bytes(blob) == data[:100].astype(np.float32).tobytes()
+        blob = normalize_nano_data(np.arange(400), 'int16', scratch)
+        assert len(scratch._buffer) == 800
+        assert bytes(blob) == np.arange(400, dtype=np.int16).tobytes()
+
+
+class Test11StreamingUpload:
+
+    @staticmethod
+    def setup_method(self):
+        Test1ProfileManagement.clear_environment()
+
+    @staticmethod
+    def teardown_method(self):
+        Test1ProfileManagement.restore_environment()
+
+    def test_01_multipart_encoder(self):
+        class CountingFile:
+            def __init__(self, data):
+                self.data, self.offset, self.max_read = data, 0, 0
+
+            def read(self, size):
+                self.max_read = max(self.max_read, size)
+                chunk = self.data[self.offset:self.offset + size]
+                self.offset += len(chunk)
+                return chunk
+
+        content = os.urandom(300000)
+        source = CountingFile(content)
+        progress = []
+        body = MultipartEncoder('data', 'Data.csv', source, length=len(content), chunk_size=4096,
+                                progress=lambda sent, total: progress.append((sent, total)))
+        encoded = b''.join(bytes(chunk) for chunk in body)
+        boundary = body.content_type.split('boundary=')[1]
+
+        assert len(encoded) == body.len == body.bytes_read
+        assert encoded.startswith(('--' + boundary + '\r\n').encode())
+        assert encoded.endswith(('\r\n--' + boundary + '--\r\n').encode())
+        assert content in encoded
+        assert source.max_read == 4096
+        assert progress[-1] == (body.len, body.len)
+
+        # buffers are sliced without copying, iterables are passed through
+        blob = normalize_nano_data(np.zeros(10, np.float32), 'float32')
+        body = MultipartEncoder('data', 'x.bin', blob)
+        assert body.len == len(b''.join(bytes(chunk) for chunk in body))
+        body = MultipartEncoder('data', 'x.bin', iter([b'ab', b'cd']))
+        assert body.len is None
+        assert b'abcd' in b''.join(bytes(chunk) for chunk in body)
+
+        # the length counts bytes, and the filename cannot break out of its header
+        body = MultipartEncoder('data', 'donn\u00e9es.csv', b'1,2\n')
+        encoded = b''.join(bytes(chunk) for chunk in body)
+        assert body.len == len(encoded)
+        assert 'filename="donn\u00e9es.csv"'.encode() in encoded
+        body = MultipartEncoder('data', 'a"b\r\nX-Injected: 1.csv', b'1,2\n')
+        encoded = b''.join(bytes(chunk) for chunk in body)
+        assert body.len == len(encoded)
+        assert b'filename="a%22b%0D%0AX-Injected: 1.csv"\r\n' in encoded
+
+    def test_02_load_file(self):
+        routes = {
+            ('POST', '/expert/v3/nanoInstance/stream'): (200, {'instanceID': 'stream'}),
+            ('POST', '/expert/v3/data/stream'): (200, {}),
+        }
+        server = LocalServer(routes)
+        try:
+            nano = bn.ExpertClient(profile=server.profile())
+            handle = nano.open_nano('stream')
+            handle.numeric_format = 'float32'
+
+            progress = []
+            stats = handle.load_file('Data.csv', file_type='csv',
+                                     progress=lambda sent, total: progress.append(sent))
+            method, path, body = server.requests[-1]
+            with open('Data.csv', 'rb') as fp:
+                assert fp.read() in body
+            assert 'fileType=csv&appendData=false&gzip=false' in path
+            assert stats['bytes'] == len(body) == progress[-1]
+            assert stats['bytes_per_sec'] > 0
+
+            with pytest.raises(BoonException) as e:
+                handle.load_file('BadData.csv', file_type='csv')
+            assert e.value.message == 'No such file or directory'
+        finally:
+            server.stop()
+
+
+class Test12ChunkedLoad:
+
+    @staticmethod
+    def setup_method(self):
+        Test1ProfileManagement.clear_environment()
+
+    @staticmethod
+    def teardown_method(self):
+        Test1ProfileManagement.restore_environment()
+
+    def test_01_chunked_load_data(self):
+        config = {'numericFormat': 'float32', 'features': [{'minVal': 0, 'maxVal': 1, 'weight': 1}] * 20}
+        routes = {
+            ('POST', '/expert/v3/nanoInstance/chunked'): (200, {'instanceID': 'chunked'}),
+            ('POST', '/expert/v3/clusterConfig/chunked'): (200, config),
+            ('POST', '/expert/v3/data/chunked'): (200, {}),
+        }
+        server = LocalServer(routes)
+        try:
+            nano = bn.ExpertClient(profile=server.profile())
+            handle = nano.open_nano('chunked')
+            handle.configure_nano(config=config)
+            data = np.random.rand(1000, 20).astype(np.float32)
+
+            # single request
+            stats = handle.load_data(data)
+            assert stats['chunks'] == 1
+            assert multipart_payload(server.requests[-1][2]) == data.tobytes()
+
+            # 1000 patterns of 80 bytes in chunks of 12 patterns (1000 bytes)
+            for max_in_flight in [1, 3]:
+                del server.requests[:]
+                stats = handle.load_data(data.reshape(-1).tolist(), append_data=False, chunk_size=1000,
+                                         max_in_flight=max_in_flight)
+                assert stats['chunks'] == len(server.requests) == 84
+                assert 'appendData=false' in server.requests[0][1]
+                assert all('appendData=true' in path for _, path, _ in server.requests[1:])
+                uploaded = b''.join(multipart_payload(body) for _, _, body in server.requests)
+                assert uploaded == data.tobytes()
+                assert stats['bytes'] == sum(len(body) for _, _, body in server.requests)
+
+            # the caller's append_data is honored by the first chunk
+            del server.requests[:]
+            handle.load_data(data, append_data=True, chunk_size=40000)
+            assert all('appendData=true' in path for _, path, _ in server.requests)
+
+            # async client
+            async def run():
+                async with bn.AsyncExpertClient(profile=server.profile()) as async_nano:
+                    async_handle = await async_nano.open_nano('chunked')
+                    await async_handle.configure_nano(config=config)
+                    return await async_handle.load_data(data, chunk_size=8000, max_in_flight=2)
+
+            del server.requests[:]
+            stats = asyncio.run(run())
+            assert stats['chunks'] == 10
+            assert b''.join(multipart_payload(body) for _, path, body in server.requests
+                            if '/data/' in path) == data.tobytes()
+        finally:
+            server.stop()
+
+    def test_02_chunked_load_data_negative(self):
+        nano = bn.ExpertClient(
+            profile=LicenseProfile(server='http://localhost:5007', api_key='my-key', api_tenant='my-tenant'))
+        handle = nano._nano('chunked')
+        handle.numeric_format = 'float32'
+        with pytest.raises(BoonException) as e:
+            handle.load_data(list(range(10)), chunk_size=100)
+        assert e.value.message == 'feature count is unknown, configure the nano or pass 2D data'
+
+        handle.feature_count = 3
+        with pytest.raises(BoonException) as e:
+            handle.load_data(list(range(10)), chunk_size=100)
+        assert e.value.message == 'data length must be a multiple of the feature count'
+
+        with pytest.raises(BoonException) as e:
+            handle.load_data(list(range(9)), chunk_size=100, max_in_flight=0)
+        assert e.value.message == 'max_in_flight must be at least 1'
+
+
+def streaming_results(path, body):
+    """nanoRunStreaming stand-in: one ID per float32 pattern of 4 features, counting the values"""
+    values = np.frombuffer(multipart_payload(body), dtype=np.float32).reshape(-1, 4)
+    return {'ID': [int(row[0]) for row in values], 'SI': [float(row.sum()) for row in values]}
+
+
+class Test13MicroBatching:
+
+    @staticmethod
+    def setup_method(self):
+        Test1ProfileManagement.clear_environment()
+
+    @staticmethod
+    def teardown_method(self):
+        Test1ProfileManagement.restore_environment()
+
+    def test_01_stream(self):
+        routes = {
+            ('POST', '/expert/v3/nanoRunStreaming/batched'): (200, streaming_results),
+        }
+        server = LocalServer(routes)
+        try:
+            nano = bn.ExpertClient(profile=server.profile())
+            handle = nano._nano('batched')
+            handle.numeric_format = 'float32'
+
+            # batches are cut by size, results come back per row in order
+            rows = [[i, 1, 1, 1] for i in range(25)]
+            results = list(handle.stream(iter(rows), results='ID,SI', max_batch_rows=10, max_delay_ms=1000))
+            assert [r['ID'] for r in results] == list(range(25))
+            assert results[3] == {'ID': 3, 'SI': 6.0}
+            assert len(server.requests) == 3
+            assert 'results=ID,SI' in server.requests[0][1]
+
+            # a slow source is cut by the delay
+            def slow_rows():
+                for i in range(6):
+                    time.sleep(0.05)
+                    yield [i, 0, 0, 0]
+
+            del server.requests[:]
+            results = list(nano.stream('batched', slow_rows(), max_batch_rows=100, max_delay_ms=10))
+            assert [r['ID'] for r in results] == list(range(6))
+            assert len(server.requests) >= 3
+        finally:
+            server.stop()
+
+    def test_02_stream_negative(self):
+        nano = bn.ExpertClient(
+            profile=LicenseProfile(server='http://localhost:5007', api_key='my-key', api_tenant='my-tenant'))
+        with pytest.raises(BoonException) as e:
+            nano.stream('batched', [])
+        assert e.value.message == 'nano instance is not configured'
+
+        nano._nano('batched').numeric_format = 'float32'
+        with pytest.raises(BoonException) as e:
+            nano.stream('batched', [], max_batch_rows=0)
+        assert e.value.message == 'max_batch_rows must be at least 1'
+
+        # errors from the source are raised to the consumer
+        def broken_rows():
+            yield [1, 2, 3, 4]
+            raise ValueError('broken source')
+
+        with pytest.raises(ValueError):
+            list(bn.expert_client.micro_batches(broken_rows(), 10, 1.0))
+
+
+class Test14Pipeline:
+
+    @staticmethod
+    def setup_method(self):
+        Test1ProfileManagement.clear_environment()
+
+    @staticmethod
+    def teardown_method(self):
+        Test1ProfileManagement.restore_environment()
+
+    def test_01_run_pipeline(self):
+        routes = {
+            ('POST', '/expert/v3/nanoRunStreaming/piped'): (200, streaming_results),
+        }
+        server = LocalServer(routes)
+        try:
+            nano = bn.ExpertClient(profile=server.profile())
+            handle = nano._nano('piped')
+            handle.numeric_format = 'float32'
+
+            batches = [np.full((3, 4), i, dtype=np.float64) for i in range(8)]
+            results = list(handle.run_pipeline(iter(batches), results='ID'))
+            assert [r['ID'] for r in results] == [[i] * 3 for i in range(8)]
+            assert results[2] == handle.run_streaming_nano(batches[2], results='ID')
+            assert 'results=ID' in server.requests[0][1]
+        finally:
+            server.stop()
+
+    def test_02_run_pipeline_negative(self):
+        routes = {
+            ('POST', '/expert/v3/nanoRunStreaming/piped'): (400, {'code': 400, 'message': 'bad data'}),
+        }
+        server = LocalServer(routes)
+        try:
+            nano = bn.ExpertClient(profile=server.profile())
+            with pytest.raises(BoonException) as e:
+                nano.run_pipeline('piped', [])
+            assert e.value.message == 'nano instance is not configured'
+
+            nano._nano('piped').numeric_format = 'float32'
+            with pytest.raises(BoonException) as e:
+                nano.run_pipeline('piped', [], depth=0)
+            assert e.value.message == 'depth must be at least 1'
+
+            # server errors reach the consumer
+            with pytest.raises(BoonException) as e:
+                list(nano.run_pipeline('piped', [[1, 2, 3, 4]]))
+            assert e.value.message == 'bad data'
+        finally:
+            server.stop()
+
+    def test_03_stage_overlap(self):
+        def slow(item):
+            time.sleep(0.02)
+            return item
+
+        start = time.perf_counter()
+        results = list(bn.expert_client.pipeline(range(10), [slow, slow, slow], depth=2))
+        elapsed = time.perf_counter() - start
+        assert results == list(range(10))
+        # serial execution would take 0.6 seconds
+        assert elapsed < 0.45
+
+        def broken(item):
+            if item == 3:
+                raise ValueError('broken stage')
+            return item
+
+        with pytest.raises(ValueError):
+            list(bn.expert_client.pipeline(range(10), [slow, broken], depth=2))
+
+
+class Test15ResultFormats:
+
+    @staticmethod
+    def setup_method(self):
+        Test1ProfileManagement.clear_environment()
+
+    @staticmethod
+    def teardown_method(self):
+        Test1ProfileManagement.restore_environment()
+
+    def test_01_results_format(self):
+        results = {'ID': [1, 2, 70000], 'SI': [0, 500, 1000], 'AD': [0, 0, 1], 'AW': [0, 1, 2], 'AM': [0.0, 0.25, 0.5]}
+        routes = {
+            ('GET', '/expert/v3/nanoResults/formats'): (200, results),
+            ('POST', '/expert/v3/nanoRun/formats'): (200, results),
+            ('POST', '/expert/v3/nanoRunStreaming/formats'): (200, streaming_results),
+        }
+        server = LocalServer(routes)
+        try:
+            nano = bn.ExpertClient(profile=server.profile())
+            handle = nano._nano('formats')
+            handle.numeric_format = 'float32'
+
+            assert handle.get_nano_results(results_format='dict') == results
+
+            response = handle.get_nano_results(results_format='numpy')
+            assert sorted(response.keys()) == sorted(results.keys())
+            assert response['ID'].dtype == np.int32
+            assert response['AD'].dtype == np.uint8
+            assert response['AW'].dtype == np.uint8
+            assert response['SI'].dtype == np.float32
+            assert response['ID'].tolist() == results['ID']
+            assert response['AM'].tolist() == results['AM']
+
+            response = handle.run_nano(results='All', results_format='structured')
+            assert response.shape == (3,)
+            assert response.dtype.names == tuple(results.keys())
+            assert response['ID'].tolist() == results['ID']
+            assert response[2]['AD'] == 1
+
+            response = handle.run_streaming_nano(np.ones((2, 4)), results='ID,SI', results_format='numpy')
+            assert response['ID'].dtype == np.int32
+            assert response['SI'].tolist() == [4.0, 4.0]
+
+            response = list(handle.run_pipeline([np.ones((2, 4))], results_format='structured'))
+            assert response[0]['SI'].tolist() == [4.0, 4.0]
+
+            assert bn.expert_client.decode_results({}, 'structured').shape == (0,)
+
+            with pytest.raises(BoonException) as e:
+                handle.get_nano_results(results_format='pandas')
+            assert e.value.message == 'results_format must be one of dict, numpy, structured'
+        finally:
+            server.stop()
+
+    def test_02_async_results_format(self):
+        results = {'ID': [3, 4], 'OM': [1, 2]}
+        routes = {
+            ('GET', '/expert/v3/nanoResults/formats'): (200, results),
+        }
+        server = LocalServer(routes)
+
+        async def run():
+            async with bn.AsyncExpertClient(profile=server.profile()) as nano:
+                nano._nano('formats').numeric_format = 'float32'
+                return await nano.get_nano_results('formats', results_format='numpy')
+
+        try:
+            response = asyncio.run(run())
+            assert response['ID'].dtype == np.int32
+            assert response['OM'].dtype == np.uint8
+            assert response['OM'].tolist() == [1, 2]
+        finally:
+            server.stop()
+
+
+class Test16JsonCodec:
+
+    @staticmethod
+    def setup_method(self):
+        Test1ProfileManagement.clear_environment()
+
+    @staticmethod
+    def teardown_method(self):
+        Test1ProfileManagement.restore_environment()
+
+    def test_01_codecs(self):
+        body = {'features': np.arange(3, dtype=np.int16), 'min': np.float32(0.5), 'max': np.int64(7),
+                'rows': np.ones((2, 2))[:, :1], 'name': 'config'}
+        expected = {'features': [0, 1, 2], 'min': 0.5, 'max': 7, 'rows': [[1.0], [1.0]], 'name': 'config'}
+
+        for name in bn.codec.CODEC_NAMES:
+            codec = bn.codec.get_codec(name)
+            if codec is None:
+                continue
+            assert codec.name == name
+            encoded = codec.dumps(body)
+            assert isinstance(encoded, bytes)
+            assert json.loads(encoded) == expected
+            assert codec.loads(encoded) == expected
+            with pytest.raises(ValueError):
+                codec.loads(b'\x1f\x8b not json')
+
+        assert bn.codec.get_codec('json').name == 'json'
+        assert bn.codec.get_codec('yaml') is None
+        assert bn.codec.get_codec().name == bn.codec.CODEC_NAMES[0] or bn.codec.get_codec('orjson') is None
+
+    def test_02_client_codec(self):
+        profile = LicenseProfile(server='http://localhost:5007', api_key='my-key', api_tenant='my-tenant')
+
+        os.environ['BOON_JSON_CODEC'] = 'json'
+        assert bn.ExpertClient(profile=profile).codec.name == 'json'
+        assert bn.ExpertClient(profile=profile, json_codec='json').codec.name == 'json'
+
+        os.environ['BOON_JSON_CODEC'] = 'yaml'
+        with pytest.raises(BoonException) as e:
+            bn.ExpertClient(profile=profile)
+        assert e.value.message == 'json codec "yaml" is not available'
+
+        # numpy values in a configuration are encoded by the codec
+        config = bn.ExpertClient(profile=profile, json_codec='json').create_config(
+            feature_count=2, numeric_format='float32', min_val=np.float32(-1), max_val=np.array([1, 2]),
+            weight=np.int64(1))
+        assert json.loads(bn.codec.get_codec('json').dumps(config))['features'][1] == \
+            {'minVal': -1.0, 'maxVal': 2, 'weight': 1}
+
+    def test_03_custom_codec(self):
+        class CountingCodec(bn.codec.JsonCodec):
+            name = 'counting'
+            parsed = 0
+
+            def loads(self, data):
+                CountingCodec.parsed += 1
+                return super().loads(data)
+
+        routes = {
+            ('GET', '/expert/v3/nanoResults/codec'): (200, {'ID': [1, 2]}),
+            ('POST', '/expert/v3/clusterConfig/codec'): (200, {'numericFormat': 'float32', 'features': []}),
+        }
+        server = LocalServer(routes)
+        try:
+            nano = bn.ExpertClient(profile=server.profile(), json_codec=CountingCodec())
+            handle = nano._nano('codec')
+            handle.numeric_format = 'float32'
+            assert handle.get_nano_results(results='ID') == {'ID': [1, 2]}
+            # the response is parsed once
+            assert CountingCodec.parsed == 1
+
+            config = nano.create_config(feature_count=2, numeric_format='float32', min_val=np.float64(0),
+                                        max_val=np.int32(10))
+            handle.configure_nano(config=config)
+            assert json.loads(server.requests[-1][2])['features'][0]['maxVal'] == 10
+        finally:
+            server.stop()
+
+
+class Test17Compression:
+
+    @staticmethod
+    def setup_method(self):
+        Test1ProfileManagement.clear_environment()
+
+    @staticmethod
+    def teardown_method(self):
+        Test1ProfileManagement.restore_environment()
+
+    def test_01_policy(self):
+        policy = bn.CompressionPolicy(min_size=100)
+        assert not policy.should_compress(99)
+        # nothing measured yet
+        assert policy.should_compress(100)
+        assert policy.should_compress(None)
+
+        headers, body = policy.compress({'x-token': 'key'}, b'1' * 1000)
+        assert headers == {'x-token': 'key', 'content-encoding': 'gzip'}
+        assert zlib.decompress(body, 31) == b'1' * 1000
+        stats = policy.stats
+        assert stats['bodies'] == 1 and stats['bytes'] == 1000
+        assert stats['compressed_bytes'] == len(body) and stats['ratio'] < 0.1
+
+        # a link faster than the compressor is not worth compressing for, a slow one is
+        policy.record_transfer(1000, 1e-9)
+        assert not policy.should_compress(1000)
+        assert bn.CompressionPolicy(min_size=100, bandwidth=1000).compress({}, b'1' * 1000)[0] == \
+            {'content-encoding': 'gzip'}
+
+        # streaming bodies are compressed as they are read
+        encoder = MultipartEncoder('data', 'data.bin', b'2' * 5000)
+        headers, body = bn.CompressionPolicy(algorithm='deflate', min_size=100).compress({}, encoder, upload=True)
+        assert headers == {'content-encoding': 'deflate'}
+        compressed = b''.join(body)
+        assert multipart_payload(zlib.decompress(compressed, 15)) == b'2' * 5000
+        assert body.bytes_read == encoder.len and body.bytes_out == len(compressed)
+
+        # uploads are left alone unless enabled
+        assert bn.CompressionPolicy(uploads=False).compress({}, encoder, upload=True)[1] is encoder
+        assert bn.CompressionPolicy(algorithm=None).compress({}, b'1' * 20000)[1] == b'1' * 20000
+        assert 'gzip' in bn.compression.available_algorithms()
+        with pytest.raises(ValueError):
+            bn.CompressionPolicy(algorithm='lzma')
+
+    def test_02_client_compression(self):
+        routes = {
+            ('POST', '/expert/v3/clusterConfig/squeeze'): (200, {'numericFormat': 'float32', 'features': []}),
+            ('POST', '/expert/v3/data/squeeze'): (200, {}),
+        }
+        server = LocalServer(routes)
+        data = np.tile(np.arange(4, dtype=np.float32), 5000)
+        try:
+            # by default only large json bodies are compressed
+            nano = bn.ExpertClient(profile=server.profile())
+            config = nano.create_config(feature_count=2000, numeric_format='float32')
+            nano.configure_nano('squeeze', config=config)
+            assert server.headers[-1]['Content-Encoding'] == 'gzip'
+            assert json.loads(server.requests[-1][2]) == config
+
+            stats = nano.load_data('squeeze', data)
+            assert 'Content-Encoding' not in server.headers[-1]
+            assert 'compressed_bytes' not in stats
+
+            os.environ['BOON_COMPRESSION'] = 'gzip:1'
+            nano = bn.ExpertClient(profile=server.profile())
+            nano._nano('squeeze').numeric_format = 'float32'
+            stats = nano.load_data('squeeze', data)
+            assert server.headers[-1]['Content-Encoding'] == 'gzip'
+            assert multipart_payload(server.requests[-1][2]) == data.tobytes()
+            assert stats['compression_ratio'] < 0.5
+            assert stats['compressed_bytes'] < stats['bytes']
+
+            # the bandwidth is measured on requests sending at least min_size bytes
+            del server.requests[:]
+            noise = np.random.default_rng(7).random((5000, 4), dtype=np.float32)
+            stats = nano.load_data('squeeze', noise, chunk_size=20000)
+            assert stats['chunks'] == 4
+            assert b''.join(multipart_payload(r[2]) for r in server.requests) == noise.tobytes()
+            assert nano.compression.stats['bandwidth'] is not None
+
+            os.environ['BOON_COMPRESSION'] = 'none'
+            nano = bn.ExpertClient(profile=server.profile())
+            nano.configure_nano('squeeze', config=config)
+            assert 'Content-Encoding' not in server.headers[-1]
+
+            os.environ['BOON_COMPRESSION'] = 'lzma'
+            with pytest.raises(BoonException) as e:
+                bn.ExpertClient(profile=server.profile())
+            assert e.value.message == 'compression "lzma" is not available'
+        finally:
+            server.stop()
+
+    def test_03_async_compression(self):
+        routes = {
+            ('POST', '/expert/v3/data/squeeze'): (200, {}),
+        }
+        server = LocalServer(routes)
+        data = np.zeros((1000, 4), dtype=np.float32)
+
+        async def run():
+            compression = bn.CompressionPolicy()
+            async with bn.AsyncExpertClient(profile=server.profile(), compression=compression) as nano:
+                nano._nano('squeeze').numeric_format = 'float32'
+                return await nano.load_data('squeeze', data)
+
+        try:
+            stats = asyncio.run(run())
+            assert server.headers[-1]['Content-Encoding'] == 'gzip'
+            assert multipart_payload(server.requests[-1][2]) == data.tobytes()
+            assert stats['compressed_bytes'] < stats['bytes']
+        finally:
+            server.stop()
+
+    def test_04_bandwidth_excludes_server_time(self):
+        class SlowServerTransport(bn.FakeTransport):
+            """FakeTransport taking 0.3 s to answer once it has the whole request"""
+
+            def request(self, method, url, headers, body=None, fields=None, timeout=None):
+                response = super().request(method, url, headers, body, fields, timeout)
+                time.sleep(0.3)
+                return response
+
+        profile = LicenseProfile(server='http://expert.invalid', api_key='my-key', api_tenant='my-tenant')
+        compression = bn.CompressionPolicy(algorithm=None)
+        nano = bn.ExpertClient(profile=profile, transport=SlowServerTransport(), compression=compression)
+        # json bodies are sent in one piece, their sending cannot be timed apart from the server
+        nano.open_nano('slow').configure_nano(feature_count=2000, numeric_format='float32')
+        assert compression.stats['bandwidth'] is None
+
+        data = np.random.default_rng(0).random((100, 2000), dtype=np.float32)
+        nano.load_data('slow', data)
+        # the in-process upload takes a few milliseconds, the 0.3 s answer is not counted
+        assert compression.stats['bandwidth'] > 10 * data.nbytes / 0.3
+
+
+class Test18ResponseCompression:
+
+    @staticmethod
+    def setup_method(self):
+        Test1ProfileManagement.clear_environment()
+
+    @staticmethod
+    def teardown_method(self):
+        Test1ProfileManagement.restore_environment()
+
+    def test_01_compressed_responses(self):
+        results = {'ID': list(range(50000)), 'SI': [0.5] * 50000}
+        routes = {
+            ('GET', '/expert/v3/nanoResults/gzipped'): (200, results),
+            ('POST', '/expert/v3/nanoRun/gzipped'): (400, {'code': 400, 'message': 'There is no data to cluster'}),
+        }
+        server = LocalServer(routes, compress=True)
+        try:
+            nano = bn.ExpertClient(profile=server.profile())
+            handle = nano._nano('gzipped')
+            handle.numeric_format = 'float32'
+            assert handle.get_nano_results(results='ID,SI') == results
+            assert 'gzip' in server.headers[-1]['Accept-Encoding']
+
+            response = handle.get_nano_results(results_format='numpy')
+            assert response['ID'][-1] == 49999
+
+            # errors are decoded from compressed bodies too
+            with pytest.raises(BoonException) as e:
+                handle.run_nano()
+            assert e.value.message == 'There is no data to cluster'
+
+            async def run():
+                async with bn.AsyncExpertClient(profile=server.profile()) as client:
+                    client._nano('gzipped').numeric_format = 'float32'
+                    return await client.get_nano_results('gzipped')
+
+            assert asyncio.run(run()) == results
+            assert 'gzip' in server.headers[-1]['Accept-Encoding']
+        finally:
+            server.stop()
+
+
+class Test19IncrementalResults:
+
+    @staticmethod
+    def setup_method(self):
+        Test1ProfileManagement.clear_environment()
+
+    @staticmethod
+    def teardown_method(self):
+        Test1ProfileManagement.restore_environment()
+
+    def test_01_parser(self):
+        results = {'ID': list(range(2000)), 'SI': [0.25, 1.5] * 50, 'AD': [], 'AM': [1e-3, 2.5e2]}
+        text = json.dumps(results, indent=1).encode()
+        for size in [1, 2, 5, 64, len(text)]:
+            parser = bn.results.ResultsParser()
+            for index in range(0, len(text), size):
+                parser.feed(text[index:index + size])
+            arrays = parser.close()
+            assert list(arrays.keys()) == list(results.keys())
+            assert arrays['ID'].dtype == np.int32 and arrays['ID'].tolist() == results['ID']
+            assert arrays['SI'].dtype == np.float32 and arrays['SI'].tolist() == results['SI']
+            assert arrays['AD'].dtype == np.uint8 and len(arrays['AD']) == 0
+            assert np.allclose(arrays['AM'], results['AM'])
+
+        for text in [b'[1, 2]', b'{"ID": [1, x]}', b'{"code": 200}', b'{"ID": [1, 2]']:
+            parser = bn.results.ResultsParser()
+            with pytest.raises(ValueError):
+                parser.feed(text)
+                parser.close()
+
+    def test_02_incremental_results(self):
+        results = {'ID': list(range(100000)), 'SI': [0.5] * 100000, 'OM': [1] * 100000}
+        routes = {
+            ('GET', '/expert/v3/nanoResults/big'): (200, results),
+            ('GET', '/expert/v3/nanoResults/broken'): (200, {'errorMessage': 'broken'}),
+        }
+        server = LocalServer(routes, compress=True)
+        try:
+            nano = bn.ExpertClient(profile=server.profile())
+            handle = nano._nano('big')
+            handle.numeric_format = 'float32'
+
+            response = handle.get_nano_results(results_format='numpy', incremental=True)
+            assert response['ID'].dtype == np.int32 and response['ID'].tolist() == results['ID']
+            assert response['OM'].dtype == np.uint8 and response['OM'].sum() == 100000
+
+            response = handle.get_nano_results(results_format='structured', incremental=True)
+            assert response.shape == (100000,) and response['SI'][7] == 0.5
+
+            nano._nano('broken').numeric_format = 'float32'
+            with pytest.raises(BoonException) as e:
+                nano.get_nano_results('broken', results_format='numpy', incremental=True)
+            assert e.value.status_code == 500 and 'malformed results response' in e.value.message
+
+            with pytest.raises(BoonException) as e:
+                handle.get_nano_results(incremental=True)
+            assert e.value.message == 'incremental parsing requires results_format "numpy" or "structured"'
+
+            async def run():
+                async with bn.AsyncExpertClient(profile=server.profile()) as client:
+                    client._nano('big').numeric_format = 'float32'
+                    return await client.get_nano_results('big', results_format='numpy', incremental=True)
+
+            response = asyncio.run(run())
+            assert response['ID'].tolist() == results['ID']
+        finally:
+            server.stop()
+
+
+class Test20RetryHedging:
+
+    @staticmethod
+    def setup_method(self):
+        Test1ProfileManagement.clear_environment()
+
+    @staticmethod
+    def teardown_method(self):
+        Test1ProfileManagement.restore_environment()
+
+    def test_01_policy(self):
+        histogram = bn.retry.LatencyHistogram()
+        assert histogram.quantile(0.95) is None
+        for _ in range(95):
+            histogram.record(0.01)
+        for _ in range(5):
+            histogram.record(1.0)
+        assert 0.01 <= histogram.quantile(0.5) < 0.0125
+        assert 0.01 <= histogram.quantile(0.95) < 0.0125
+        assert 1.0 <= histogram.quantile(0.99) < 1.25
+        assert histogram.stats['count'] == 100
+
+        policy = bn.RetryPolicy(backoff=0.1, max_backoff=0.3)
+        assert all(0 <= policy.delay(attempt) <= 0.1 * 2 ** attempt for attempt in range(2))
+        assert all(policy.delay(10) <= 0.3 for _ in range(20))
+        assert policy.hedge_delay(histogram) is None
+        assert bn.RetryPolicy(hedge=True, min_samples=200).hedge_delay(histogram) is None
+        assert bn.RetryPolicy(hedge=True).hedge_delay(histogram) == histogram.quantile(0.95)
+
+        assert bn.retry.endpoint_name('http://host/expert/v3/nanoResults/id?api-tenant=t') == 'nanoResults'
+        assert bn.retry.endpoint_name('http://host/expert/version?api-tenant=t') == 'version'
+
+    def test_02_retries(self):
+        attempts = []
+
+        def flaky(path, body):
+            attempts.append(path)
+            if len(attempts) % 3:
+                return 503, {'code': 503, 'message': 'busy'}
+            return 200, {'ID': [1]}
+
+        routes = {
+            ('GET', '/expert/v3/nanoResults/retry'): flaky,
+            ('POST', '/expert/v3/nanoRun/retry'): flaky,
+            ('GET', '/expert/v3/bufferStatus/retry'): (404, {'code': 404, 'message': 'not found'}),
+        }
+        server = LocalServer(routes)
+        try:
+            nano = bn.ExpertClient(profile=server.profile(), retry=bn.RetryPolicy(retries=2, backoff=0.01))
+            handle = nano._nano('retry')
+            handle.numeric_format = 'float32'
+
+            # idempotent requests are retried with backoff
+            assert handle.get_nano_results(results='ID') == {'ID': [1]}
+            assert len(attempts) == 3
+            assert nano.latency_stats()['GET nanoResults']['count'] == 1
+
+            # other requests and other errors are not
+            del attempts[:]
+            with pytest.raises(BoonException) as e:
+                handle.run_nano()
+            assert e.value.status_code == 503 and len(attempts) == 1
+            del server.requests[:]
+            with pytest.raises(BoonException) as e:
+                handle.get_buffer_status()
+            assert e.value.status_code == 404 and len(server.requests) == 1
+
+            async def run():
+                async with bn.AsyncExpertClient(profile=server.profile(),
+                                                retry=bn.RetryPolicy(retries=2, backoff=0.01)) as client:
+                    client._nano('retry').numeric_format = 'float32'
+                    return await client.get_nano_results('retry', results='ID')
+
+            del attempts[:]
+            assert asyncio.run(run()) == {'ID': [1]}
+            assert len(attempts) == 3
+        finally:
+            server.stop()
+
+        # refused connections are retried too
+        nano = bn.ExpertClient(profile=server.profile(), retry=bn.RetryPolicy(retries=1, backoff=0.01))
+        with pytest.raises(BoonException) as e:
+            nano.nano_list()
+        assert e.value.message == 'server does not exist'
+
+    def test_03_hedging(self):
+        calls = []
+
+        def slow_once(path, body):
+            calls.append(path)
+            if len(calls) == 6:
+                time.sleep(1.0)
+            return 200, {'numClusters': len(calls)}
+
+        routes = {
+            ('GET', '/expert/v3/nanoStatus/hedge'): slow_once,
+        }
+        server = LocalServer(routes)
+        try:
+            policy = bn.RetryPolicy(hedge=True, min_samples=5)
+            nano = bn.ExpertClient(profile=server.profile(), retry=policy)
+            handle = nano._nano('hedge')
+            handle.numeric_format = 'float32'
+            for _ in range(5):
+                handle.get_nano_status(results='numClusters')
+
+            # the sixth request stalls, its duplicate answers first
+            start = time.perf_counter()
+            assert handle.get_nano_status(results='numClusters') == {'numClusters': 7}
+            assert time.perf_counter() - start < 0.8
+            assert len(calls) == 7
+
+            async def run():
+                async with bn.AsyncExpertClient(profile=server.profile(), retry=policy) as client:
+                    client._nano('hedge').numeric_format = 'float32'
+                    client._latency = nano._latency
+                    del calls[:]
+                    for _ in range(5):
+                        await client.get_nano_status('hedge', results='numClusters')
+                    start = time.perf_counter()
+                    response = await client.get_nano_status('hedge', results='numClusters')
+                    return response, time.perf_counter() - start
+
+            response, elapsed = asyncio.run(run())
+            # fast requests may be hedged as well, the stalled one answers numClusters 6
+            assert response['numClusters'] > 6 and elapsed < 0.8
+            nano.close()
+        finally:
+            server.stop()
+
+
+class Test21Proxy:
+
+    @staticmethod
+    def setup_method(self):
+        Test1ProfileManagement.clear_environment()
+
+    @staticmethod
+    def teardown_method(self):
+        Test1ProfileManagement.restore_environment()
+
+    def test_01_proxy_server(self):
+        # the stand-in proxy answers for the expert server, which does not resolve
+        routes = {
+            ('GET', '/expert/version'): (200, {'version': 'proxied'}),
+        }
+        proxy = LocalServer(routes)
+        try:
+            profile = LicenseProfile(server='http://expert.invalid:5007', api_key='my-key', api_tenant='my-tenant',
+                                     proxy_server=proxy.server[len('http://'):])
+            os.environ['HTTP_PROXY'] = 'http://127.0.0.1:9'
+            nano = bn.ExpertClient(profile=profile)
+            for _ in range(5):
+                assert nano.get_version() == {'version': 'proxied'}
+            assert proxy.requests[0][1].startswith('http://expert.invalid:5007/expert/version?')
+            # one persistent connection to the proxy
+            assert len(proxy.connections) == 1
+            nano.close()
+
+            async def run():
+                async with bn.AsyncExpertClient(profile=profile) as client:
+                    return [await client.get_version() for _ in range(3)]
+
+            del proxy.connections[:]
+            assert asyncio.run(run()) == [{'version': 'proxied'}] * 3
+            assert len(proxy.connections) == 1
+        finally:
+            del os.environ['HTTP_PROXY']
+            proxy.stop()
+
+
+class Test22FakeTransport:
+
+    @staticmethod
+    def setup_method(self):
+        Test1ProfileManagement.clear_environment()
+
+    @staticmethod
+    def teardown_method(self):
+        Test1ProfileManagement.restore_environment()
+
+    def test_01_fake_workflow(self):
+        # the fake answers in-process, the server name is never resolved
+        transport = bn.FakeTransport()
+        profile = LicenseProfile(server='http://expert.invalid', api_key='my-key', api_tenant='my-tenant')
+        nano = bn.ExpertClient(profile=profile, transport=transport)
+
+        assert nano.open_nano('fake')['instanceID'] == 'fake'
+        config = nano.configure_nano('fake', feature_count=20, numeric_format='float32', min_val=-10, max_val=15)
+        assert nano.get_config('fake') == config
+
+        nano.load_file('fake', file='Data.csv', file_type='csv')
+        data = np.loadtxt('Data.csv', delimiter=',').reshape(-1, 20)
+        nano.load_data('fake', data=data[:100], chunk_size=2000)
+        assert nano.get_buffer_status('fake')['totalBytesInBuffer'] == 100 * 20 * 4
+
+        response = nano.run_nano('fake', results='All')
+        assert sorted(response.keys()) == sorted(nano.results) and len(response['ID']) == 100
+        assert nano.get_nano_results('fake', results='All') == response
+        arrays = nano.get_nano_results('fake', results='ID', results_format='numpy', incremental=True)
+        assert arrays['ID'].tolist() == response['ID']
+        with pytest.raises(BoonException) as e:
+            nano.run_nano('fake', results='ID')
+        assert e.value.message == 'There is no data to cluster'
+
+        # streaming results are deterministic, a second instance gives the same answers
+        expected = nano.run_streaming_nano('fake', data[100:], results='ID,RI')
+        nano.open_nano('copy')
+        nano.save_nano('fake', 'fake-snapshot')
+        nano.save_nano('fake', 'fake-snapshot-2')
+        with open('fake-snapshot', 'rb') as a, open('fake-snapshot-2', 'rb') as b:
+            assert a.read() == b.read()
+        assert nano.restore_nano('copy', 'fake-snapshot') == nano.get_config('fake')
+        status = nano.get_nano_status('fake', results='numClusters,totalInferences')
+        assert nano.get_nano_status('copy', results='numClusters,totalInferences') == status
+        assert status['totalInferences'] == len(data)
+        assert nano.run_streaming_nano('copy', data[100:], results='ID,RI')['ID'] == \
+            nano.run_streaming_nano('fake', data[100:], results='ID,RI')['ID']
+        assert len(expected['ID']) == len(data) - 100
+
+        assert nano.set_learning_enabled('fake', False) is False
+        assert len(nano.get_root_cause('fake', id_list=[1])[0]) == 20
+        assert nano.prune_ids('fake', id_list=[1])['numClustersRemaining'] == status['numClusters'] - 1
+        assert sorted(item['instanceID'] for item in nano.nano_list()) == ['copy', 'fake']
+
+        nano.close_nano('fake')
+        with pytest.raises(BoonException) as e:
+            nano.get_nano_instance('fake')
+        assert e.value.message == 'Nano instance identifier fake is not an allocated instance.'
+        assert transport.requests > 20
+        nano.close()
+        os.remove('fake-snapshot')
+        os.remove('fake-snapshot-2')
+
+    def test_02_fake_negative(self):
+        expert = bn.FakeExpert(api_key='my-key')
+        profile = LicenseProfile(server='http://expert.invalid', api_key='other-key', api_tenant='my-tenant')
+        nano = bn.ExpertClient(profile=profile, transport=bn.FakeTransport(expert))
+        with pytest.raises(BoonException) as e:
+            nano.open_nano('fake')
+        assert e.value.status_code == 401
+
+        profile.api_key = 'my-key'
+        nano = bn.ExpertClient(profile=profile, transport=bn.FakeTransport(expert))
+        handle = nano.open_nano('fake')
+        handle.numeric_format = 'float32'
+        with pytest.raises(BoonException) as e:
+            handle.load_data(np.zeros(20))
+        assert e.value.message == 'nano instance is not configured'
+
+        handle.configure_nano(feature_count=4, numeric_format='float32')
+        with pytest.raises(BoonException) as e:
+            handle.load_data(np.zeros(10))
+        assert e.value.message == 'data length is not a multiple of the pattern length'
+        config = nano.create_config(feature_count=4, numeric_format='int8')
+        with pytest.raises(BoonException) as e:
+            handle.configure_nano(config=config)
+        assert e.value.message == 'numericFormat must be one of int16, uint16, float32'
+
+    def test_03_fresh_snapshot(self, tmp_path):
+        from boonnano.fake_server import MAGIC_NUMBER
+
+        profile = LicenseProfile(server='http://expert.invalid', api_key='my-key', api_tenant='my-tenant')
+        nano = bn.ExpertClient(profile=profile, transport=bn.FakeTransport())
+        filename = str(tmp_path / 'fresh.tgz')
+        # configured, but without any clusters yet
+        config = nano.open_nano('fresh').configure_nano(feature_count=4, numeric_format='float32')
+        nano.save_nano('fresh', filename)
+        assert nano.open_nano('copy').restore_nano(filename) == config
+        nano.load_data('copy', np.random.default_rng(0).random((10, 4)))
+        assert len(nano.run_nano('copy', results='ID')['ID']) == 10
+
+        # a state that does not fit its configuration is rejected like any bad snapshot
+        state = {'config': config, 'learning': True, 'rootCause': False, 'clipping': True,
+                 'centers': [[0.5] * 3], 'sizes': [1], 'growth': [0, 1], 'inferences': 1}
+        write_tar_gz(filename, [('CommonState/MagicNumber', MAGIC_NUMBER),
+                                ('CommonState/State.json', json.dumps(state).encode())])
+        with pytest.raises(BoonException) as e:
+            nano.restore_nano('copy', filename)
+        assert e.value.status_code == 400
+        assert nano.get_nano_status('copy', results='totalInferences')['totalInferences'] == 10
+
+
+class Test23NetworkEmulator:
+
+    @staticmethod
+    def setup_method(self):
+        Test1ProfileManagement.clear_environment()
+
+    @staticmethod
+    def teardown_method(self):
+        Test1ProfileManagement.restore_environment()
+
+    def test_01_latency_and_bandwidth(self):
+        network = bn.NetworkProfile(latency=0.05, bandwidth=1e6)
+        with bn.ExpertEmulator(network, compress=True, min_response_size=5000) as emulator:
+            nano = bn.ExpertClient(profile=emulator.license_profile())
+
+            # the first request pays for the connection handshake as well
+            start = time.perf_counter()
+            assert nano.get_version()['api-version'] == '3'
+            assert time.perf_counter() - start >= 0.1
+            start = time.perf_counter()
+            nano.get_version()
+            assert 0.05 <= time.perf_counter() - start < 0.1
+            assert emulator.stats['connections'] == 1
+
+            # padded responses are gzipped for the client
+            assert emulator.stats['bytes_out'] < 2 * 5000
+
+            handle = nano.open_nano('emulated')
+            handle.configure_nano(feature_count=10, numeric_format='float32')
+            start = time.perf_counter()
+            handle.load_data(np.zeros((5000, 10)))
+            assert time.perf_counter() - start >= 0.2 + 0.05
+            assert handle.get_buffer_status()['totalBytesInBuffer'] == 200000
+            nano.close()
+
+    def test_02_fault_injection(self):
+        os.environ['BOON_TIMEOUT'] = '1'
+        with bn.ExpertEmulator(bn.NetworkProfile(error_rate=1.0)) as emulator:
+            nano = bn.ExpertClient(profile=emulator.license_profile(),
+                                   retry=bn.RetryPolicy(retries=2, backoff=0.001))
+            with pytest.raises(BoonException) as e:
+                nano.get_version()
+            assert e.value.status_code == 503
+            assert emulator.stats['errors'] == 3
+
+            emulator.network = bn.NetworkProfile(reset_rate=1.0)
+            with pytest.raises(BoonException) as e:
+                nano.open_nano('emulated')
+            assert e.value.message == 'server does not exist'
+            assert emulator.stats['resets'] == 1
+
+            emulator.network = bn.NetworkProfile(timeout_rate=1.0, stall=1.5)
+            with pytest.raises(BoonException) as e:
+                nano.open_nano('emulated')
+            assert e.value.message == 'request timed out'
+
+            # half the requests fail, retries hide it from idempotent calls
+            emulator.network = bn.NetworkProfile(error_rate=0.5)
+            nano = bn.ExpertClient(profile=emulator.license_profile(),
+                                   retry=bn.RetryPolicy(retries=20, backoff=0.001))
+            for _ in range(10):
+                nano.get_version()
+            nano.close()
+
+
+class Test24ThreadSafety:
+
+    @staticmethod
+    def setup_method(self):
+        Test1ProfileManagement.clear_environment()
+
+    @staticmethod
+    def teardown_method(self):
+        Test1ProfileManagement.restore_environment()
+
+    @staticmethod
+    def run_instance(nano, index, data, rounds):
+        """Configure one instance and cluster its data, returning every answer"""
+        numeric_format = ['float32', 'int16', 'uint16'][index % 3]
+        handle = nano.open_nano('thread-{}'.format(index))
+        handle.configure_nano(feature_count=4, numeric_format=numeric_format, min_val=0, max_val=100,
+                              percent_variation=0.1)
+        answers = [handle.run_streaming_nano(data, results='ID,RI') for _ in range(rounds)]
+        answers.append(handle.get_nano_status(results='numClusters,totalInferences'))
+        return answers
+
+    def test_01_shared_client(self):
+        threads, rounds = 16, 5
+        rng = np.random.default_rng(7)
+        datasets = [rng.integers(0, 100, (40, 4)) for _ in range(threads)]
+
+        # answers of the same calls made one after the other, in-process
+        reference = bn.ExpertClient(profile=LicenseProfile(server='http://expert.invalid', api_key='my-key',
+                                                           api_tenant='my-tenant'), transport=bn.FakeTransport())
+        expected = [self.run_instance(reference, index, datasets[index], rounds) for index in range(threads)]
+
+        with bn.ExpertEmulator(bn.NetworkProfile(latency=0.02)) as emulator:
+            pool_size = 4
+            nano = bn.ExpertClient(profile=emulator.license_profile(), pool_size=pool_size)
+            answers = [None] * threads
+            errors = []
+
+            def worker(index):
+                try:
+                    answers[index] = self.run_instance(nano, index, datasets[index], rounds)
+                except Exception as e:
+                    errors.append(e)
+
+            workers = [threading.Thread(target=worker, args=(index,)) for index in range(threads)]
+            for worker_thread in workers:
+                worker_thread.start()
+            for worker_thread in workers:
+                worker_thread.join()
+
+            assert errors == [] and emulator.stats['errors'] == 0
+            # every thread saw the answers of its own instance, in order
+            assert answers == expected
+            # open, configure, the rounds and the status of every thread, nothing repeated
+            assert emulator.stats['requests'] == threads * (rounds + 3)
+            # threads share the pool instead of opening connections of their own
+            assert emulator.stats['connections'] <= pool_size
+            nano.close()
+
+def remote_numeric_format(client, instance_id):
+    """Worker for Test25: use a client received from the parent process"""
+    return os.getpid(), client.get_version()['api-version'], client._nano(instance_id).numeric_format
+
+
+class Test25ForkAndPickle:
+
+    @staticmethod
+    def setup_method(self):
+        Test1ProfileManagement.clear_environment()
+
+    @staticmethod
+    def teardown_method(self):
+        Test1ProfileManagement.restore_environment()
+
+    def test_01_pickle(self):
+        import pickle
+
+        profile = LicenseProfile(server='http://localhost:5007', api_key='my-key', api_tenant='my-tenant')
+        nano = bn.ExpertClient(profile=profile, pool_size=3, json_codec='json',
+                               compression=bn.CompressionPolicy(level=1), retry=bn.RetryPolicy(retries=5))
+        handle = nano._nano('pickled')
+        handle.numeric_format = 'int16'
+        handle.feature_count = 4
+        session = nano._get_session()
+
+        data = pickle.dumps(nano)
+        assert len(data) < 2000
+        copy = pickle.loads(data)
+        assert copy.server == nano.server and copy.api_key == 'my-key' and copy.pool_size == 3
+        assert copy.compression.level == 1 and copy.retry.retries == 5
+        assert copy._nano('pickled').numeric_format == 'int16' and copy._nano('pickled').feature_count == 4
+        assert copy._nano('pickled').client is copy
+        assert copy._session is None and copy._get_session() is not session
+        copy.close()
+        nano.close()
+
+    def test_02_fork(self):
+        with bn.ExpertEmulator() as emulator:
+            nano = bn.ExpertClient(profile=emulator.license_profile())
+            nano.get_version()
+            session = nano._get_session()
+            assert emulator.stats['connections'] == 1
+
+            pid = os.fork()
+            if pid == 0:
+                # the child opens its own connection and leaves the parent's alone
+                try:
+                    nano.get_version()
+                    status = 0 if nano._get_session() is not session else 1
+                except BaseException:
+                    status = 2
+                os._exit(status)
+            _, status = os.waitpid(pid, 0)
+            assert os.WIFEXITED(status) and os.WEXITSTATUS(status) == 0
+            assert emulator.stats['connections'] == 2
+
+            # the parent keeps using its pooled connection
+            nano.get_version()
+            assert nano._get_session() is session
+            assert emulator.stats['connections'] == 2
+            nano.close()
+
+    def test_03_process_pool(self):
+        import multiprocessing
+        from concurrent.futures import ProcessPoolExecutor
+
+        with bn.ExpertEmulator() as emulator:
+            nano = bn.ExpertClient(profile=emulator.license_profile())
+            nano.open_nano('pooled').configure_nano(feature_count=2, numeric_format='uint16')
+            context = multiprocessing.get_context('fork')
+            with ProcessPoolExecutor(2, mp_context=context) as pool:
+                answers = list(pool.map(remote_numeric_format, [nano] * 4, ['pooled'] * 4))
+            assert all(answer[1:] == ('3', 'uint16') for answer in answers)
+            assert all(answer[0] != os.getpid() for answer in answers)
+            nano.close()
+
+    def test_04_pickle_transport(self):
+        import pickle
+
+        nano = Test27SnapshotSave.open_fake(bn.FakeTransport())
+        copy = pickle.loads(pickle.dumps(nano))
+        assert isinstance(copy.transport, bn.FakeTransport)
+        assert copy.transport.expert is not nano.transport.expert
+        assert copy.get_config('fake') == nano.get_config('fake')
+        status = 'numClusters,totalInferences'
+        assert copy.get_nano_status('fake', results=status) == nano.get_nano_status('fake', results=status)
+
+        # the copy's fake server is its own from then on
+        copy.close_nano('fake')
+        assert 'fake' in [item['instanceID'] for item in nano.nano_list()]
+        assert copy.nano_list() == []
+
+
+def import_profile(code):
+    """Run code in a fresh interpreter with -X importtime, return the modules it imported and their cumulative microseconds"""
+    import subprocess
+
+    completed = subprocess.run(
+        [sys.executable, '-X', 'importtime', '-c', code],
+        cwd=os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+        capture_output=True, text=True, check=True)
+    modules = {}
+    for line in completed.stderr.splitlines():
+        if line.startswith('import time:') and '|' in line and 'cumulative' not in line:
+            _, cumulative, name = line.split('|')
+            modules[name.strip()] = int(cumulative)
+    return modules, completed.stdout
+
+
+class Test26ImportTime:
+    # heavy dependencies only the code paths that use them import
+    DEFERRED = ['numpy', 'requests', 'urllib3', 'aiohttp', 'tarfile', 'gzip', 'http.server',
+                'concurrent.futures']
+    # microseconds, import boonnano took about 450 ms before the heavy imports were deferred
+    BUDGET = 200000
+
+    def test_01_import(self):
+        modules, _ = import_profile('import boonnano')
+        for name in self.DEFERRED:
+            assert name not in modules, name
+        assert modules['boonnano'] < self.BUDGET
+
+    def test_02_deferred_until_used(self):
+        code = '\n'.join([
+            'import sys',
+            'import boonnano as bn',
+            'client = bn.ExpertClient(profile=bn.LicenseProfile(server="http://localhost:5007", api_key="k", api_tenant="t"))',
+            'config = client.create_config(feature_count=3, numeric_format="float32", min_val=0, max_val=[1, 2, 3])',
+            'print("numpy" in sys.modules, "requests" in sys.modules)',
+            'client._get_session()',
+            'print("numpy" in sys.modules, "requests" in sys.modules)',
+            'bn.AsyncExpertClient',
+            'print("boonnano.async_client" in sys.modules)',
+        ])
+        _, output = import_profile(code)
+        assert output.split('\n')[:3] == ['False False', 'False True', 'True']
+
+    def test_03_lazy_exports(self):
+        assert bn.FakeExpert.__module__ == 'boonnano.fake_server'
+        assert bn.NetworkProfile.__module__ == 'boonnano.emulator'
+        assert 'ExpertEmulator' in dir(bn)
+        with pytest.raises(AttributeError):
+            bn.NoSuchName
+
+
+class FailingBodyTransport(bn.FakeTransport):
+    """FakeTransport whose snapshot responses break after their first piece, failures times"""
+
+    def __init__(self, failures):
+        super().__init__()
+        self.failures = failures
+
+    def request(self, method, url, headers, body=None, fields=None, timeout=None):
+        response = super().request(method, url, headers, body, fields, timeout)
+        if method == 'GET' and '/snapshot/' in url and self.failures:
+            self.failures -= 1
+            chunks = response.iter_content
+
+            def iter_content(chunk_size):
+                for chunk in chunks(16):
+                    yield chunk
+                    raise BoonException(500, 'server does not exist')
+
+            response.iter_content = iter_content
+        return response
+
+
+class Test27SnapshotSave:
+
+    @staticmethod
+    def setup_method(self):
+        Test1ProfileManagement.clear_environment()
+
+    @staticmethod
+    def teardown_method(self):
+        Test1ProfileManagement.restore_environment()
+
+    @staticmethod
+    def open_fake(transport):
+        profile = LicenseProfile(server='http://expert.invalid', api_key='my-key', api_tenant='my-tenant')
+        nano = bn.ExpertClient(profile=profile, transport=transport)
+        nano.open_nano('fake')
+        nano.configure_nano('fake', feature_count=4, numeric_format='float32')
+        nano.load_data('fake', np.random.default_rng(0).random((200, 4)))
+        nano.run_nano('fake')
+        return nano
+
+    def test_01_stats(self, tmp_path):
+        import hashlib
+
+        nano = self.open_fake(bn.FakeTransport())
+        filename = str(tmp_path / 'snapshot.tgz')
+        with open(filename, 'wb') as fp:
+            fp.write(b'previous')
+        stats = nano.save_nano('fake', filename)
+        with open(filename, 'rb') as fp:
+            snapshot = fp.read()
+        assert stats['bytes'] == len(snapshot) > 0
+        assert stats['sha256'] == hashlib.sha256(snapshot).hexdigest()
+        assert stats['seconds'] > 0 and stats['bytes_per_sec'] > 0
+        assert os.listdir(str(tmp_path)) == ['snapshot.tgz']
+        assert nano.restore_nano('fake', filename)['numericFormat'] == 'float32'
+
+    def test_02_interrupted(self, tmp_path):
+        filename = str(tmp_path / 'snapshot.tgz')
+        with open(filename, 'wb') as fp:
+            fp.write(b'previous')
+
+        # a download that keeps breaking leaves the previous file as it was
+        nano = self.open_fake(FailingBodyTransport(failures=10))
+        with pytest.raises(BoonException) as e:
+            nano.save_nano('fake', filename)
+        assert e.value.message == 'server does not exist'
+        with open(filename, 'rb') as fp:
+            assert fp.read() == b'previous'
+        assert os.listdir(str(tmp_path)) == ['snapshot.tgz']
+
+        # a broken download is retried from the start
+        transport = FailingBodyTransport(failures=1)
+        nano = self.open_fake(transport)
+        stats = nano.save_nano('fake', filename)
+        assert transport.failures == 0
+        assert stats['bytes'] == os.path.getsize(filename) > 16
+        assert os.listdir(str(tmp_path)) == ['snapshot.tgz']
+
+    def test_03_async(self, tmp_path, monkeypatch):
+        import threading
+
+        # the file writes happen off the event loop
+        threads = set()
+        feed = bn.snapshot.SnapshotWriter.feed
+
+        def recording_feed(writer, chunk):
+            threads.add(threading.current_thread())
+            return feed(writer, chunk)
+
+        monkeypatch.setattr(bn.snapshot.SnapshotWriter, 'feed', recording_feed)
+        filename = str(tmp_path / 'snapshot.tgz')
+        with bn.ExpertEmulator() as emulator:
+            nano = self.open_fake(bn.FakeTransport(emulator.expert))
+            expected = nano.save_nano('fake', filename)
+
+            async def run():
+                async with bn.AsyncExpertClient(profile=emulator.license_profile()) as async_nano:
+                    await async_nano.open_nano('fake')
+                    async_nano._nano('fake')._set_config(nano.get_config('fake'))
+                    return await async_nano.save_nano('fake', filename)
+
+            threads.clear()
+            stats = asyncio.run(run())
+        assert stats['sha256'] == expected['sha256'] and stats['bytes'] == expected['bytes']
+        assert os.listdir(str(tmp_path)) == ['snapshot.tgz']
+        assert threads and threading.main_thread() not in threads
+
+
+def write_tar_gz(filename, members):
+    """Write a gzip'd tar holding the (name, content) members, in order"""
+    import io
+    import tarfile
+
+    with tarfile.open(filename, 'w:gz', format=tarfile.GNU_FORMAT) as tar:
+        for name, content in members:
+            info = tarfile.TarInfo(name)
+            info.size = len(content)
+            tar.addfile(info, io.BytesIO(content))
+
+
+class RecordingTransport(bn.FakeTransport):
+    """FakeTransport remembering the bodies of the snapshot uploads"""
+
+    def __init__(self):
+        super().__init__()
+        self.bodies = []
+
+    def request(self, method, url, headers, body=None, fields=None, timeout=None):
+        if method == 'POST' and '/snapshot/' in url:
+            self.bodies.append(body)
+        return super().request(method, url, headers, body, fields, timeout)
+
+
+class Test28SnapshotRestore:
+
+    @staticmethod
+    def setup_method(self):
+        Test1ProfileManagement.clear_environment()
+
+    @staticmethod
+    def teardown_method(self):
+        Test1ProfileManagement.restore_environment()
+
+    def test_01_magic_number(self, tmp_path):
+        from boonnano.expert_client import check_nano_file
+        from boonnano.snapshot import read_magic_number
+
+        # found behind other members and long names, without reading the rest
+        filename = str(tmp_path / 'late.tgz')
+        write_tar_gz(filename, [('zeros', bytes(20000000)), ('a' * 150, b'long'),
+                                ('CommonState/MagicNumber', b'\xda\xba'), ('rest', bytes(1000))])
+        check_nano_file(filename)
+
+        filename = str(tmp_path / 'early.tgz')
+        write_tar_gz(filename, [('CommonState/MagicNumber', b'\xda\xba'), ('noise', os.urandom(1000000))])
+        with open(filename, 'rb') as fp:
+            assert read_magic_number(fp) == b'\xda\xba'
+            assert fp.tell() < os.path.getsize(filename)
+
+        filename = str(tmp_path / 'bad.tgz')
+        write_tar_gz(filename, [('CommonState/MagicNumber', b'\xde\xad')])
+        with pytest.raises(BoonException) as e:
+            check_nano_file(filename)
+        assert e.value.message.endswith('bad magic number')
+
+        filename = str(tmp_path / 'missing.tgz')
+        write_tar_gz(filename, [('CommonState/State.json', b'{}')])
+        with pytest.raises(BoonException) as e:
+            check_nano_file(filename)
+        assert e.value.message == 'file {} is not a Boon Logic nano-formatted file'.format(filename)
+
+        filename = str(tmp_path / 'plain.tgz')
+        with open(filename, 'wb') as fp:
+            fp.write(b'not a snapshot')
+        with pytest.raises(BoonException) as e:
+            check_nano_file(filename)
+        assert e.value.message == 'corrupt file {}'.format(filename)
+
+    def test_02_streamed_upload(self, tmp_path):
+        from boonnano.snapshot import SnapshotReader
+
+        transport = RecordingTransport()
+        nano = Test27SnapshotSave.open_fake(transport)
+        filename = str(tmp_path / 'snapshot.tgz')
+        stats = nano.save_nano('fake', filename)
+        nano.open_nano('copy')
+        config = nano.restore_nano('copy', filename, sha256=stats['sha256'])
+        assert config == nano.get_config('fake')
+
+        # the file went out through a streaming body, read once
+        body = transport.bodies[-1]
+        assert not isinstance(body, (bytes, bytearray))
+        assert body.bytes_read >= stats['bytes']
+
+        # the digest is computed over the same pieces
+        reader = SnapshotReader(filename)
+        with reader:
+            while reader.read(1000):
+                pass
+        assert reader.size == stats['bytes'] and reader.sha256 == stats['sha256']
+
+    def test_03_checksum_mismatch(self, tmp_path):
+        transport = RecordingTransport()
+        nano = Test27SnapshotSave.open_fake(transport)
+        filename = str(tmp_path / 'snapshot.tgz')
+        nano.save_nano('fake', filename)
+        nano.open_nano('copy')
+        nano.configure_nano('copy', feature_count=2, numeric_format='int16')
+
+        with pytest.raises(BoonException) as e:
+            nano.restore_nano('copy', filename, sha256='0' * 64)
+        assert e.value.message == 'file {} does not match sha256 {}'.format(filename, '0' * 64)
+        # the upload was abandoned before the server restored anything
+        assert nano.get_config('copy')['numericFormat'] == 'int16'
+
+    def test_04_network(self, tmp_path):
+        filename = str(tmp_path / 'snapshot.tgz')
+        with bn.ExpertEmulator() as emulator:
+            nano = Test27SnapshotSave.open_fake(bn.FakeTransport(emulator.expert))
+            stats = nano.save_nano('fake', filename)
+            nano.open_nano('copy')
+            nano.configure_nano('copy', feature_count=2, numeric_format='int16')
+
+            async def run():
+                async with bn.AsyncExpertClient(profile=emulator.license_profile()) as async_nano:
+                    with pytest.raises(BoonException) as e:
+                        await async_nano.restore_nano('copy', filename, sha256='0' * 64)
+                    assert 'does not match sha256' in e.value.message
+                    assert (await async_nano.get_nano_instance('copy'))['instanceID'] == 'copy'
+                    return await async_nano.restore_nano('copy', filename, sha256=stats['sha256'])
+
+            config = asyncio.run(run())
+            assert config == nano.get_config('fake')
+
+            # through the requests session as well
+            sync_nano = bn.ExpertClient(profile=emulator.license_profile())
+            with pytest.raises(BoonException) as e:
+                sync_nano.restore_nano('copy', filename, sha256='1' * 64)
+            assert 'does not match sha256' in e.value.message
+            assert sync_nano.restore_nano('copy', filename, sha256=stats['sha256']) == config
+            sync_nano.close()
+
+
+class Test29SnapshotStore:
+
+    @staticmethod
+    def setup_method(self):
+        Test1ProfileManagement.clear_environment()
+
+    @staticmethod
+    def teardown_method(self):
+        Test1ProfileManagement.restore_environment()
+
+    @staticmethod
+    def objects(store):
+        return sorted(name for _, _, names in os.walk(os.path.join(store.path, 'objects')) for name in names)
+
+    def test_01_save_and_restore(self, tmp_path):
+        nano = Test27SnapshotSave.open_fake(bn.FakeTransport())
+        with bn.SnapshotStore(str(tmp_path / 'store')) as store:
+            first = nano.save_nano('fake', store)
+            second = nano.save_nano('fake', store)
+            # an unchanged instance is stored once and recorded twice
+            assert first['sha256'] == second['sha256']
+            assert first['snapshot'].path == second['snapshot'].path
+            assert self.objects(store) == [first['sha256']]
+            assert store.snapshots('fake') == [first['snapshot'], second['snapshot']]
+            assert store.find('fake') == second['snapshot']
+            assert store.find('fake', at=first['snapshot'].created) == first['snapshot']
+            assert store.find('other') is None
+
+            nano.run_streaming_nano('fake', np.random.default_rng(1).random((50, 4)))
+            third = nano.save_nano('fake', store)
+            assert third['sha256'] != first['sha256']
+            assert len(self.objects(store)) == 2
+
+            nano.open_nano('copy')
+            config = nano.restore_nano('copy', store.find('fake', at=first['snapshot'].created))
+            assert config == nano.get_config('fake')
+            assert nano.get_nano_status('copy', results='totalInferences')['totalInferences'] == 200
+
+            # a damaged file is caught by its digest before the server restores it
+            with open(third['snapshot'].path, 'ab') as fp:
+                fp.write(b'\0')
+            with pytest.raises(BoonException) as e:
+                nano.restore_nano('copy', third['snapshot'])
+            assert 'does not match sha256' in e.value.message
+        # only the index and the snapshots, no temporary files
+        assert sorted(os.listdir(str(tmp_path / 'store'))) == ['index.sqlite3', 'objects']
+
+    def test_02_index(self, tmp_path):
+        nano = Test27SnapshotSave.open_fake(bn.FakeTransport())
+        filename = str(tmp_path / 'snapshot.tgz')
+        nano.save_nano('fake', filename)
+        with bn.SnapshotStore(str(tmp_path / 'store')) as store:
+            for created in [100.0, 200.0, 300.0]:
+                store.put('a', filename, created=created)
+            store.put('b', filename, created=150.0)
+            assert len(self.objects(store)) == 1
+            assert store.instance_ids() == ['a', 'b']
+            assert store.find('a', at=250.0).created == 200.0
+            assert store.find('a', at=50.0) is None
+            assert [ref.created for ref in store.snapshots(since=120.0, until=250.0)] == [150.0, 200.0]
+            assert [ref.instance_id for ref in store.snapshots()] == ['a', 'b', 'a', 'a']
+
+        # the index outlives the store object
+        with bn.SnapshotStore(str(tmp_path / 'store')) as store:
+            assert store.find('b').created == 150.0
+
+    def test_03_retention(self, tmp_path):
+        store = bn.SnapshotStore(str(tmp_path / 'store'))
+        sources = []
+        for index in range(3):
+            filename = str(tmp_path / 'source-{}'.format(index))
+            write_tar_gz(filename, [('CommonState/MagicNumber', b'\xda\xba'), ('n', bytes([index]))])
+            sources.append(filename)
+
+        hour, day = 3600.0, 86400.0
+        # every 20 minutes over two days, the content changing daily
+        times = [start * 1200.0 for start in range(144)]
+        for created in times:
+            store.put('a', sources[int(created // day)], created=created)
+        store.put('b', sources[1], created=0.0)
+        assert len(self.objects(store)) == 2
+
+        with pytest.raises(ValueError):
+            store.prune()
+
+        removed = store.prune('a', keep_last=2, keep_hourly=4, keep_daily=2)
+        kept = [ref.created for ref in store.snapshots('a')]
+        # the latest two, the latest of each of the latest four hours, the latest of each day
+        assert kept == [day - 1200.0, 2 * day - 4 * hour + 2400.0, 2 * day - 3 * hour + 2400.0,
+                        2 * day - 2 * hour + 2400.0, 2 * day - 2400.0, 2 * day - 1200.0]
+        assert len(removed) == 144 - len(kept)
+        assert all(ref.instance_id == 'a' for ref in removed)
+        assert store.find('b').created == 0.0
+        assert len(self.objects(store)) == 2
+
+        # the file of a snapshot no longer recorded is removed, shared files stay
+        store.prune(keep_last=1)
+        assert [ref.created for ref in store.snapshots()] == [0.0, 2 * day - 1200.0]
+        assert len(self.objects(store)) == 1
+        store.put('b', sources[2], created=1.0)
+        store.prune('b', keep_last=1)
+        assert [ref.created for ref in store.snapshots('b')] == [1.0]
+        assert len(self.objects(store)) == 2
+        store.close()
+
+    def test_04_async(self, tmp_path):
+        with bn.ExpertEmulator() as emulator:
+            nano = Test27SnapshotSave.open_fake(bn.FakeTransport(emulator.expert))
+            store = bn.SnapshotStore(str(tmp_path / 'store'))
+            expected = nano.save_nano('fake', store)
+
+            async def run():
+                async with bn.AsyncExpertClient(profile=emulator.license_profile()) as async_nano:
+                    await async_nano.open_nano('fake')
+                    async_nano._nano('fake')._set_config(nano.get_config('fake'))
+                    stats = await async_nano.save_nano('fake', store)
+                    await async_nano.restore_nano('fake', stats['snapshot'])
+                    return stats
+
+            stats = asyncio.run(run())
+            assert stats['sha256'] == expected['sha256']
+            assert len(store.snapshots('fake')) == 2 and len(self.objects(store)) == 1
+            store.close()
+
+
+class SelectiveFailureTransport(bn.FakeTransport):
+    """FakeTransport answering 500 to snapshot requests of the instances in failing"""
+
+    def __init__(self, expert=None):
+        super().__init__(expert)
+        self.failing = set()
+
+    def request(self, method, url, headers, body=None, fields=None, timeout=None):
+        instance_id = urlsplit(url).path.rstrip('/').split('/')[-1]
+        if '/snapshot/' in url and instance_id in self.failing:
+            return bn.transport.Response(500, b'{"code": 500, "message": "disk failure"}')
+        return super().request(method, url, headers, body, fields, timeout)
+
+
+class Test30Fleet:
+
+    INSTANCES = ['a', 'b', 'c.1', 'd', 'e']
+
+    @staticmethod
+    def setup_method(self):
+        Test1ProfileManagement.clear_environment()
+
+    @staticmethod
+    def teardown_method(self):
+        Test1ProfileManagement.restore_environment()
+
+    def open_fleet(self, transport):
+        profile = LicenseProfile(server='http://expert.invalid', api_key='my-key', api_tenant='my-tenant')
+        nano = bn.ExpertClient(profile=profile, transport=transport)
+        rng = np.random.default_rng(0)
+        for index, instance_id in enumerate(self.INSTANCES):
+            nano.open_nano(instance_id)
+            nano.configure_nano(instance_id, feature_count=index + 2, numeric_format='float32')
+            nano.load_data(instance_id, rng.random((50, index + 2)))
+            nano.run_nano(instance_id)
+        return nano
+
+    @staticmethod
+    def new_client(transport):
+        profile = LicenseProfile(server='http://expert.invalid', api_key='my-key', api_tenant='my-tenant')
+        return bn.ExpertClient(profile=profile, transport=transport)
+
+    def test_01_backup_and_restore(self, tmp_path):
+        nano = self.open_fleet(bn.FakeTransport())
+        directory = str(tmp_path / 'backup')
+        outcomes = []
+        # a fresh client knows nothing of the instances' configurations
+        report = self.new_client(nano.transport).save_nanos(
+            directory, max_workers=3, progress=lambda *args: outcomes.append(args))
+        assert sorted(report['completed']) == self.INSTANCES
+        assert report['failed'] == {} and report['skipped'] == []
+        assert sorted(instance_id for instance_id, _ in outcomes) == self.INSTANCES
+        assert report['bytes'] == sum(os.path.getsize(os.path.join(directory, name))
+                                      for name in os.listdir(directory))
+        assert report['bytes_per_sec'] > 0
+        assert sorted(os.listdir(directory)) == ['a.tgz', 'b.tgz', 'c.1.tgz', 'd.tgz', 'e.tgz']
+
+        # onto an empty server
+        restored = self.new_client(bn.FakeTransport())
+        report = restored.restore_nanos(directory, max_workers=2)
+        assert sorted(report['completed']) == self.INSTANCES and report['failed'] == {}
+        for instance_id in self.INSTANCES:
+            assert restored.get_config(instance_id) == nano.get_config(instance_id)
+
+        with pytest.raises(BoonException):
+            restored.restore_nanos(directory, max_workers=0)
+
+    def test_02_resume(self, tmp_path):
+        transport = SelectiveFailureTransport()
+        nano = self.open_fleet(transport)
+        directory = str(tmp_path / 'backup')
+        manifest = str(tmp_path / 'manifest.jsonl')
+
+        transport.failing = {'b', 'd'}
+        report = nano.save_nanos(directory, manifest=manifest)
+        assert sorted(report['failed']) == ['b', 'd']
+        assert report['failed']['b'].message == 'disk failure'
+        assert sorted(report['completed']) == ['a', 'c.1', 'e']
+        assert not os.path.exists(os.path.join(directory, 'b.tgz'))
+
+        # the second run only does what the first one left
+        transport.failing = set()
+        before = transport.requests
+        report = nano.save_nanos(directory, manifest=manifest)
+        assert sorted(report['completed']) == ['b', 'd']
+        assert sorted(report['skipped']) == ['a', 'c.1', 'e']
+        # one nano_list, then one snapshot each
+        assert transport.requests - before == 3
+        with open(manifest) as fp:
+            records = [json.loads(line) for line in fp]
+        assert sorted(record['instance_id'] for record in records) == sorted(self.INSTANCES)
+        assert all(len(record['sha256']) == 64 for record in records)
+
+        # a line cut short by a crash is ignored
+        with open(manifest, 'a') as fp:
+            fp.write('{"instance_id": "x", "by')
+        assert sorted(bn.snapshot.Manifest(manifest).completed) == sorted(self.INSTANCES)
+
+    def test_03_store(self, tmp_path):
+        nano = self.open_fleet(bn.FakeTransport())
+        store = bn.SnapshotStore(str(tmp_path / 'store'))
+        first = nano.save_nanos(store, instance_ids=['a', 'b'])
+        assert first['completed']['a']['snapshot'] == store.find('a')
+        taken = time.time()
+        nano.run_streaming_nano('a', np.random.default_rng(2).random((20, 2)))
+        nano.save_nanos(store, instance_ids=['a', 'b'])
+        assert len(store.snapshots('a')) == 2
+
+        restored = self.new_client(bn.FakeTransport())
+        report = restored.restore_nanos(store, at=taken)
+        assert sorted(report['completed']) == ['a', 'b']
+        assert report['completed']['a']['sha256'] == first['completed']['a']['sha256']
+        status = restored.get_nano_status('a', results='totalInferences')
+        assert status['totalInferences'] == 50
+
+        report = restored.restore_nanos(store, instance_ids=['a', 'z'])
+        assert report['failed']['z'].message == 'no snapshot of z in the store'
+        store.close()
+
+    def test_04_command_line(self, tmp_path):
+        import io
+        from boonnano import fleet
+
+        transport = SelectiveFailureTransport()
+        nano = self.open_fleet(transport)
+        directory = str(tmp_path / 'store')
+        args = fleet._parse(
+            ['backup', directory, '--store', '--workers', '2', '--keep-last', '1'])
+        transport.failing = {'e'}
+        out = io.StringIO()
+        report = fleet.run(args, nano, out)
+        lines = out.getvalue().splitlines()
+        assert len(lines) == len(self.INSTANCES) + 2
+        assert 'e failed: disk failure' in out.getvalue()
+        assert lines[-1].startswith('backup: 4 done, 1 failed, 0 skipped')
+        assert os.path.exists(os.path.join(directory, 'backup-manifest.jsonl'))
+
+        transport.failing = set()
+        out = io.StringIO()
+        fleet.run(args, nano, out)
+        assert out.getvalue().splitlines()[-1].startswith('backup: 1 done, 0 failed, 4 skipped')
+        assert not os.path.exists(os.path.join(directory, 'backup-manifest.jsonl'))
+
+        args = fleet._parse(['restore', directory, '--store', '--instances', 'a,e'])
+        restored = self.new_client(bn.FakeTransport())
+        out = io.StringIO()
+        report = fleet.run(args, restored, out)
+        assert sorted(report['completed']) == ['a', 'e']
+        assert restored.get_config('e') == nano.get_config('e')
+
+    def test_05_scheduled_backup(self, tmp_path):
+        import io
+        from boonnano import fleet
+
+        nano = self.open_fleet(bn.FakeTransport())
+        directory = str(tmp_path / 'backup')
+        args = fleet._parse(['backup', directory])
+        first = fleet.run(args, nano, io.StringIO())
+        assert sorted(first['completed']) == self.INSTANCES
+
+        # a finished run leaves nothing to resume, the next one backs up the new state
+        nano.run_streaming_nano('a', np.random.default_rng(2).random((20, 2)))
+        out = io.StringIO()
+        second = fleet.run(args, nano, out)
+        assert out.getvalue().splitlines()[-1].startswith('backup: 5 done, 0 failed, 0 skipped')
+        assert second['completed']['a']['sha256'] != first['completed']['a']['sha256']
+        assert second['completed']['b']['sha256'] == first['completed']['b']['sha256']
+
+    def test_07_command_line_negative(self, tmp_path, capsys):
+        from boonnano import fleet
+
+        missing = str(tmp_path / 'missing')
+        for argv, message in [
+            (['restore', missing], 'backup directory {} does not exist'.format(missing)),
+            (['restore', str(tmp_path), '--store'], '{} is not a SnapshotStore'.format(tmp_path)),
+            (['backup', missing, '--keep-last', '2'], '--keep-last, --keep-hourly and --keep-daily need --store'),
+        ]:
+            with pytest.raises(SystemExit) as e:
+                fleet.main(argv)
+            assert e.value.code == 2
+            assert message in capsys.readouterr().err
+        # nothing was created on the way
+        assert os.listdir(str(tmp_path)) == []
+
+    def test_06_local_failure(self, tmp_path):
+        import sqlite3
+
+        class LockedStore(bn.SnapshotStore):
+            """SnapshotStore whose index rejects the snapshots of b"""
+
+            def _add(self, instance_id, writer, created=None):
+                if instance_id == 'b':
+                    raise sqlite3.OperationalError('database is locked')
+                return super()._add(instance_id, writer, created)
+
+        nano = self.open_fleet(bn.FakeTransport())
+        store = LockedStore(str(tmp_path / 'store'))
+        outcomes = []
+        report = nano.save_nanos(store, progress=lambda *args: outcomes.append(args))
+        assert sorted(report['completed']) == ['a', 'c.1', 'd', 'e']
+        assert isinstance(report['failed']['b'], sqlite3.OperationalError)
+        assert len(outcomes) == len(self.INSTANCES)
+        assert store.instance_ids() == ['a', 'c.1', 'd', 'e']
+        store.close()
+
+
+class AlteredConfigTransport(bn.FakeTransport):
+    """FakeTransport reporting a different percentVariation than the instance has"""
+
+    def request(self, method, url, headers, body=None, fields=None, timeout=None):
+        response = super().request(method, url, headers, body, fields, timeout)
+        if method == 'GET' and '/clusterConfig/' in url:
+            config = json.loads(bytes(response.content))
+            config['percentVariation'] += 0.01
+            response.content = json.dumps(config).encode()
+        return response
+
+
+class Test31Migrate:
+
+    @staticmethod
+    def setup_method(self):
+        Test1ProfileManagement.clear_environment()
+
+    @staticmethod
+    def teardown_method(self):
+        Test1ProfileManagement.restore_environment()
+
+    def test_01_migrate(self):
+        source = Test27SnapshotSave.open_fake(bn.FakeTransport())
+        target = Test30Fleet.new_client(bn.FakeTransport())
+        expected = source.save_nano('fake', 'migrate-snapshot')
+        os.remove('migrate-snapshot')
+
+        stats = source.open_nano('fake').migrate_nano(target, 'moved', verify=True)
+        assert stats['sha256'] == expected['sha256'] and stats['bytes'] == expected['bytes']
+        assert stats['config'] == target.get_config('moved') == source.get_config('fake')
+        assert target._nano('moved').feature_count == 4
+        status = 'numClusters,totalInferences'
+        assert target.get_nano_status('moved', results=status) == source.get_nano_status('fake', results=status)
+        # the source is left as it was
+        assert 'fake' in [item['instanceID'] for item in source.nano_list()]
+
+        with pytest.raises(BoonException) as e:
+            source.migrate_nano('fake', Test30Fleet.new_client(AlteredConfigTransport()), verify=True)
+        assert e.value.message == 'configuration of migrated instance fake differs from fake'
+
+    def test_02_broken_download(self):
+        source = Test27SnapshotSave.open_fake(FailingBodyTransport(failures=10))
+        target = Test30Fleet.new_client(bn.FakeTransport())
+        with pytest.raises(BoonException) as e:
+            source.migrate_nano('fake', target)
+        assert e.value.message == 'server does not exist'
+        # the instance created on target for the migration is closed again
+        assert 'fake' not in target.transport.expert.instances
+
+        # an instance that was already there is left
+        target.open_nano('fake')
+        with pytest.raises(BoonException):
+            source.migrate_nano('fake', target)
+        assert 'fake' in target.transport.expert.instances
+
+        # nothing is created on target when the snapshot cannot be fetched
+        source = Test27SnapshotSave.open_fake(bn.FakeTransport())
+        with pytest.raises(BoonException) as e:
+            source.migrate_nano('missing', target)
+        assert e.value.message == 'Nano instance identifier missing is not an allocated instance.'
+        assert 'missing' not in target.transport.expert.instances
+
+    def test_03_between_servers(self):
+        with bn.ExpertEmulator() as first, bn.ExpertEmulator(compress=True) as second:
+            setup = Test27SnapshotSave.open_fake(bn.FakeTransport(first.expert))
+            source = bn.ExpertClient(profile=first.license_profile())
+            target = bn.ExpertClient(profile=second.license_profile())
+            stats = source.migrate_nano('fake', target, verify=True)
+            assert second.stats['bytes_in'] >= stats['bytes'] > 0
+            assert target.get_config('fake') == setup.get_config('fake')
+            # and back, onto an instance that already exists
+            stats = target.migrate_nano('fake', source, 'back')
+            assert source.get_config('back') == setup.get_config('fake')
+            source.close()
+            target.close()